@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# aggregator.py
+# Streaming sentiment aggregation for cam.py. Instead of collecting a
+# tumbling window of labels in a list and voting when it closes, each
+# label is folded into running per-label sums over a sliding window,
+# optionally decayed so newer votes count more and weighted by how sure
+# the source was. The current value can be read at any time in O(1), so a
+# change of expression shows up about one sample after it happens instead
+# of up to two windows later.
+#
+# A vote stays in the window for `window` seconds after it *arrived*, and
+# decays by the age of the frame it was *captured* from. A remote label
+# that takes longer than the window to come back therefore still counts
+# (older evidence, lower weight) instead of expiring on arrival.
+#
+# Happy/sad still beat neutral, but only with at least `min_weight` of
+# decayed weight behind them: one stale vote that has all but decayed away
+# does not outvote a window of fresh neutral ones.
+
+import math
+from collections import deque
+
+LABELS = (-1, 0, 1)
+
+
+class SlidingVote:
+    """
+    Confidence-weighted votes of one stream that arrived in the last `window`
+    seconds, decayed by capture age with a `half_life` of seconds (0 = none).
+    A label with no live votes sums to exactly 0, whatever float drift the
+    running add/subtract left behind.
+
+    add(ts, label, weight, arrival)   O(1); ts = capture time, arrival defaults to ts
+    result(now)                       (label, confidence, samples), amortized O(1)
+
+    The decision keeps the old majority_vote_bias_non_neutral rule: happy/sad
+    weight of at least `min_weight` beats neutral, and happy wins ties with sad.
+    """
+    def __init__(self, window, half_life=0.0, min_weight=0.25):
+        self.window = window
+        self.tau = half_life / math.log(2) if half_life > 0 else None
+        self.min_weight = min_weight
+        self.entries = deque()          # (arrival, capture_ts, label, weight), in arrival order
+        self.sums = dict.fromkeys(LABELS, 0.0)
+        self.counts = dict.fromkeys(LABELS, 0)
+        self.t = None                   # time the sums are decayed to
+
+    def _advance(self, now):
+        if self.t is None or now <= self.t:
+            if self.t is None:
+                self.t = now
+            return
+        if self.tau is not None:
+            f = math.exp(-(now - self.t) / self.tau)
+            for k in self.sums:
+                self.sums[k] *= f
+        self.t = now
+
+    def _decayed(self, ts, weight):
+        return weight * math.exp(-(self.t - ts) / self.tau) if self.tau is not None else weight
+
+    def add(self, ts, label, weight=1.0, arrival=None):
+        """Fold in one vote; returns False if it carries no weight."""
+        arrival = ts if arrival is None else arrival
+        self._advance(arrival)
+        if weight <= 0:
+            return False
+        self.entries.append((arrival, ts, label, weight))
+        self.sums[label] += self._decayed(ts, weight)
+        self.counts[label] += 1
+        return True
+
+    def expire(self, now):
+        self._advance(now)
+        horizon = self.t - self.window
+        while self.entries and self.entries[0][0] <= horizon:
+            _, ts, label, weight = self.entries.popleft()
+            self.counts[label] -= 1
+            # Last vote of its label gone: clear the float drift instead of leaving a remainder
+            self.sums[label] = max(0.0, self.sums[label] - self._decayed(ts, weight)) if self.counts[label] else 0.0
+
+    def result(self, now):
+        self.expire(now)
+        pos, neg = self.sums[1], self.sums[-1]
+        total = pos + neg + self.sums[0]
+        if not self.entries or total <= 0:
+            return 0, 0.0, 0
+        if max(pos, neg) < self.min_weight:
+            label = 0
+        else:
+            label = 1 if pos >= neg else -1
+        return label, round(self.sums[label] / total, 3), len(self.entries)
+
+
+class SentimentAggregator:
+    """
+    Sliding votes for the whole frame and per face track, and when to report them.
+
+    add(track, ts, label, weight, arrival)   a label for a crop captured at `ts`
+    poll(now) -> None | (overall, {track: result}, reason)
+        results are (label, confidence, samples); reason is "change" when
+        the overall label moved (at most once per `min_gap` s) or "cadence"
+        every `emit_every` s otherwise
+    """
+    def __init__(self, window, half_life=0.0, emit_every=2.0, on_change=True, min_gap=0.25, min_weight=0.25):
+        self.window = window
+        self.half_life = half_life
+        self.min_weight = min_weight
+        self.emit_every = emit_every
+        self.on_change = on_change
+        self.min_gap = min_gap
+        self.overall = SlidingVote(window, half_life, min_weight)
+        self.tracks = {}
+        self.last_label = None
+        self.last_emit = None
+        self.changes = 0
+
+    def add(self, track, ts, label, weight=1.0, arrival=None):
+        self.overall.add(ts, label, weight, arrival)
+        vote = self.tracks.get(track)
+        if vote is None:
+            vote = self.tracks[track] = SlidingVote(self.window, self.half_life, self.min_weight)
+        vote.add(ts, label, weight, arrival)
+
+    def forget(self, live_tracks):
+        """Drop tracks that left the frame (their votes stay in the overall stream)."""
+        for tid in list(self.tracks):
+            if tid not in live_tracks:
+                del self.tracks[tid]
+
+    def poll(self, now):
+        if self.last_emit is None:
+            self.last_emit = now
+        overall = self.overall.result(now)
+        reason = None
+        if self.on_change and overall[2] and overall[0] != self.last_label and (now - self.last_emit) >= self.min_gap:
+            reason = "change"
+        elif (now - self.last_emit) >= self.emit_every:
+            reason = "cadence"
+        if reason is None:
+            return None
+        if reason == "change" and self.last_label is not None:
+            self.changes += 1
+        self.last_label = overall[0]
+        self.last_emit = now
+        per_track = {tid: v.result(now) for tid, v in self.tracks.items()}
+        return overall, per_track, reason
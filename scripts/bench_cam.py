@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Per-stage microbenchmarks for the cam.py hot path.
+
+Times each stage on the same set of frames, sweeping its main knob:
+    detect    each --detectors backend; yunet/haar at several DETECT_SCALE
+              values, res10 once (it always runs at 300x300)
+    encode    PayloadEncoder.encode_batch (what goes on the wire) at several
+              PAYLOAD_EDGE x PAYLOAD_MAX_BYTES settings x crops per request
+    crop      crop_face_with_margin
+    preview   preview resize to PREVIEW_WIDTH x PREVIEW_HEIGHT
+
+Usage:
+    python bench_cam.py                                   # synthetic faces, 1280x720
+    python bench_cam.py --source video:clip.mp4 --frames 200
+    python bench_cam.py --detectors res10,yunet,haar      # compare backends
+    python bench_cam.py --out bench.json                  # save results
+    python bench_cam.py --baseline bench.json --threshold 0.15
+        # compare against a saved run; exits 1 if any stage's p50 or p95
+        # got slower by more than 15%
+
+Results (JSON on stdout or --out) have one entry per stage/parameter:
+    {"detect[yunet,scale=0.5]": {"n": 200, "mean_ms": ..., "p50_ms": ..., "p95_ms": ...,
+                                 "p99_ms": ..., "max_ms": ..., "per_sec": ...}, ...}
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import cam
+from frame_sources import open_source
+from payload import PayloadEncoder
+
+DETECT_SCALES = (0.25, 0.33, 0.5, 0.75, 1.0)
+PAYLOAD_EDGES = (224, 384, 512)
+PAYLOAD_BUDGETS = (0, 12000, 24000)     # max bytes per image; 0 = fixed JPEG_QUALITY
+BATCH_SIZES = (1, 4)                    # crops per request
+COMPARED = ("p50_ms", "p95_ms")
+
+
+def load_frames(spec, n, w, h):
+    """Pull `n` frames (copies) from any frame source, fast-paced."""
+    src = open_source(spec, w=w, h=h, pacing="fast", frames=n)
+    frames, seq = [], 0
+    try:
+        while len(frames) < n:
+            fr = src.wait_next(seq, timeout=5.0)
+            if fr is None:
+                break
+            seq = fr.seq
+            frames.append(fr.image.copy())
+    finally:
+        src.release()
+    if not frames:
+        raise RuntimeError(f"no frames from {spec}")
+    return frames
+
+
+def summarize(samples_s):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "per_sec": round(1000.0 / float(ms.mean()), 1) if ms.mean() > 0 else None,
+    }
+
+
+def timeit(fn, inputs, repeat=1, warmup=3):
+    """Time fn(x) per input; `warmup` untimed calls first (caches, lazy init)."""
+    for x in inputs[:warmup]:
+        fn(x)
+    out = []
+    clock = time.perf_counter
+    for _ in range(repeat):
+        for x in inputs:
+            t0 = clock()
+            fn(x)
+            out.append(clock() - t0)
+    return summarize(out)
+
+
+def face_boxes(frames):
+    """One face box per frame (detected at full scale; frame centre if none)."""
+    boxes = []
+    for f in frames:
+        box = cam.detect_face_fast(f, scale=1.0)
+        if box is None:
+            H, W = f.shape[:2]
+            box = (W // 3, H // 4, 2 * W // 3, 3 * H // 4)
+        boxes.append(box)
+    return boxes
+
+
+def bench_detectors(frames, kinds, repeat=1):
+    """Time each backend; only those that honour `scale` are swept over DETECT_SCALES."""
+    results = {}
+    for kind in kinds:
+        try:
+            det = cam.load_detector(kind)     # falls back to res10 if `kind` can't load
+        except Exception as e:
+            det, error = None, e
+        if det is None or det.name != kind:
+            sys.stderr.write(f"detector {kind} unavailable, skipped{': ' + str(error) if det is None else ''}\n")
+            continue
+        if not det.scaled:
+            results[f"detect[{det.name}]"] = timeit(lambda f: det.detect(f, cam.FACE_CONF), frames, repeat)
+            continue
+        for s in DETECT_SCALES:
+            results[f"detect[{det.name},scale={s}]"] = timeit(lambda f: det.detect(f, cam.FACE_CONF, s), frames, repeat)
+    return results
+
+
+def bench_payload(crops, repeat=1):
+    """
+    Time encode_batch on real-size face crops, one fresh encoder per setting
+    (so the quality search starts cold, as after a restart). Each entry also
+    carries the request size and the quality the encoder settled on.
+    """
+    results = {}
+    for n in BATCH_SIZES:
+        batches = [[crops[(i + k) % len(crops)] for k in range(n)] for i in range(len(crops))]
+        for edge in PAYLOAD_EDGES:
+            for budget in PAYLOAD_BUDGETS:
+                enc = PayloadEncoder(edge, cam.PAYLOAD_GRAY, cam.PAYLOAD_FORMAT, cam.JPEG_QUALITY,
+                                     budget, cam.PAYLOAD_MIN_QUALITY)
+                r = timeit(enc.encode_batch, batches, repeat)
+                st = enc.stats()
+                r["bytes_per_request"] = st["bytes_per_request"]
+                r["quality"] = st["quality"]
+                results[f"encode[edge={edge},max_bytes={budget},batch={n}]"] = r
+    return results
+
+
+def run(frames, repeat=1, detectors=(cam.DETECTOR,)):
+    results = bench_detectors(frames, detectors, repeat)
+
+    boxes = face_boxes(frames)
+    pairs = list(zip(frames, boxes))
+    results["crop"] = timeit(lambda fb: cam.crop_face_with_margin(*fb), pairs, repeat)
+
+    crops = [cam.crop_face_with_margin(f, b) for f, b in pairs]
+    crops = [c for c in crops if c.size] or [frames[0]]
+    results.update(bench_payload(crops, repeat))
+
+    size = (cam.PREVIEW_WIDTH, cam.PREVIEW_HEIGHT)
+    results["preview"] = timeit(lambda f: cv2.resize(f, size, interpolation=cv2.INTER_LINEAR), frames, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List of regressions: a compared percentile slower than baseline by more than `threshold`."""
+    regressions = []
+    for key, cur in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        for metric in COMPARED:
+            a, b = old.get(metric), cur.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            if change > threshold:
+                regressions.append({"stage": key, "metric": metric, "baseline": a,
+                                    "current": b, "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--source", default="synthetic", help="frame source spec (see frame_sources.py)")
+    ap.add_argument("--frames", type=int, default=100)
+    ap.add_argument("--width", type=int, default=cam.CAPTURE_WIDTH)
+    ap.add_argument("--height", type=int, default=cam.CAPTURE_HEIGHT)
+    ap.add_argument("--repeat", type=int, default=1, help="passes over the frame set per stage")
+    ap.add_argument("--detectors", default=cam.DETECTOR,
+                    help=f"comma-separated backends to time: res10,yunet,haar (default {cam.DETECTOR})")
+    ap.add_argument("--threads", type=int, default=None, help="cv2.setNumThreads (default: OpenCV's)")
+    ap.add_argument("--out", help="write results JSON here instead of stdout")
+    ap.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    args = ap.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    frames = load_frames(args.source, args.frames, args.width, args.height)
+    report = {
+        "meta": {
+            "source": args.source,
+            "frames": len(frames),
+            "frame_size": list(frames[0].shape[1::-1]),
+            "repeat": args.repeat,
+            "detectors": args.detectors,
+            "cv_threads": cv2.getNumThreads(),
+            "payload_format": cam.PAYLOAD_FORMAT,
+            "opencv": cv2.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "ts": round(time.time(), 3),
+        },
+        "results": run(frames, args.repeat, [k.strip() for k in args.detectors.split(",") if k.strip()]),
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as fh:
+            base = json.load(fh)
+        regressions = compare(report["results"], base.get("results", base), args.threshold)
+        report["baseline"] = {"path": args.baseline, "threshold": args.threshold, "regressions": regressions}
+        for r in regressions:
+            sys.stderr.write(f"REGRESSION {r['stage']} {r['metric']}: {r['baseline']:.3f} -> "
+                             f"{r['current']:.3f} ms (+{r['change'] * 100:.0f}%)\n")
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,208 +1,390 @@
 #!/usr/bin/env python3
 # emotion_cam_simple_vila_auto_smooth.py
-# Smooth preview (low-latency) + 5s rolling average via VILA.
+# Smooth preview (low-latency) + windowed sentiment vote via VILA.
 
+import time
+STARTED_AT = time.time()   # before the cv2 import, which is a good share of startup
 import cv2
-import base64
-import requests
 import json
 import re
-import time
+import sys
 import threading
 import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from aggregator import SentimentAggregator
+from camera_caps import DEFAULT_CACHE as DEFAULT_CAMERA_CAPS, load_caps, pick_mode
+from face_cache import LabelCache, face_phash
+from face_detector import configure_threads, make_detector
+from face_quality import FaceQuality
+from camlog import get_logger
+from events import EventWriter
+from face_tracking import TrackManager, expand_box
+from frame_share import FramePublisher, serve_mjpeg
+from frame_sources import open_source
+from metrics import make_metrics, serve as serve_metrics
+from motion_gate import MotionGate
+from model_store import ModelStore
+from payload import PayloadEncoder
+from sampling import AdaptiveSampler, FixedSampler
+from stages import Stage
+from provider_router import ProviderRouter
+from vlm_client import (ProviderClient, ProviderError, ProviderUnavailable, ProviderCancelled,
+                        RetryBudget, CircuitBreaker, TokenBucket)
+
 # ================== CONFIG ==================
 CAMERA_INDEX    = int(os.environ.get("CAMERA_INDEX", "0"))
+# Several cameras in one process: comma-separated indices and/or frame source specs,
+# e.g. "0,1" or "0,video:door.mp4". Unset = just CAMERA_INDEX / FRAME_SOURCE.
+CAMERAS         = [c.strip() for c in os.environ.get("CAMERAS", "").split(",") if c.strip()]
 NIM_API_KEY     = os.environ.get("NIM_API_KEY", "")
 OPENAI_API_KEY  = os.environ.get("OPENAI_KEY", "")
-VILA_URL        = "https://ai.api.nvidia.com/v1/vlm/nvidia/vila"
-OPENAI_URL      = "https://api.openai.com/v1/chat/completions"
+VILA_URL        = os.environ.get("VILA_URL", "https://ai.api.nvidia.com/v1/vlm/nvidia/vila")
+OPENAI_URL      = os.environ.get("OPENAI_URL", "https://api.openai.com/v1/chat/completions")
 USE_OPENAI      = os.environ.get("USE_OPENAI", "false").lower() == "true"
 HEADLESS        = os.environ.get("HEADLESS", "false").lower() == "true"
 DEBUG_WINDOW    = os.environ.get("DEBUG_WINDOW", "false").lower() == "true"  # Show window even if headless
+OUTPUT_FORMAT   = os.environ.get("OUTPUT_FORMAT", "legacy").lower()  # legacy (bare -1/0/1) | ndjson (see events.py)
+HEARTBEAT_SEC   = 5.0       # health event cadence in ndjson mode
+METRICS_PORT    = int(os.environ.get("METRICS_PORT", "0"))   # >0: Prometheus text at 127.0.0.1:PORT/metrics
+METRICS_ENABLED = os.environ.get("METRICS", "false").lower() == "true" or METRICS_PORT > 0
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", "10"))  # "metrics" event cadence (ndjson)
 
 WINDOW_SECONDS  = 2.0       # average over this window (changed from 5.0 to 2.0)
-SAMPLE_PERIOD   = 0.9       # classify at most once per ~0.9s
+WINDOW_GRACE    = float(os.environ.get("WINDOW_GRACE", "5.0"))  # tumbling: longest a closed window waits for its in-flight labels (s)
+# Window aggregation (see aggregator.py): sliding = decayed, confidence-weighted votes over the
+# last AGG_WINDOW s, reported on change and every AGG_EMIT_EVERY s; tumbling = the old fixed windows
+AGGREGATION     = os.environ.get("AGGREGATION", "sliding").lower()     # sliding | tumbling
+AGG_WINDOW      = float(os.environ.get("AGG_WINDOW", str(WINDOW_SECONDS)))
+AGG_HALF_LIFE   = float(os.environ.get("AGG_HALF_LIFE", "1.0"))         # vote decay, seconds (0 = none)
+AGG_EMIT_EVERY  = float(os.environ.get("AGG_EMIT_EVERY", str(WINDOW_SECONDS)))
+AGG_ON_CHANGE   = os.environ.get("AGG_ON_CHANGE", "true").lower() == "true"
+AGG_MIN_WEIGHT  = float(os.environ.get("AGG_MIN_WEIGHT", "0.25"))       # decayed weight happy/sad need to beat neutral
+SAMPLE_PERIOD   = 0.9       # base sampling period; adapted between the two bounds below
+ADAPTIVE_SAMPLING = os.environ.get("ADAPTIVE_SAMPLING", "true").lower() == "true"
+SAMPLE_MIN_PERIOD = 0.35    # fastest tick (expression changing / window short of votes)
+SAMPLE_MAX_PERIOD = 3.0     # slowest tick (labels stable)
+SAMPLE_MIN_VOTES  = int(os.environ.get("SAMPLE_MIN_VOTES", "2"))   # votes wanted per window
 DETECT_PERIOD   = 0.20      # run face detection ~5x/sec (not every frame)
-JPEG_QUALITY    = 85
+JPEG_QUALITY    = 85        # starting / highest encoder quality
 FACE_MARGIN     = 0.20
 FACE_CONF       = 0.50
-TIMEOUT_SEC     = 12
+MAX_FACES       = int(os.environ.get("MAX_FACES", "1"))   # >1: track and report several people (kiosk)
+TIMEOUT_SEC     = 12        # read timeout per VLM request
+
+# VLM payload (see payload.py): crops are shrunk and re-encoded to fit a byte budget
+PAYLOAD_EDGE    = int(os.environ.get("PAYLOAD_EDGE", "384"))         # longest crop side sent (0 = as cropped)
+PAYLOAD_GRAY    = os.environ.get("PAYLOAD_GRAY", "false").lower() == "true"
+PAYLOAD_FORMAT  = os.environ.get("PAYLOAD_FORMAT", "jpeg").lower()   # jpeg | webp
+PAYLOAD_MAX_BYTES = int(os.environ.get("PAYLOAD_MAX_BYTES", "24000"))  # per image, 0 = fixed JPEG_QUALITY
+PAYLOAD_MIN_QUALITY = 40
+
+# Provider HTTP client (keep-alive pool, retries, circuit breaker)
+CONNECT_TIMEOUT = float(os.environ.get("CONNECT_TIMEOUT", "3.05"))
+MAX_RETRIES     = int(os.environ.get("MAX_RETRIES", "2"))            # retries per call, on top of the first attempt
+RETRY_BUDGET    = int(os.environ.get("RETRY_BUDGET_PER_MIN", "10"))  # retries allowed per provider per minute
+BREAKER_FAILS   = int(os.environ.get("BREAKER_FAILS", "3"))          # consecutive failures that open the breaker
+BREAKER_COOLDOWN= float(os.environ.get("BREAKER_COOLDOWN", "30"))    # seconds before a half-open probe
+VILA_CALLS_PER_MIN   = int(os.environ.get("VILA_CALLS_PER_MIN", "60"))    # hard request cap (token bucket), 0 = none
+OPENAI_CALLS_PER_MIN = int(os.environ.get("OPENAI_CALLS_PER_MIN", "60"))
+# Provider routing (see provider_router.py): fastest healthy provider first; a slow answer
+# is hedged with the next provider after the primary's HEDGE_QUANTILE latency
+HEDGE           = os.environ.get("HEDGE", "true").lower() == "true"
+HEDGE_QUANTILE  = float(os.environ.get("HEDGE_QUANTILE", "0.9"))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "0.3"))   # never hedge sooner (s)
+HEDGE_BUDGET    = float(os.environ.get("HEDGE_BUDGET", "0.2"))      # max hedged share of requests
+
+# Background inference (keeps the capture/detect loop off the network)
+MAX_IN_FLIGHT   = int(os.environ.get("MAX_IN_FLIGHT", "2"))   # concurrent VLM requests
+MAX_CROP_AGE    = float(os.environ.get("MAX_CROP_AGE", "1.5")) # drop crops older than this (s) before sending
+
+# Staged pipeline (see stages.py): face detection and preview rendering run on worker threads
+# behind bounded drop-oldest queues, so each camera spreads over several cores
+PIPELINE        = os.environ.get("PIPELINE", "auto").lower()   # auto (staged with a window or several cameras) | staged | inline
+DETECT_WORKERS  = int(os.environ.get("DETECT_WORKERS", "1"))   # detect-stage threads per camera, each with its own net
+STAGE_QUEUE     = int(os.environ.get("STAGE_QUEUE", "2"))      # jobs waiting per stage before the oldest is dropped
+
+# Perceptual-hash label cache (skip VLM calls for unchanged faces)
+CACHE_ENABLED   = os.environ.get("LABEL_CACHE", "true").lower() == "true"
+CACHE_SIZE      = 64        # LRU entries
+CACHE_TTL       = 4.0       # seconds a cached label stays valid
+CACHE_MAX_DIST  = 6         # max Hamming distance (of 64 bits) to count as the same face
+
+# Local CPU expression classifier; remote VLM is only asked when unsure. Off by default: the
+# smile cascade's confidence is an uncalibrated hit count that also fires on neutral and frowning
+# faces, so only turn a local tier on with LOCAL_CONF checked against labelled crops of your own.
+LOCAL_CLASSIFIER = os.environ.get("LOCAL_CLASSIFIER", "none").lower()   # none | smile | onnx
+LOCAL_MODEL      = os.environ.get("LOCAL_MODEL", "")                     # ONNX model path (onnx backend)
+LOCAL_CONF       = float(os.environ.get("LOCAL_CONF", "0.7"))            # escalate to VLM below this
+SMILE_MIN_NEIGHBORS = 25    # neighbours in the strongest smile cluster to call it a smile
+SMILE_STRONG_HITS = 50      # ...and the count at which confidence saturates at 1.0
+SMILE_NONE_CONF  = 0.5      # confidence of "no smile -> neutral" (can't rule out sad, so low)
 
 # Preview tuning (lower = smoother UI)
 PREVIEW_WIDTH   = 960       # try 960x540 or 640x360 for max smoothness
 PREVIEW_HEIGHT  = 540
 CAPTURE_WIDTH   = 1280      # native capture request; driver can ignore
 CAPTURE_HEIGHT  = 720
+CAPTURE_FPS     = 30
+FRAME_SLOTS     = 4         # preallocated frames in the capture ring buffer
+
+# Frame source (see frame_sources.py): camera | video:<path> | images:<dir> | synthetic[:faces|noise]
+FRAME_SOURCE    = os.environ.get("FRAME_SOURCE", "camera")
+SOURCE_PACING   = os.environ.get("SOURCE_PACING", "realtime").lower()  # realtime | fast (non-camera sources)
+SOURCE_FPS      = float(os.environ.get("SOURCE_FPS", "0"))    # 0 = file's own rate / capture fps
+SOURCE_LOOP     = os.environ.get("SOURCE_LOOP", "false").lower() == "true"
+SYNTH_FRAMES    = int(os.environ.get("SYNTH_FRAMES", "0"))    # synthetic frames before end of stream (0 = endless)
+SYNTH_FACES     = int(os.environ.get("SYNTH_FACES", "1"))
+SYNTH_SPRITE    = os.environ.get("SYNTH_SPRITE", "")          # optional face photo pasted instead of the cartoon
+
+# Frame sharing (see frame_share.py): other local consumers see our frames without opening the camera
+SHARE_PORT      = int(os.environ.get("SHARE_PORT", "0"))     # >0: MJPEG at 127.0.0.1:PORT/stream.mjpg
+SHARE_SHM       = os.environ.get("SHARE_SHM", "")            # shared-memory ring name ("<name>-<n>" for camera n > 0)
+SHARE_FPS       = float(os.environ.get("SHARE_FPS", "10"))   # cap; headless loops publish at their own (lower) pace
+SHARE_WIDTH     = int(os.environ.get("SHARE_WIDTH", "640"))
+SHARE_QUALITY   = int(os.environ.get("SHARE_QUALITY", "70"))
+
+# Headless (no preview window) runs in a compute-minimal mode: no preview/HUD work,
+# frames decoded only when a stage needs one, capture negotiated down to what
+# detection needs, and the loop sleeps until the next stage is due.
+SHOW_WINDOW     = (not HEADLESS) or DEBUG_WINDOW
+HEADLESS_CAPTURE_WIDTH  = 640   # detector input is ~640 px wide anyway (1280 * DETECT_SCALE)
+HEADLESS_CAPTURE_HEIGHT = 360
+HEADLESS_CAPTURE_FPS    = 15
+HEADLESS_TRACK_FPS      = float(os.environ.get("HEADLESS_TRACK_FPS", "6"))  # tracker updates/s while a face is tracked
+HEADLESS_CV_THREADS     = 1     # OpenCV worker threads; tiny per-frame work doesn't pay for a pool
+# Capability cache (see camera_caps.py; written by `python camera_caps.py`): a live camera opens in
+# the cheapest measured mode that is at least as wide and fast as the request above. No probing here.
+CAMERA_CAPS     = os.environ.get("CAMERA_CAPS", "")   # cache path (default: camera_caps.json next to this script)
+
+# Face detection (see face_detector.py)
+DETECTOR        = os.environ.get("DETECTOR", "res10").lower()   # res10 | yunet | haar
+DETECT_SCALE    = 0.5       # yunet/haar run on a downscaled frame (res10 always sees 300x300)
+DETECT_THREADS  = os.environ.get("DETECT_THREADS")               # cv2/DNN worker threads (unset = OpenCV default;
+                                                                 # staged pipeline: cores / detect workers)
+DETECT_WARMUP   = os.environ.get("DETECT_WARMUP", "true").lower() == "true"
 
-# Face detection speedups
-DETECT_SCALE    = 0.5       # run detector on a downscaled frame, map bbox back
+# Startup: the detector loads (and warms up) on a background thread while the
+# camera opens; model files are verified against a local manifest (model_store.py)
+MODEL_DIR       = os.environ.get("MODEL_DIR", "")                 # default: next to this script
+MODEL_DOWNLOAD  = os.environ.get("MODEL_DOWNLOAD", "true").lower() == "true"  # false = never touch the network
+# Persistent worker: load once, then serve start/stop commands from stdin (see worker_loop)
+WORKER_MODE     = os.environ.get("WORKER_MODE", "false").lower() == "true"
+
+# Change gate ahead of detection (see motion_gate.py): skip the detector while the scene is static
+MOTION_GATE     = os.environ.get("MOTION_GATE", "true").lower() == "true"
+GATE_THRESHOLD  = float(os.environ.get("GATE_THRESHOLD", "3.0"))   # mean abs diff (0-255) of a 32 px gray thumbnail
+GATE_REFRESH    = float(os.environ.get("GATE_REFRESH", "2.0"))     # detect at least this often anyway (s)
+
+# Face-quality gate (see face_quality.py): unusable crops are retried on the next frames, then dropped
+QUALITY_GATE    = os.environ.get("QUALITY_GATE", "true").lower() == "true"
+QUALITY_MIN_SIZE = int(os.environ.get("QUALITY_MIN_SIZE", "48"))          # px, shorter crop side
+QUALITY_MIN_SHARPNESS = float(os.environ.get("QUALITY_MIN_SHARPNESS", "15"))  # Laplacian variance at 96 px wide
+QUALITY_DEFER   = 0.5       # keep retrying a rejected face on new frames for this long (s)
+
+# Face tracking between detections
+TRACKER         = os.environ.get("TRACKER", "flow").lower()  # flow | kcf | csrt | none
+TRACK_SCALE     = 0.5       # optical-flow tracker works on a downscaled gray frame
+REDETECT_PERIOD = 1.0       # while tracking, re-anchor with the SSD this often
+ROI_EXPAND      = 0.75      # re-detect only inside the last box grown by this fraction per side
 # ==========================================================
 
+log = get_logger()
+metrics = make_metrics(METRICS_ENABLED)   # no-op unless METRICS=true / METRICS_PORT is set
+
 BASE_DIR = Path(__file__).resolve().parent
-PROTOTXT = BASE_DIR / "deploy.prototxt"
-CAFFE_MODEL = BASE_DIR / "res10_300x300_ssd_iter_140000.caffemodel"
+MODELS = ModelStore(Path(MODEL_DIR) if MODEL_DIR else BASE_DIR, allow_download=MODEL_DOWNLOAD)
+PROTOTXT = "deploy.prototxt"
+SMILE_CASCADE = BASE_DIR / "haarcascade_smile.xml"
+CAFFE_MODEL = "res10_300x300_ssd_iter_140000.caffemodel"
 PROTOTXT_URL = "https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/deploy.prototxt"
 CAFFE_MODEL_URL = "https://github.com/opencv/opencv_3rdparty/raw/dnn_samples_face_detector_20170830/res10_300x300_ssd_iter_140000.caffemodel"
+YUNET_MODEL = "face_detection_yunet_2023mar.onnx"
+YUNET_MODEL_URL = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
 
 # ---------------- Utils ----------------
-def download_if_needed(path, url):
-    if not path.exists():
-        path.parent.mkdir(parents=True, exist_ok=True)
-        from urllib.request import urlretrieve
-        print(f"Downloading {path.name}...")
-        urlretrieve(url, path)
-
-def encode_image_b64(img_bgr, quality=JPEG_QUALITY):
-    ok, buf = cv2.imencode(".jpg", img_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
-    if not ok:
-        raise RuntimeError("JPEG encode failed")
-    return base64.b64encode(buf).decode("ascii")
-
-def call_openai_vision(image_b64):
-    """
-    Ask OpenAI GPT-4 Vision for sentiment classification.
-    Return int in {-1,0,1}. On parse/HTTP error → 0.
-    """
-    import sys
-    prompt = (
-        "Classify this face expression. Output ONLY one integer:\n"
-        "1 = HAPPY/SMILING (mouth corners up)\n"
-        "-1 = SAD/FROWNING (mouth corners down / lip pressed out)\n"
-        "0 = NEUTRAL (relaxed)\n"
-        "Be decisive. Output only: 1, -1, or 0"
+def make_provider_client(name, url, calls_per_min=0):
+    return ProviderClient(
+        name, url,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=TIMEOUT_SEC,
+        max_retries=MAX_RETRIES,
+        retry_budget=RetryBudget(RETRY_BUDGET),
+        breaker=CircuitBreaker(BREAKER_FAILS, BREAKER_COOLDOWN),
+        call_budget=TokenBucket(calls_per_min),
+        pool_size=max(2, MAX_IN_FLIGHT),
     )
+
+# One pooled keep-alive client per provider, shared by all inference workers
+vila_client   = make_provider_client("vila", VILA_URL, VILA_CALLS_PER_MIN)
+openai_client = make_provider_client("openai", OPENAI_URL, OPENAI_CALLS_PER_MIN)
+
+def make_payload_encoder(fmt=PAYLOAD_FORMAT):
+    try:
+        return PayloadEncoder(PAYLOAD_EDGE, PAYLOAD_GRAY, fmt, JPEG_QUALITY, PAYLOAD_MAX_BYTES, PAYLOAD_MIN_QUALITY)
+    except (RuntimeError, ValueError) as e:
+        log.error("Payload format '%s' unavailable, using JPEG: %s", fmt, e)
+        return PayloadEncoder(PAYLOAD_EDGE, PAYLOAD_GRAY, "jpeg", JPEG_QUALITY, PAYLOAD_MAX_BYTES, PAYLOAD_MIN_QUALITY)
+
+payload_encoder = make_payload_encoder()
+
+def remote_budget_available():
+    """Can a VLM request go out now without hitting a provider's calls-per-minute cap?"""
+    return any(PROVIDER_CLIENTS[name].call_budget.available() >= 1 for name, _ in router.backends)
+
+SINGLE_PROMPT = (
+    "Classify this face expression. Output ONLY one integer:\n"
+    "1 = HAPPY/SMILING (mouth corners up)\n"
+    "-1 = SAD/FROWNING (mouth corners down / lip pressed out)\n"
+    "0 = NEUTRAL (relaxed)\n"
+    "Be decisive. Output only: 1, -1, or 0"
+)
+BATCH_PROMPT = (
+    "You are given {n} face images, in order. Classify each face expression as ONE integer:\n"
+    "1 = HAPPY/SMILING (mouth corners up)\n"
+    "-1 = SAD/FROWNING (mouth corners down / lip pressed out)\n"
+    "0 = NEUTRAL (relaxed)\n"
+    "Be decisive. Output ONLY {n} integers separated by commas, one per image, in the same order."
+)
+
+def _vlm_content(images_b64):
+    """
+    Chat content parts: prompt + one image_url part per crop (several faces share one request).
+    Items are data: URLs from PayloadEncoder.
+    """
+    n = len(images_b64)
+    prompt = SINGLE_PROMPT if n == 1 else BATCH_PROMPT.format(n=n)
+    parts = [{"type": "text", "text": prompt}]
+    for url in images_b64:
+        parts.append({"type": "image_url", "image_url": {"url": url}})
+    return parts
+
+def _parse_labels(text, n):
+    """
+    Extract n labels in {-1,0,1} from a model reply.
+    Single image: first integer, anything invalid -> 0 (as before).
+    Batch: None unless exactly n integers came back, so labels never shift onto the wrong face.
+    """
+    nums = [int(x) for x in re.findall(r'-?\d+', text)]
+    if n == 1:
+        return [nums[0] if nums and nums[0] in (-1, 0, 1) else 0]
+    if len(nums) != n:
+        return None
+    return [v if v in (-1, 0, 1) else 0 for v in nums]
+
+def _split_request(request_fn, images_b64, cancel):
+    """Batch reply unusable: fall back to one request per image."""
+    return [request_fn([b64], cancel)[0] for b64 in images_b64]
+
+def _reply_text(data):
+    content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+    if isinstance(content, list):
+        return "".join(p.get("text", "") for p in content)
+    return content or ""
+
+def _provider_request(name, client, payload, headers, cancel):
+    """POST with metrics; every failure surfaces as ProviderError."""
+    metrics.incr("provider_calls", provider=name)
+    try:
+        with metrics.timer("provider", provider=name):
+            data = client.post_json(payload, headers, cancel)
+        return _reply_text(data)
+    except ProviderUnavailable as e:
+        log.debug("%s skipped (%s)", name, e, key=f"{name}_skipped")
+        metrics.incr("provider_short_circuits", provider=name)
+        raise
+    except ProviderError as e:
+        if not isinstance(e, ProviderCancelled):
+            log.error("%s API error: %s", name, e, key=f"{name}_error")
+            metrics.incr("provider_failures", provider=name)
+        raise
+    except (AttributeError, IndexError, TypeError) as e:
+        log.error("%s API unexpected reply: %s", name, e, key=f"{name}_unexpected")
+        metrics.incr("provider_failures", provider=name)
+        raise ProviderError(name, f"unexpected reply: {e}")
+
+def openai_request(images_b64, cancel=None):
+    """
+    One OpenAI GPT-4 Vision request: a label in {-1,0,1} per image.
+    Raises ProviderError on HTTP/breaker/budget failure (the router decides what's next).
+    """
+    n = len(images_b64)
     payload = {
         "model": "gpt-4o-mini",
-        "messages": [{
-            "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
-            ]
-        }],
-        "max_tokens": 10
+        "messages": [{"role": "user", "content": _vlm_content(images_b64)}],
+        "max_tokens": 10 if n == 1 else 4 * n + 8
     }
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
     }
+    log.debug("Calling OpenAI Vision API (%d image(s))...", n, key="openai_call")
+    content = _provider_request("openai", openai_client, payload, headers, cancel)
+    log.debug("OpenAI response: %r", content, key="openai_response")
+    labels = _parse_labels(content, n)
+    if labels is None:
+        log.warning("OpenAI batch reply didn't have %d labels, splitting", n, key="openai_split")
+        return _split_request(openai_request, images_b64, cancel)
+    log.debug("Extracted value(s): %s", labels, key="extracted")
+    return labels
 
-    try:
-        sys.stderr.write(f"[DEBUG] Calling OpenAI Vision API...\n")
-        sys.stderr.flush()
-        r = requests.post(OPENAI_URL, headers=headers, json=payload, timeout=TIMEOUT_SEC)
-        r.raise_for_status()
-        data = r.json()
-        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        sys.stderr.write(f"[DEBUG] OpenAI response: '{content}'\n")
-        sys.stderr.flush()
-        nums = re.findall(r'-?\d+', content)
-        if nums:
-            val = int(nums[0])
-            sys.stderr.write(f"[DEBUG] Extracted value: {val}\n")
-            sys.stderr.flush()
-            if val in (-1, 0, 1):
-                return val
-        return 0
-    except Exception as e:
-        sys.stderr.write(f"[ERROR] OpenAI Vision API error: {e}\n")
-        sys.stderr.flush()
-        return 0
-
-def call_vila_single_label(image_b64):
+def vila_request(images_b64, cancel=None):
     """
-    Ask VILA for EXACTLY one of: 1 (happy), -1 (sad), 0 (neutral).
-    Return int in {-1,0,1}. On parse/HTTP error → 0.
-    Falls back to OpenAI if VILA fails.
+    One VILA request: a label in {-1,0,1} per image.
+    Raises ProviderError on HTTP/breaker/budget failure (the router decides what's next).
     """
-    import sys
-
-    # If configured to use OpenAI, skip VILA entirely
-    if USE_OPENAI:
-        sys.stderr.write(f"[DEBUG] USE_OPENAI=true, calling OpenAI directly...\n")
-        sys.stderr.flush()
-        return call_openai_vision(image_b64)
-
-    prompt = (
-        "Classify this face expression. Output ONLY one integer:\n"
-        "1 = HAPPY/SMILING (mouth corners up)\n"
-        "-1 = SAD/FROWNING (mouth corners down / lip pressed out)\n"
-        "0 = NEUTRAL (relaxed)\n"
-        "Be decisive. Output only: 1, -1, or 0"
-    )
+    n = len(images_b64)
     payload = {
         "model": "nvidia/vila",
-        "messages": [{
-            "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
-            ]
-        }],
+        "messages": [{"role": "user", "content": _vlm_content(images_b64)}],
         "temperature": 0.0,
-        "max_tokens": 8
+        "max_tokens": 8 if n == 1 else 4 * n + 8
     }
     headers = {
         "Authorization": f"Bearer {NIM_API_KEY}",
         "Content-Type": "application/json",
         "Accept": "application/json",
     }
+    log.debug("Calling VILA API (%d image(s))...", n, key="vila_call")
+    text = _provider_request("vila", vila_client, payload, headers, cancel)
+    log.debug("VILA response: %r", text, key="vila_response")
+    labels = _parse_labels(text, n)
+    if labels is None:
+        log.warning("VILA batch reply didn't have %d labels, splitting", n, key="vila_split")
+        return _split_request(vila_request, images_b64, cancel)
+    log.debug("Extracted value(s): %s", labels, key="extracted")
+    return labels
+
+def make_router():
+    """VILA first (unless USE_OPENAI), OpenAI when it has a key; order only matters until latencies are known."""
+    backends = []
+    if not USE_OPENAI:
+        backends.append(("vila", vila_request))
+    if USE_OPENAI or OPENAI_API_KEY:
+        backends.append(("openai", openai_request))
+    return ProviderRouter(backends, hedge=HEDGE, hedge_quantile=HEDGE_QUANTILE, hedge_min=HEDGE_MIN_DELAY,
+                          hedge_budget=HEDGE_BUDGET, max_workers=2 * max(2, MAX_IN_FLIGHT))
 
+router = make_router()
+PROVIDER_CLIENTS = {"vila": vila_client, "openai": openai_client}
+
+def route_batch(images_b64):
+    """
+    Classify via the router: fastest healthy provider, hedged when it is slow,
+    failing over on errors. Return (labels, provider that answered); if every
+    provider failed → 0s and "<provider>:error", so callers can tell a real
+    neutral from a failure.
+    """
     try:
-        sys.stderr.write(f"[DEBUG] Calling VILA API...\n")
-        sys.stderr.flush()
-        r = requests.post(VILA_URL, headers=headers, json=payload, timeout=TIMEOUT_SEC)
-
-        # Log response details
-        sys.stderr.write(f"[DEBUG] VILA API Status Code: {r.status_code}\n")
-        sys.stderr.flush()
-
-        if r.status_code != 200:
-            sys.stderr.write(f"[ERROR] VILA API returned {r.status_code}: {r.text[:200]}\n")
-            sys.stderr.flush()
-            # Try OpenAI fallback on non-200 status
-            if OPENAI_API_KEY:
-                sys.stderr.write(f"[DEBUG] Falling back to OpenAI...\n")
-                sys.stderr.flush()
-                return call_openai_vision(image_b64)
-            return 0
-
-        data = r.json()
-        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        if isinstance(content, list):
-            text = "".join(p.get("text", "") for p in content)
-        else:
-            text = content or ""
-        sys.stderr.write(f"[DEBUG] VILA response: '{text}'\n")
-        sys.stderr.flush()
-        nums = re.findall(r'-?\d+', text)
-        if nums:
-            val = int(nums[0])
-            sys.stderr.write(f"[DEBUG] Extracted value: {val}\n")
-            sys.stderr.flush()
-            if val in (-1, 0, 1):
-                return val
-        sys.stderr.write(f"[DEBUG] No valid value found, returning 0\n")
-        sys.stderr.flush()
-        return 0
-    except requests.exceptions.RequestException as e:
-        sys.stderr.write(f"[ERROR] VILA API request error: {e}\n")
-        sys.stderr.flush()
-        # Fallback to OpenAI if available
-        if OPENAI_API_KEY:
-            sys.stderr.write(f"[DEBUG] Falling back to OpenAI after request error...\n")
-            sys.stderr.flush()
-            return call_openai_vision(image_b64)
-        return 0
+        return router.route(images_b64)
     except Exception as e:
-        sys.stderr.write(f"[ERROR] VILA API unexpected error: {e}\n")
-        sys.stderr.flush()
-        # Fallback to OpenAI if available
-        if OPENAI_API_KEY:
-            return call_openai_vision(image_b64)
-        return 0
+        name = getattr(e, "provider", None)
+        if name not in PROVIDER_CLIENTS:
+            name = router.backends[0][0]
+        log.debug("No provider answered: %s", e, key="route_failed")
+        return [0] * len(images_b64), f"{name}:error"
 
 def majority_vote_bias_non_neutral(values):
     pos = values.count(1)
@@ -211,49 +393,336 @@ def majority_vote_bias_non_neutral(values):
         return 0
     return 1 if pos >= neg else -1
 
+def window_confidence(values, final):
+    """Share of the window's votes that agree with its final label."""
+    return round(values.count(final) / float(len(values)), 3) if values else 0.0
+
 def label_text_and_color(v):
     if v == 1:   return "HAPPY (1)",   (0, 220, 0)
     if v == -1:  return "SAD (-1)",    (0, 0, 255)
     return "NEUTRAL (0)", (160, 160, 160)
 
-# ---------------- Face DNN ----------------
-download_if_needed(PROTOTXT, PROTOTXT_URL)
-download_if_needed(CAFFE_MODEL, CAFFE_MODEL_URL)
-face_net = cv2.dnn.readNetFromCaffe(str(PROTOTXT), str(CAFFE_MODEL))
-# Keep DNN on CPU (default). On some builds, you can try: face_net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+def classify_faces(face_imgs):
+    """
+    Classify every crop of one sampling tick with a single VLM request.
+    Returns (labels, provider).
+    """
+    with metrics.timer("encode"):
+        urls, sent = payload_encoder.encode_batch(face_imgs)
+    metrics.incr("payload_bytes", sent)
+    log.debug("Payload: %d image(s), %d bytes", len(urls), sent, key="payload")
+    return route_batch(urls)
+
+# ---------------- Expression classifiers ----------------
+class ExpressionClassifier:
+    """
+    Pluggable classifier interface.
+    classify(face_bgr) -> (label in {-1,0,1}, confidence in [0,1]).
+    """
+    name = "base"
+
+    def classify(self, face_bgr):
+        raise NotImplementedError
+
+class SmileCascadeClassifier(ExpressionClassifier):
+    """
+    Haar smile cascade on the lower half of the face (~20 ms on CPU).
+    Raw (unmerged) hits are clustered; confidence is the size of the strongest
+    cluster near the horizontal centre of the mouth region, relative to
+    `strong_hits` (so a weak smile, e.g. 25 of 50 hits, is 0.5 and escalated).
+    A missing smile can mean neutral or sad, so it is reported with low
+    confidence and normally escalated.
+    """
+    name = "smile_cascade"
+
+    def __init__(self, path=SMILE_CASCADE, min_neighbors=SMILE_MIN_NEIGHBORS,
+                 strong_hits=SMILE_STRONG_HITS, none_conf=SMILE_NONE_CONF):
+        self.cascade = cv2.CascadeClassifier(str(path))
+        if self.cascade.empty():
+            raise RuntimeError(f"Cannot load smile cascade: {path}")
+        self.min_neighbors = min_neighbors
+        self.strong_hits = strong_hits
+        self.none_conf = none_conf
+
+    def classify(self, face_bgr):
+        gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape[:2]
+        mouth = gray[h // 2:, :]
+        # Normalize size so scale search cost is constant regardless of face size
+        if w > 160:
+            mouth = cv2.resize(mouth, (160, int(mouth.shape[0] * 160 / w)), interpolation=cv2.INTER_AREA)
+        mouth = cv2.equalizeHist(mouth)
+        min_w = max(12, mouth.shape[1] // 4)
+        hits = self.cascade.detectMultiScale(mouth, scaleFactor=1.1, minNeighbors=0,
+                                             minSize=(min_w, min_w // 2))
+        best = 0
+        if len(hits):
+            groups, weights = cv2.groupRectangles([[int(v) for v in r] for r in hits], 1, 0.2)
+            mw = mouth.shape[1]
+            for (x, y, gw, gh), n in zip(groups, weights):
+                cx = x + gw / 2.0
+                # A real smile sits mid-face and spans a good part of its width
+                if abs(cx - mw / 2.0) < mw * 0.2 and gw >= mw * 0.3:
+                    best = max(best, int(n))
+        if best >= self.min_neighbors:
+            # Evidence alone: the share of a strong cluster's hits; LOCAL_CONF decides what is enough
+            return 1, min(1.0, best / float(self.strong_hits))
+        return 0, self.none_conf
+
+class OnnxExpressionClassifier(ExpressionClassifier):
+    """
+    Small ONNX expression model through cv2.dnn (e.g. FER+ 64x64 grayscale).
+    Class scores are softmaxed and folded into {-1,0,1}.
+    """
+    name = "onnx"
+    # FER+ class order
+    CLASS_TO_LABEL = [0, 1, 1, -1, -1, -1, -1, -1]   # neutral happy surprise sad anger disgust fear contempt
+
+    def __init__(self, path, input_size=64, class_to_label=None):
+        self.net = cv2.dnn.readNetFromONNX(str(path))
+        self.input_size = input_size
+        self.class_to_label = class_to_label or self.CLASS_TO_LABEL
+
+    def classify(self, face_bgr):
+        import numpy as np
+        gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
+        blob = cv2.dnn.blobFromImage(gray, 1.0, (self.input_size, self.input_size))
+        self.net.setInput(blob)
+        scores = self.net.forward().reshape(-1).astype(np.float64)
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        votes = {-1: 0.0, 0: 0.0, 1: 0.0}
+        for p, lab in zip(probs, self.class_to_label):
+            votes[lab] += float(p)
+        label = max(votes, key=votes.get)
+        return label, votes[label]
+
+def local_answer(clf, face_bgr, min_conf=LOCAL_CONF):
+    """(label, confidence) if the local tier is sure enough to skip the VLM, else None (escalate)."""
+    if clf is None:
+        return None
+    label, conf = clf.classify(face_bgr)
+    if label is None or conf < min_conf:
+        return None
+    return label, conf
+
+def make_local_classifier(kind=LOCAL_CLASSIFIER):
+    """Build the configured local backend, or None (every sample goes remote)."""
+    try:
+        if kind == "smile":
+            return SmileCascadeClassifier()
+        if kind == "onnx":
+            if not LOCAL_MODEL:
+                raise RuntimeError("LOCAL_CLASSIFIER=onnx needs LOCAL_MODEL")
+            return OnnxExpressionClassifier(LOCAL_MODEL)
+    except Exception as e:
+        log.error("Local classifier '%s' unavailable, using VLM only: %s", kind, e)
+    return None
+
+# ---------------- Background inference ----------------
+InferenceResult = namedtuple("InferenceResult", "capture_ts label key track_id provider latency camera")
+ClosedWindow = namedtuple("ClosedWindow", "start end labels")   # tumbling window waiting for in-flight labels
+
+class InferenceExecutor:
+    """
+    Run classification off the main loop on a small thread pool.
+    Each submit() is one batch of crops from the same frame, tagged with its
+    capture timestamp.
+    `classify_fn(list_of_imgs)` returns (labels, provider). At most
+    `max_in_flight` batches are outstanding and extra batches are dropped
+    instead of queued. Finished InferenceResults are collected with drain();
+    `key` and `track_id` are passed through untouched (e.g. the crop's
+    perceptual hash and its face track). One executor is shared by every
+    camera, so the in-flight cap is process-wide; results are kept per
+    `camera` and each pipeline drains only its own. new_session() (a worker
+    `start`) discards whatever earlier sessions left behind, including
+    batches that finish later.
+    """
+    def __init__(self, classify_fn, max_in_flight=MAX_IN_FLIGHT, max_age=MAX_CROP_AGE):
+        self.classify_fn = classify_fn
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_age = max_age
+        self.pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="vlm")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.in_flight_ts = {}   # camera -> capture_ts of each batch submitted and not finished
+        self.results = {}        # camera -> [InferenceResult]
+        self.session = 0         # bumped by new_session(); each batch carries the one it was sent in
+        self.dropped_busy = 0
+        self.dropped_stale = 0
+        self.failed = 0
+        self.completed = 0
+        self.busy = 0.0          # seconds spent classifying
+
+    def in_flight(self):
+        with self.lock:
+            return self.pending
+
+    def pending_before(self, camera, ts):
+        """Batches for `camera` captured before `ts` that haven't finished yet."""
+        with self.lock:
+            return sum(1 for t in self.in_flight_ts.get(camera, ()) if t < ts)
+
+    def new_session(self):
+        """Forget results and in-flight bookkeeping of earlier sessions; their late batches are dropped."""
+        with self.lock:
+            self.session += 1
+            self.results.clear()
+            self.in_flight_ts.clear()
+
+    def submit(self, items, capture_ts, camera=None):
+        """
+        items: list of (face_img, key, track_id).
+        Non-blocking. Returns False if the batch was dropped because all slots are busy.
+        """
+        with self.lock:
+            if self.pending >= self.max_in_flight:
+                self.dropped_busy += 1
+                metrics.incr("dropped_samples", reason="busy")
+                return False
+            self.pending += 1
+            self.in_flight_ts.setdefault(camera, []).append(capture_ts)
+            session = self.session
+        try:
+            self.pool.submit(self._run, list(items), capture_ts, camera, session)
+        except RuntimeError:
+            # Pool already shut down
+            with self.lock:
+                self.pending -= 1
+                self.in_flight_ts[camera].remove(capture_ts)
+            return False
+        return True
+
+    def _run(self, items, capture_ts, camera, session=0):
+        try:
+            if (time.time() - capture_ts) > self.max_age:
+                with self.lock:
+                    self.dropped_stale += 1
+                metrics.incr("dropped_samples", reason="stale")
+                return
+            t0 = time.time()
+            labels, provider = self.classify_fn([img for img, _, _ in items])
+            latency = time.time() - t0
+            with self.lock:
+                self.completed += 1
+                self.busy += latency
+                if session != self.session:
+                    # Sent before a worker restart; the new session's windows never asked for it
+                    self.dropped_stale += 1
+                    metrics.incr("dropped_samples", reason="old_session")
+                    return
+                out = self.results.setdefault(camera, [])
+                for (_, key, track_id), lab in zip(items, labels):
+                    out.append(InferenceResult(capture_ts, lab, key, track_id, provider, latency, camera))
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            metrics.incr("classify_failures")
+            log.error("Background classification failed: %s", e, key="classify_failed")
+        finally:
+            with self.lock:
+                self.pending -= 1
+                if session == self.session:
+                    self.in_flight_ts[camera].remove(capture_ts)
+
+    def drain(self, camera=None):
+        """Return and clear the InferenceResults finished so far for `camera`."""
+        with self.lock:
+            return self.results.pop(camera, [])
+
+    def snapshot(self):
+        """Classify-stage totals (process-wide: one executor serves every camera)."""
+        with self.lock:
+            return {"workers": self.max_in_flight, "in_flight": self.pending, "done": self.completed,
+                    "dropped": self.dropped_busy + self.dropped_stale, "failed": self.failed,
+                    "service_ms": round(self.busy / self.completed * 1000, 1) if self.completed else None}
+
+    def shutdown(self):
+        # Don't wait on hung HTTP calls; worker threads finish on their own
+        self.pool.shutdown(wait=False)
+
+# ---------------- Face detection ----------------
+def load_detector(kind=DETECTOR):
+    """Verify (or fetch) the backend's model file and build it; falls back to res10 if it can't."""
+    configure_threads(DETECT_THREADS)
+    if kind == "yunet":
+        try:
+            return make_detector("yunet", yunet_model=MODELS.path(YUNET_MODEL, YUNET_MODEL_URL))
+        except Exception as e:
+            log.error("YuNet detector unavailable, using res10: %s", e)
+    elif kind == "haar":
+        try:
+            return make_detector("haar")
+        except Exception as e:
+            log.error("Haar detector unavailable, using res10: %s", e)
+    return make_detector("res10", res10_files=(MODELS.path(PROTOTXT, PROTOTXT_URL),
+                                               MODELS.path(CAFFE_MODEL, CAFFE_MODEL_URL)))
+
+class DetectorLoader:
+    """
+    Loads (and optionally warms up) the detector once, on a background thread,
+    so it overlaps with opening the camera. get() waits for it; a load
+    failure is re-raised there.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.detector = None
+        self.error = None
+        self.done = threading.Event()
+        self.load_ms = None
+        self.ready_at = None
+
+    def start(self, warmup_size=None):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._load, args=(warmup_size,), name="detector-load", daemon=True)
+                self.thread.start()
+        return self
+
+    def _load(self, warmup_size):
+        t0 = time.time()
+        try:
+            det = load_detector()
+            if warmup_size:
+                det.warmup(*warmup_size)
+            self.detector = det
+            self.ready_at = time.time()
+            self.load_ms = (self.ready_at - t0) * 1000
+            log.info("Detector %s ready in %.0f ms%s (cv threads: %d, models: %s)", det.name, self.load_ms,
+                     " incl. warm-up" if warmup_size else "", cv2.getNumThreads(), MODELS.stats())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
 
-def detect_face_fast(frame_bgr, conf_thr=FACE_CONF, scale=DETECT_SCALE):
+    def get(self):
+        self.start()
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.detector
+
+detector_loader = DetectorLoader()  # nothing is loaded at import; main() starts it, detect_faces() waits on it
+detector_lock = threading.Lock()    # cv2.dnn nets aren't safe to run from several camera threads at once
+
+def detect_faces(frame_bgr, conf_thr=FACE_CONF, scale=DETECT_SCALE, roi=None):
+    """
+    Detect with the configured backend and map bboxes back to original coords.
+    With `roi` (x1,y1,x2,y2) only that region is searched (no extra downscale).
+    Returns [((x1,y1,x2,y2), conf), ...] for every face above conf_thr, best first.
     """
-    Downscale -> detect -> map bbox back to original coords.
+    det = detector_loader.get()
+    with detector_lock:
+        return det.detect(frame_bgr, conf_thr, scale, roi)
+
+def detect_face_fast(frame_bgr, conf_thr=FACE_CONF, scale=DETECT_SCALE, roi=None):
+    """
+    Highest-confidence face only.
     Returns (x1,y1,x2,y2) or None.
     """
-    H, W = frame_bgr.shape[:2]
-    if scale != 1.0:
-        small = cv2.resize(frame_bgr, (int(W*scale), int(H*scale)), interpolation=cv2.INTER_LINEAR)
-    else:
-        small = frame_bgr
-
-    h, w = small.shape[:2]
-    blob = cv2.dnn.blobFromImage(cv2.resize(small, (300, 300)), 1.0, (300, 300), (104, 177, 123))
-    face_net.setInput(blob)
-    dets = face_net.forward()
-
-    best_box, best_conf = None, 0.0
-    for i in range(dets.shape[2]):
-        conf = float(dets[0, 0, i, 2])
-        if conf < conf_thr:
-            continue
-        x1, y1, x2, y2 = (dets[0, 0, i, 3:7] * [w, h, w, h]).astype(int)
-        # map back
-        if scale != 1.0:
-            x1 = int(x1 / scale); y1 = int(y1 / scale)
-            x2 = int(x2 / scale); y2 = int(y2 / scale)
-        # clip
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(W - 1, x2), min(H - 1, y2)
-        if conf > best_conf and (x2 - x1) > 10 and (y2 - y1) > 10:
-            best_conf, best_box = conf, (x1, y1, x2, y2)
-    return best_box
+    found = detect_faces(frame_bgr, conf_thr, scale, roi)
+    return found[0][0] if found else None
 
 def crop_face_with_margin(frame_bgr, box, margin_frac=FACE_MARGIN):
     x1, y1, x2, y2 = box
@@ -265,183 +734,754 @@ def crop_face_with_margin(frame_bgr, box, margin_frac=FACE_MARGIN):
     Y2 = min(frame_bgr.shape[0], y2 + dy)
     return frame_bgr[Y1:Y2, X1:X2]
 
-# ---------------- Camera capture thread ----------------
-class Camera:
-    """
-    Always grab the newest frame in a background thread.
-    The UI and inference read the latest frame without blocking.
-    """
-    def __init__(self, index=0, w=None, h=None):
-        # Cross-platform camera backend (Windows: CAP_DSHOW, macOS: CAP_AVFOUNDATION, Linux: CAP_V4L2)
-        import platform
-        if platform.system() == "Windows":
-            self.cap = cv2.VideoCapture(index, cv2.CAP_DSHOW)
-        elif platform.system() == "Darwin":  # macOS
-            self.cap = cv2.VideoCapture(index, cv2.CAP_AVFOUNDATION)
-        else:  # Linux
-            self.cap = cv2.VideoCapture(index)
-        # Request capture resolution (driver may ignore)
-        if w and h:
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH,  w)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
-        # Prefer lower FPS request to reduce load (driver may ignore)
-        self.cap.set(cv2.CAP_PROP_FPS, 30)
+# ---------------- Startup ----------------
+class StartupClock:
+    """
+    Milestones in ms since `t0` (process start, or a worker's start command):
+    camera_open, model_ready, first_frame, first_label. Each is kept once;
+    the first label also emits a "startup" event and the time_to_first_label
+    metric, the number this is all about bringing down.
+    """
+    def __init__(self, t0):
+        self.t0 = t0
+        self.marks = {}
         self.lock = threading.Lock()
-        self.frame = None
-        self.stopped = False
-        self.t = threading.Thread(target=self._loop, daemon=True)
-        if not self.cap.isOpened():
-            raise RuntimeError("Cannot open camera")
-        self.t.start()
-
-    def _loop(self):
-        while not self.stopped:
-            ok, f = self.cap.read()
-            if not ok:
-                time.sleep(0.005)
-                continue
-            with self.lock:
-                self.frame = f
 
-    def read(self):
+    def mark(self, name, t=None):
         with self.lock:
-            f = None if self.frame is None else self.frame.copy()
-        return f
+            if name in self.marks:
+                return False
+            self.marks[name] = round(((t or time.time()) - self.t0) * 1000, 1)
+            return True
 
-    def release(self):
-        self.stopped = True
-        try:
-            self.t.join(timeout=0.5)
-        except Exception:
-            pass
-        self.cap.release()
+    def snapshot(self):
+        with self.lock:
+            return dict(self.marks)
 
-# ---------------- Main ----------------
-def main():
-    import sys
+    def first_label(self, events, source):
+        if not self.mark("first_label"):
+            return
+        marks = self.snapshot()
+        metrics.observe("time_to_first_label", marks["first_label"] / 1000.0)
+        log.info("Time to first label: %.0f ms (%s) %s", marks["first_label"], source, marks)
+        events.emit("startup", source=source, **{f"{k}_ms": v for k, v in marks.items()})
 
-    # DEBUG: Print all camera-related environment variables
-    sys.stderr.write("="*60 + "\n")
-    sys.stderr.write("CAMERA CONFIGURATION DEBUG\n")
-    sys.stderr.write("="*60 + "\n")
-    sys.stderr.write(f"CAMERA_INDEX env var: {os.environ.get('CAMERA_INDEX', 'NOT SET')}\n")
-    sys.stderr.write(f"CAMERA_INDEX value being used: {CAMERA_INDEX}\n")
-    sys.stderr.write(f"HEADLESS: {HEADLESS}\n")
-    sys.stderr.write(f"DEBUG_WINDOW: {DEBUG_WINDOW}\n")
-    sys.stderr.write("="*60 + "\n")
-    sys.stderr.flush()
-
-    # Initialize camera
-    try:
-        cam = Camera(CAMERA_INDEX, w=CAPTURE_WIDTH, h=CAPTURE_HEIGHT)
-        sys.stderr.write(f"✅ Camera initialized successfully (CAMERA_INDEX={CAMERA_INDEX})\n")
-        sys.stderr.flush()
-    except Exception as e:
-        sys.stderr.write(f"[ERROR] Camera initialization failed: {e}\n")
-        sys.stderr.flush()
-        return
+# ---------------- Pipeline stages ----------------
+DetectJob = namedtuple("DetectJob", "frame seq at roi scale reason thumb")
+Hud = namedtuple("Hud", "boxes final countdown samples camera faces")
 
-    print("=== SIMPLE VILA EMOTION DETECTOR (auto, smooth) ===")
-    print("Low-latency preview. 5s rolling average. ESC to quit.\n")
+def use_stages(cameras, show):
+    if PIPELINE in ("staged", "inline"):
+        return PIPELINE == "staged"
+    # A single headless camera is compute-minimal already: one core is plenty
+    return show or cameras > 1
 
+def stage_cv_threads(cameras):
+    """
+    OpenCV's pool is process-wide, not per thread. Once the stages supply the
+    parallelism, size it so that detect workers x pool threads ~ cores.
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, cameras * DETECT_WORKERS))
+
+def detector_warmup_size():
+    return (CAPTURE_WIDTH, CAPTURE_HEIGHT) if SHOW_WINDOW else (HEADLESS_CAPTURE_WIDTH, HEADLESS_CAPTURE_HEIGHT)
+
+def make_detect_init(share_first):
+    """
+    Detector per detect-stage worker: None means the preloaded, shared one
+    (serialized by detector_lock); any other worker builds its own net, so
+    workers and cameras don't queue behind each other.
+    """
+    def init(index):
+        if share_first and index == 0:
+            return None
+        det = load_detector()
+        if DETECT_WARMUP:
+            det.warmup(*detector_warmup_size())
+        return det
+    return init
+
+def detect_with(det, frame_bgr, scale=DETECT_SCALE, roi=None):
+    if det is None:
+        return detect_faces(frame_bgr, scale=scale, roi=roi)
+    return det.detect(frame_bgr, FACE_CONF, scale, roi)
+
+def detect_job(det, job):
+    """Detect stage: the ROI around a single tracked face first, then the whole (downscaled) frame."""
+    t0 = time.perf_counter()
+    with metrics.timer("detect"):
+        found = detect_with(det, job.frame, roi=job.roi) if job.roi is not None else []
+        if not found:
+            found = detect_with(det, job.frame, scale=job.scale)
+    return found, time.perf_counter() - t0
+
+def render_preview(frame, hud):
+    """Preview frame with face boxes and the HUD drawn on it."""
+    display = cv2.resize(frame, (PREVIEW_WIDTH, PREVIEW_HEIGHT), interpolation=cv2.INTER_LINEAR)
+    sx = PREVIEW_WIDTH  / frame.shape[1]
+    sy = PREVIEW_HEIGHT / frame.shape[0]
+    for track_id, (x1, y1, x2, y2) in hud.boxes:
+        cv2.rectangle(display, (int(x1*sx), int(y1*sy)), (int(x2*sx), int(y2*sy)), (0, 200, 0), 2)
+        if MAX_FACES > 1:
+            cv2.putText(display, f"#{track_id}", (int(x1*sx), int(y1*sy) - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 0), 2)
+    if hud.final is not None:
+        txt, color = label_text_and_color(hud.final)
+        cv2.putText(display, txt, (16, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.95, color, 3)
+    cv2.putText(display, f"{hud.countdown:0.1f}s", (16, 76), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255,255,255), 2)
+    cv2.putText(display, f"samples:{hud.samples}", (16, 108), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200,200,200), 2)
+
+    # Show camera info
+    cv2.putText(display, f"Camera: {hud.camera}", (16, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,0), 2)
+    face = hud.faces > 0
+    cv2.putText(display, f"Faces: {hud.faces}" if MAX_FACES > 1 else f"Face: {'YES' if face else 'NO'}", (16, 172), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,0) if face else (0,0,255), 2)
+    return display
+
+def render_job(cam, job):
+    """Render stage: the frame is a ring view, so a preview drawn from a reused slot is thrown away."""
+    frame, hud = job
+    display = render_preview(frame.image, hud)
+    return display if cam.ring.is_current(frame) else None
+
+# ---------------- Camera pipeline ----------------
+def run_pipeline(camera_id, cam, events, inference, label_cache, stop, show, lead, startup, share=None,
+                 staged=False):
+    """
+    Detect -> track -> sample -> window loop for one camera until its stream
+    ends or `stop` is set. Several run side by side (one thread per camera),
+    sharing the detector, label cache, provider clients and inference pool;
+    every event they emit carries `camera`. `show` drives the preview window,
+    `lead` also emits the process-wide metrics events; `startup` gets the
+    first-frame / first-label milestones; `share` (a FramePublisher) gets
+    every processed frame for other consumers. `staged` moves detection and
+    preview rendering onto stage workers (otherwise they run inline).
+    """
+    events = events.tagged(camera=camera_id)
     window_start       = time.time()
     last_sample_time   = 0.0
     last_detect_time   = 0.0
-    window_labels      = []
+    last_seq           = 0      # sequence number of the last frame processed
+    window_labels      = {}     # track_id -> labels credited to the current window (by capture time)
+    closed_windows     = deque()  # tumbling: ClosedWindows held back until their labels are in
+    late_labels        = 0      # results that arrived after their window was emitted
     last_window_final  = None
+    agg = SentimentAggregator(AGG_WINDOW, AGG_HALF_LIFE, AGG_EMIT_EVERY, AGG_ON_CHANGE, min_weight=AGG_MIN_WEIGHT) \
+        if AGGREGATION == "sliding" else None
     countdown          = WINDOW_SECONDS
-    last_face_box      = None   # reuse last bbox to avoid detecting every frame
+    tracks             = TrackManager(TRACKER, TRACK_SCALE, MAX_FACES)
+    gate               = MotionGate(threshold=GATE_THRESHOLD, refresh=GATE_REFRESH) if MOTION_GATE else None
+    quality            = FaceQuality(QUALITY_MIN_SIZE, QUALITY_MIN_SHARPNESS) if QUALITY_GATE else None
+    deferred           = {}     # track_id -> retry-until time, for faces whose crop failed the quality gate
+    quality_dropped    = 0      # samples given up on after QUALITY_DEFER of bad crops
+    local_clf          = make_local_classifier()
+    local_labels       = 0      # samples answered by the local tier
+    escalations        = 0      # samples sent on to the cache / VLM
+    budget_skips       = 0      # remote samples skipped because every provider's call budget was spent
+    if ADAPTIVE_SAMPLING:
+        sampler = AdaptiveSampler(SAMPLE_PERIOD, SAMPLE_MIN_PERIOD, SAMPLE_MAX_PERIOD,
+                                  SAMPLE_MIN_VOTES, MAX_IN_FLIGHT)
+    else:
+        sampler = FixedSampler(SAMPLE_PERIOD)
+    started_at         = time.time()
+    last_heartbeat     = started_at
+    last_metrics       = started_at
+    frames_since_hb    = 0
+    frames_seen        = 0
+    captured_at_hb     = 0      # cam.frames at the last heartbeat
+    frames_overwritten = 0      # captured, but replaced in the ring before the loop got to them
+    frames_torn        = 0      # overwritten while their face crops were being cut
+    last_face_count    = None
+    detect_stage       = Stage("detect", detect_job, DETECT_WORKERS if staged else 0, STAGE_QUEUE,
+                               init=make_detect_init(lead or not staged))
+    render_stage       = Stage("render", render_job, 1 if staged else 0, 1, init=lambda i: cam) if show else None
+    last_detect_seq    = 0      # frame the track set was last re-anchored on
 
-    import sys
+    def emit_window(w):
+        """Vote of a closed tumbling window (overall + per track); returns the overall value."""
+        window_t0 = time.perf_counter()
+        all_labels = [lab for labels in w.labels.values() for lab in labels]
+        if all_labels:
+            final = majority_vote_bias_non_neutral(all_labels)
+            log.info("Window complete! Labels: %s, Final: %d", w.labels, final)
+        else:
+            final = 0
+            log.info("Window complete! No labels collected, returning 0")
+        if MAX_FACES > 1:
+            # Per-person records for multi-face (kiosk) deployments
+            for track_id, labels in sorted(w.labels.items()):
+                if labels:
+                    track_final = majority_vote_bias_non_neutral(labels)
+                    events.emit("window", track=track_id, value=track_final, samples=len(labels),
+                                confidence=window_confidence(labels, track_final),
+                                window_start=round(w.start, 3), window_end=round(w.end, 3))
+        # Overall value last, after its per-track breakdown (every window event flushes the stream)
+        events.emit("window", track=None, value=final, samples=len(all_labels),
+                    confidence=window_confidence(all_labels, final),
+                    window_start=round(w.start, 3), window_end=round(w.end, 3))
+        metrics.observe("window_emit", time.perf_counter() - window_t0)
+        return final
 
     try:
-        while True:
-            frame = cam.read()
-            if frame is None:
-                time.sleep(0.005)
+        while not stop.is_set():
+            # Block until the camera has a frame we haven't processed yet (no polling, no copy)
+            latest = cam.wait_next(last_seq)
+            if latest is None:
+                if cam.ended:
+                    log.info("Camera %s: frame source ended after %d frames", camera_id, cam.frames)
+                    break
                 continue
-
-            # Lightweight scale for preview (resize only)
-            display = cv2.resize(frame, (PREVIEW_WIDTH, PREVIEW_HEIGHT), interpolation=cv2.INTER_LINEAR)
+            if last_seq and latest.seq > last_seq + 1:
+                # Captured and published, but overwritten before the loop got to them
+                frames_overwritten += latest.seq - last_seq - 1
+                metrics.incr("dropped_frames", latest.seq - last_seq - 1)
+            if metrics.enabled:
+                metrics.observe("capture_age", time.time() - latest.ts)
+                metrics.incr("frames")
+            frame, last_seq, capture_ts = latest
+            if "first_frame" not in startup.marks:
+                startup.mark("first_frame")
+            if frames_seen == 0:
+                # The first window starts at the first frame, which may predate the loop
+                window_start = min(window_start, capture_ts)
+            frames_seen += 1
+            if share is not None:
+                share.publish(frame, capture_ts)
+            frames_since_hb += 1
+            # Keep the detector's input size constant whatever resolution the camera delivered
+            detect_scale = min(1.0, DETECT_SCALE * CAPTURE_WIDTH / float(frame.shape[1]))
 
             now = time.time()
 
-            # Run face detection only every DETECT_PERIOD (on full-res frame but downscaled internally)
-            if (now - last_detect_time) >= DETECT_PERIOD:
+            # Cheap per-frame tracking keeps boxes on faces between detections
+            if tracks.update(frame):
+                log.debug("Tracker lost a face", key="tracker_lost")
+            tracking = tracks.active
+
+            # Full detection: every DETECT_PERIOD while searching, every REDETECT_PERIOD
+            # while tracking. With a single face the re-detect only looks in an ROI
+            # around it; with several we scan the whole frame so newcomers are found.
+            if (now - last_detect_time) >= (REDETECT_PERIOD if tracking else DETECT_PERIOD):
                 last_detect_time = now
-                last_face_box = detect_face_fast(frame)
-                if last_face_box:
-                    sys.stderr.write(f"[DEBUG] Face detected at {last_face_box}\n")
-                    sys.stderr.flush()
+                run_detect, why = gate.should_detect(frame, now) if gate else (True, None)
+                if not run_detect:
+                    # Nothing moved since the last detection: its boxes (and the tracker) still stand
+                    metrics.incr("detect_skipped")
+                else:
+                    roi = None
+                    if tracking and MAX_FACES == 1:
+                        H, W = frame.shape[:2]
+                        roi = expand_box(tracks.primary().box, ROI_EXPAND, W, H)
+                    # A stage worker gets its own copy: the ring slot is reused a few frames from now
+                    job = DetectJob(frame.copy() if staged else frame, last_seq, now, roi, detect_scale, why,
+                                    gate.thumb if gate else None)
+                    if detect_stage.submit(job) is not None:
+                        metrics.incr("stage_dropped", stage="detect")
+
+            # Fold in finished detections (inline: the one just submitted). A result for an
+            # older frame than the last one applied (several workers) would move boxes back.
+            for job, (found, seconds) in detect_stage.results():
+                if job.seq <= last_detect_seq:
+                    continue
+                last_detect_seq = job.seq
+                if gate:
+                    gate.detected(job.at, seconds, job.thumb)
+                tracks.observe(job.frame, [box for box, _ in found[:MAX_FACES]])
+                if found:
+                    log.debug("%d face(s) detected (%s), tracks: %s", len(found), job.reason, [t.id for t in tracks.tracks], key="face_detected")
                 else:
-                    sys.stderr.write(f"[DEBUG] No face detected\n")
-                    sys.stderr.flush()
-
-            # Draw bbox if we have one (mapped to preview coords)
-            if last_face_box:
-                x1, y1, x2, y2 = last_face_box
-                sx = PREVIEW_WIDTH  / frame.shape[1]
-                sy = PREVIEW_HEIGHT / frame.shape[0]
-                cv2.rectangle(display, (int(x1*sx), int(y1*sy)), (int(x2*sx), int(y2*sy)), (0, 200, 0), 2)
-
-            # Rate-limited API sampling when face present
-            if last_face_box and (now - last_sample_time) >= SAMPLE_PERIOD:
+                    log.debug("No face detected", key="no_face")
+
+            if len(tracks.tracks) != last_face_count:
+                last_face_count = len(tracks.tracks)
+                events.emit("face", present=last_face_count > 0, count=last_face_count)
+
+            # Rate-limited API sampling when faces present: one tick covers every visible
+            # face, and everything the local tier/cache can't answer goes out as ONE batch
+            # (classification runs in the background; the loop never waits on the network)
+            visible = [t for t in tracks.tracks if t.misses == 0]
+            votes = sum(len(v) for v in window_labels.values())
+            if visible and sampler.due(now, votes, window_start + WINDOW_SECONDS - now):
                 last_sample_time = now
-                face_img = crop_face_with_margin(frame, last_face_box, FACE_MARGIN)
-                if face_img.size > 0:
-                    try:
-                        sys.stderr.write(f"[DEBUG] Encoding face image (size: {face_img.shape})\n")
-                        sys.stderr.flush()
-                        b64 = encode_image_b64(face_img, JPEG_QUALITY)
-                        lab = call_vila_single_label(b64)
-                        sys.stderr.write(f"[DEBUG] Got sentiment label: {lab}\n")
-                        sys.stderr.flush()
-                        window_labels.append(lab)
-                    except Exception as e:
-                        sys.stderr.write(f"[ERROR] VILA API call failed: {e}\n")
-                        sys.stderr.flush()
-
-            # Window rollover -> compute final
+                due_tracks = visible
+            else:
+                # Off-tick: only faces whose last crop was unusable get another try on this frame
+                due_tracks = [t for t in visible if t.id in deferred]
+            if due_tracks:
+                # `frame` is a ring view the capture thread overwrites once it laps the ring:
+                # copy every crop first, then check the slot was still intact while we did
+                with metrics.timer("crop"):
+                    crops = [(t, crop_face_with_margin(frame, t.box, FACE_MARGIN).copy()) for t in due_tracks]
+                if not cam.ring.is_current(latest):
+                    frames_torn += 1
+                    metrics.incr("dropped_samples", len(crops), reason="overwritten")
+                    log.debug("Frame %d overwritten while cropping, %d sample(s) dropped", latest.seq, len(crops), key="torn")
+                    crops = []
+                batch = []
+                for t, face_img in crops:
+                    if face_img.size == 0:
+                        continue
+                    if quality:
+                        ok, reason, scores = quality.check(face_img)
+                        if not ok:
+                            metrics.incr("quality_rejects", reason=reason)
+                            until = deferred.setdefault(t.id, now + QUALITY_DEFER)
+                            if now >= until:
+                                del deferred[t.id]
+                                quality_dropped += 1
+                                log.debug("Track %d: no usable crop (%s %s), sample dropped", t.id, reason, scores, key="quality_drop")
+                            continue
+                        deferred.pop(t.id, None)
+                    labels = window_labels.setdefault(t.id, [])
+                    t0 = time.time()
+                    local = local_answer(local_clf, face_img)
+                    if local is not None:
+                        # Local tier is sure enough; no network round trip
+                        local_lab, local_conf = local
+                        local_labels += 1
+                        log.debug("Track %d: local %s label %d (conf %.2f)", t.id, local_clf.name, local_lab, local_conf, key="local_label")
+                        labels.append(local_lab)
+                        if agg:
+                            agg.add(t.id, capture_ts, local_lab, local_conf, now)
+                        sampler.observe(t.id, local_lab)
+                        startup.first_label(events, f"local:{local_clf.name}")
+                        events.emit("sample", track=t.id, label=local_lab, source=f"local:{local_clf.name}",
+                                    confidence=round(local_conf, 3), latency_ms=round((time.time() - t0) * 1000, 1),
+                                    capture_ts=round(capture_ts, 3))
+                        continue
+                    escalations += 1
+                    phash = face_phash(face_img) if label_cache else None
+                    cached = label_cache.get(phash, now) if phash is not None else None
+                    if cached is not None:
+                        # Same face as a recent sample: reuse its label, no API call
+                        log.debug("Track %d: cache hit, label %d", t.id, cached, key="cache_hit")
+                        labels.append(cached)
+                        if agg:
+                            agg.add(t.id, capture_ts, cached, arrival=now)
+                        sampler.observe(t.id, cached)
+                        startup.first_label(events, "cache")
+                        events.emit("sample", track=t.id, label=cached, source="cache",
+                                    latency_ms=round((time.time() - t0) * 1000, 1), capture_ts=round(capture_ts, 3))
+                        continue
+                    batch.append((face_img, phash, t.id))
+                if batch and not remote_budget_available():
+                    # Hard API cap reached: keep the votes we got locally, send nothing
+                    budget_skips += 1
+                    metrics.incr("dropped_samples", reason="budget")
+                    log.debug("Call budget spent, skipped %d remote sample(s)", len(batch), key="budget")
+                elif batch:
+                    if inference.submit(batch, capture_ts, camera_id):
+                        log.debug("Queued %d face image(s) (in flight: %d)", len(batch), inference.in_flight(), key="queued")
+                    else:
+                        log.debug("Inference busy, dropped %d sample(s)", len(batch), key="busy")
+
+            # Credit finished results to the window their frame was captured in. Which closed
+            # windows have nothing left in flight is read before draining, so a batch that
+            # finishes in between is still waited for.
+            settled = [inference.pending_before(camera_id, w.end) == 0 for w in closed_windows]
+            failed_batches = set()
+            for res in inference.drain(camera_id):
+                failed = res.provider.endswith(":error")
+                if res.key is not None and not failed:
+                    # Never cache a provider failure's fallback 0 as if it were a real neutral
+                    label_cache.put(res.key, res.label, res.capture_ts)
+                if not failed:
+                    if agg:
+                        # Sliding windows have no "late": a vote counts for AGG_WINDOW s after it arrives
+                        agg.add(res.track_id, res.capture_ts, res.label, arrival=now)
+                    sampler.observe(res.track_id, res.label, res.latency)
+                    startup.first_label(events, res.provider)
+                elif res.capture_ts not in failed_batches:
+                    # Once per failed batch; counted as a full TIMEOUT_SEC so the sampler
+                    # backs off until the provider answers again
+                    failed_batches.add(res.capture_ts)
+                    sampler.failed(max(res.latency, TIMEOUT_SEC))
+                if agg or res.capture_ts >= window_start:
+                    target = window_labels
+                else:
+                    # Captured in a window that has closed but is still waiting for its labels
+                    target = next((w.labels for w in reversed(closed_windows) if res.capture_ts >= w.start), None)
+                events.emit("sample", track=res.track_id, label=res.label, source=res.provider,
+                            latency_ms=round(res.latency * 1000, 1), capture_ts=round(res.capture_ts, 3),
+                            late=target is None)
+                if target is not None:
+                    log.debug("Track %s: got sentiment label %d from %s (age %.2fs)",
+                              res.track_id, res.label, res.provider, now - res.capture_ts, key="label")
+                    target.setdefault(res.track_id, []).append(res.label)
+                else:
+                    late_labels += 1
+                    log.debug("Discarding late label %d: its window was already emitted", res.label, key="late_label")
+
+            # Sliding aggregation: report as soon as the value changes, and on a cadence
+            if agg:
+                polled = agg.poll(now)
+                if polled:
+                    window_t0 = time.perf_counter()
+                    (final, conf, n), per_track, reason = polled
+                    if reason == "change":
+                        log.info("Sentiment now %d (confidence %.2f over %d votes)", final, conf, n)
+                    last_window_final = final
+                    if MAX_FACES > 1:
+                        for track_id, (track_final, track_conf, k) in sorted(per_track.items()):
+                            if k:
+                                events.emit("window", track=track_id, value=track_final, samples=k,
+                                            confidence=track_conf, window_start=round(now - AGG_WINDOW, 3),
+                                            window_end=round(now, 3), reason=reason)
+                    events.emit("window", track=None, value=final, samples=n, confidence=conf,
+                                window_start=round(now - AGG_WINDOW, 3), window_end=round(now, 3), reason=reason)
+                    metrics.observe("window_emit", time.perf_counter() - window_t0)
+
+            # Window rollover. Tumbling: the window closes now but is only reported once the
+            # batches captured in it are back (or WINDOW_GRACE ran out), so a slow provider's
+            # labels still count. Sliding aggregation: this only restarts the per-window vote
+            # count the sampler paces itself by.
             elapsed = now - window_start
             countdown = max(0.0, WINDOW_SECONDS - elapsed)
             if elapsed >= WINDOW_SECONDS:
-                if window_labels:
-                    final = majority_vote_bias_non_neutral(window_labels)
-                    sys.stderr.write(f"[DEBUG] Window complete! Labels: {window_labels}, Final: {final}\n")
-                    sys.stderr.flush()
-                    print(final)  # stdout for programmatic use
-                    sys.stdout.flush()
-                    last_window_final = final
+                live_ids = {t.id for t in tracks.tracks}
+                if agg:
+                    agg.forget(live_ids)
                 else:
-                    sys.stderr.write(f"[DEBUG] Window complete! No labels collected, returning 0\n")
-                    sys.stderr.flush()
-                    print(0)
-                    sys.stdout.flush()
-                    last_window_final = 0
-                window_labels.clear()
+                    closed_windows.append(ClosedWindow(window_start, now, window_labels))
+                window_labels = {tid: [] for tid in live_ids}
+                sampler.forget(live_ids)
+                for tid in [tid for tid in deferred if tid not in live_ids]:
+                    del deferred[tid]
                 window_start = now
+            while closed_windows:
+                ready = settled[0] if settled else False
+                if not ready and (now - closed_windows[0].end) < WINDOW_GRACE:
+                    break
+                last_window_final = emit_window(closed_windows.popleft())
+                settled = settled[1:]
 
-            # HUD and Display (show if not headless OR if debug window enabled)
-            if not HEADLESS or DEBUG_WINDOW:
-                if last_window_final is not None:
-                    txt, color = label_text_and_color(last_window_final)
-                    cv2.putText(display, txt, (16, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.95, color, 3)
-                cv2.putText(display, f"{countdown:0.1f}s", (16, 76), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255,255,255), 2)
-                cv2.putText(display, f"samples:{len(window_labels)}", (16, 108), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200,200,200), 2)
-
-                # Show camera info
-                cv2.putText(display, f"Camera: {CAMERA_INDEX}", (16, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,0), 2)
-                cv2.putText(display, f"Face: {'YES' if last_face_box else 'NO'}", (16, 172), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,0) if last_face_box else (0,0,255), 2)
+            if (now - last_heartbeat) >= HEARTBEAT_SEC:
+                hb_dt = now - last_heartbeat
+                captured = cam.frames
+                stages = {"capture": {"done": captured, "per_sec": round((captured - captured_at_hb) / hb_dt, 1),
+                                      "dropped": frames_overwritten, "torn": frames_torn},
+                          "detect": detect_stage.snapshot(now),
+                          "render": render_stage.snapshot(now) if render_stage else None,
+                          "classify": inference.snapshot()}
+                captured_at_hb = captured
+                events.emit("heartbeat", uptime=round(now - started_at, 1),
+                            fps=round(frames_since_hb / hb_dt, 1) if hb_dt > 0 else 0.0,
+                            faces=len(tracks.tracks), in_flight=inference.in_flight(),
+                            dropped={"busy": inference.dropped_busy, "stale": inference.dropped_stale,
+                                     "late": late_labels, "failed": inference.failed},
+                            local={"answered": local_labels, "escalated": escalations},
+                            sampling=dict(sampler.snapshot(), budget_skips=budget_skips),
+                            payload=payload_encoder.stats(),
+                            cache=label_cache.stats() if label_cache else None,
+                            providers={"vila": vila_client.snapshot(), "openai": openai_client.snapshot()},
+                            routing=router.snapshot(),
+                            gate=gate.snapshot() if gate else None,
+                            quality=dict(quality.snapshot(), dropped=quality_dropped) if quality else None,
+                            pipeline="staged" if staged else "inline", stages=stages)
+                last_heartbeat, frames_since_hb = now, 0
+            if lead and metrics.enabled and (now - last_metrics) >= METRICS_INTERVAL:
+                events.emit("metrics", interval=round(now - last_metrics, 1), **metrics.snapshot())
+                last_metrics = now
+            events.flush_if_due(now)
 
-                cv2.imshow("VILA Emotion Detector (auto, smooth)", display)
+            # HUD and Display (show if not headless OR if debug window enabled). The window
+            # itself stays on this thread; only resizing and drawing go to the render stage.
+            if show:
+                hud = Hud([(t.id, t.box) for t in tracks.tracks], last_window_final, countdown,
+                          sum(len(v) for v in window_labels.values()), camera_id, len(tracks.tracks))
+                if render_stage.submit((latest, hud)) is not None:
+                    metrics.incr("stage_dropped", stage="render")
+                display = None
+                for _, rendered in render_stage.results():
+                    if rendered is not None:
+                        display = rendered
+                if display is not None:
+                    cv2.imshow("VILA Emotion Detector (auto, smooth)", display)
                 if (cv2.waitKey(1) & 0xFF) == 27:
+                    stop.set()
                     break
             else:
-                # Headless mode - just a small sleep to prevent busy loop
-                time.sleep(0.01)
+                # Headless: sleep until the next stage is due instead of decoding every frame.
+                # Background results are only drained here, so cap the nap at one window.
+                due = [last_detect_time + (REDETECT_PERIOD if tracks.active else DETECT_PERIOD),
+                       window_start + WINDOW_SECONDS]
+                if tracks.tracks:
+                    votes = sum(len(v) for v in window_labels.values())
+                    due.append(last_sample_time + sampler.current(votes, window_start + WINDOW_SECONDS - now))
+                if tracks.active or deferred or detect_stage.pending():
+                    due.append(now + 1.0 / HEADLESS_TRACK_FPS)
+                if agg and agg.last_emit is not None:
+                    due.append(agg.last_emit + AGG_EMIT_EVERY)
+                if closed_windows:
+                    # Check back for the labels a closed window is waiting on
+                    due.append(min(now + 0.1, closed_windows[0].end + WINDOW_GRACE))
+                nap = min(due) - time.time()
+                if nap > 0:
+                    stop.wait(min(nap, WINDOW_SECONDS))
     finally:
-        cam.release()
-        cv2.destroyAllWindows()
+        log.info("Camera %s: late labels=%d, local tier answered=%d, escalated=%d",
+                 camera_id, late_labels, local_labels, escalations)
+        log.info("Camera %s: sampling %s, budget_skips=%d", camera_id, sampler.snapshot(), budget_skips)
+        if gate:
+            log.info("Camera %s: motion gate %s", camera_id, gate.snapshot())
+        if quality:
+            log.info("Camera %s: face quality %s, dropped=%d", camera_id, quality.snapshot(), quality_dropped)
+        for w in closed_windows:
+            emit_window(w)
+        detect_stage.close()
+        log.info("Camera %s: %s pipeline, detect stage %s", camera_id, "staged" if staged else "inline",
+                 detect_stage.snapshot())
+        if render_stage:
+            render_stage.close()
+            log.info("Camera %s: render stage %s", camera_id, render_stage.snapshot())
+        events.flush()
+
+# ---------------- Main ----------------
+def default_specs():
+    return CAMERAS or [str(CAMERA_INDEX) if FRAME_SOURCE == "camera" else FRAME_SOURCE]
+
+def capture_mode(index, width, fps):
+    """Cheapest cached mode of camera `index` meeting width/fps, or None (then request blindly)."""
+    # Read on every open, not once at import: a persistent worker picks up a re-run discovery
+    caps = load_caps(Path(CAMERA_CAPS) if CAMERA_CAPS else DEFAULT_CAMERA_CAPS)
+    if caps is None:
+        return None
+    mode, why = pick_mode(caps, index, width, fps)
+    if mode is None:
+        log.info("Camera %d: %s; requesting %dpx @ %g fps", index, why, width, fps)
+    else:
+        log.info("Camera %d: %dx%d %s, %.1f fps measured (%s)",
+                 index, mode["width"], mode["height"], mode["fourcc"], mode["fps"], why)
+    return mode
+
+def open_camera(spec, camera_index=CAMERA_INDEX):
+    """Open one CAMERAS entry: a bare index is a live camera, anything else a FRAME_SOURCE spec."""
+    if spec.isdigit():
+        camera_index, spec = int(spec), "camera"
+    source_opts = dict(camera_index=camera_index, slots=FRAME_SLOTS, pacing=SOURCE_PACING,
+                       source_fps=SOURCE_FPS, loop=SOURCE_LOOP, frames=SYNTH_FRAMES,
+                       faces=SYNTH_FACES, sprite=SYNTH_SPRITE or None)
+    if SHOW_WINDOW:
+        w, h, fps = CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_FPS
+    else:
+        w, h, fps = HEADLESS_CAPTURE_WIDTH, HEADLESS_CAPTURE_HEIGHT, HEADLESS_CAPTURE_FPS
+        source_opts["decode_on_demand"] = True
+    kind, _, arg = spec.partition(":")
+    if kind.strip().lower() == "camera":
+        mode = capture_mode(int(arg) if arg else camera_index, w, fps)
+        if mode is not None:
+            w, h, source_opts["fourcc"] = mode["width"], mode["height"], mode["fourcc"]
+    return open_source(spec, w=w, h=h, fps=fps, **source_opts)
+
+def make_publisher(index):
+    if not (SHARE_PORT > 0 or SHARE_SHM):
+        return None
+    shm_name = None
+    if SHARE_SHM:
+        shm_name = SHARE_SHM if index == 0 else f"{SHARE_SHM}-{index}"
+    return FramePublisher(SHARE_FPS, SHARE_WIDTH, SHARE_QUALITY, shm_name)
+
+def serve(specs, events, inference, label_cache, stop, startup, show=SHOW_WINDOW, shared=None):
+    """
+    Open every camera in `specs` (while the detector may still be loading) and
+    run one pipeline per camera until they all end or `stop` is set.
+    `shared` is the list the MJPEG server reads publishers from.
+    """
+    cams = []
+    try:
+        for spec in specs:
+            cams.append((spec, open_camera(spec)))
+            log.info("✅ Frame source initialized successfully (%s)", spec)
+    except Exception as e:
+        log.error("Frame source initialization failed: %s", e)
+        for _, cam in cams:
+            cam.release()
+        return
+    startup.mark("camera_open")
+    try:
+        detector_loader.get()
+    except Exception as e:
+        log.error("Face detector failed to load: %s", e)
+        for _, cam in cams:
+            cam.release()
+        return
+    startup.mark("model_ready", max(detector_loader.ready_at, startup.t0))
+
+    staged = use_stages(len(cams), show)
+    if staged:
+        log.info("Staged pipeline: %d detect worker(s) per camera, OpenCV threads: %d", DETECT_WORKERS,
+                 configure_threads(DETECT_THREADS or stage_cv_threads(len(cams))))
+    elif not show:
+        configure_threads(DETECT_THREADS or HEADLESS_CV_THREADS)
+
+    events.legacy_camera = cams[0][0]
+    publishers = [make_publisher(i) for i in range(len(cams))]
+    if shared is not None:
+        shared[:] = publishers
+    # The first camera runs on the calling thread (it owns the preview window, if any)
+    workers = [threading.Thread(target=run_pipeline, name=f"cam-{cid}", daemon=True,
+                                args=(cid, cam, events, inference, label_cache, stop, False, False, startup, pub, staged))
+               for (cid, cam), pub in zip(cams[1:], publishers[1:])]
+    for t in workers:
+        t.start()
+    try:
+        run_pipeline(cams[0][0], cams[0][1], events, inference, label_cache, stop, show, True, startup, publishers[0],
+                     staged)
+        # First camera done (end of stream); keep serving the rest until they end too
+        for t in workers:
+            while t.is_alive():
+                t.join(0.5)
+    finally:
+        stop.set()
+        for t in workers:
+            t.join(timeout=2.0)
+        if shared is not None:
+            del shared[:]
+        for pub in publishers:
+            if pub is not None:
+                log.info("Frame sharing: %s", pub.stats())
+                pub.close()
+        for _, cam in cams:
+            cam.release()
+        if show:
+            cv2.destroyAllWindows()
+
+def parse_command(line):
+    """'{"cmd": "start", "cameras": ["0", 1]}' or 'start 0,1' -> ("start", ["0", "1"])."""
+    line = line.strip()
+    if line.startswith("{"):
+        msg = json.loads(line)
+        cameras = msg.get("cameras") or []
+        return str(msg.get("cmd", "")).lower(), [str(c) for c in cameras]
+    parts = line.split(None, 1)
+    if not parts:
+        return "", []
+    cameras = [c.strip() for c in parts[1].split(",") if c.strip()] if len(parts) > 1 else []
+    return parts[0].lower(), cameras
+
+def worker_loop(events, inference, label_cache, shared):
+    """
+    WORKER_MODE: stay resident with the detector loaded and take one command
+    per line on stdin, so the server can stop and restart capture without
+    paying for Python, cv2 and the model again:
+        start [cameras]   begin capturing (cameras as in CAMERAS; default the same)
+        stop              release the cameras, keep everything else warm
+        quit / EOF        exit
+    Each start emits a "state" event and gets its own time-to-first-label.
+    """
+    session = None   # (capture thread, its stop event)
+
+    def stop_session():
+        nonlocal session
+        if session is not None:
+            thread, stop = session
+            stop.set()
+            thread.join(timeout=5.0)
+            session = None
+            events.emit("state", capturing=False)
+
+    try:
+        for line in sys.stdin:
+            try:
+                cmd, specs = parse_command(line)
+            except ValueError as e:
+                log.error("Bad worker command %r: %s", line.strip(), e)
+                continue
+            if not cmd:
+                continue
+            if cmd == "start":
+                if session is not None and session[0].is_alive():
+                    log.info("Worker already capturing; ignoring start")
+                    continue
+                stop_session()
+                inference.new_session()
+                specs = specs or default_specs()
+                stop = threading.Event()
+                startup = StartupClock(time.time())
+                thread = threading.Thread(target=serve, name="capture", daemon=True,
+                                          args=(specs, events, inference, label_cache, stop, startup, False, shared))
+                thread.start()
+                session = (thread, stop)
+                events.emit("state", capturing=True, cameras=specs)
+            elif cmd == "stop":
+                stop_session()
+            elif cmd in ("quit", "exit"):
+                break
+            else:
+                log.error("Unknown worker command: %s", cmd)
+    finally:
+        stop_session()
+
+def main():
+    # DEBUG: Print all camera-related environment variables
+    log.info("=" * 60)
+    log.info("CAMERA CONFIGURATION DEBUG")
+    log.info("=" * 60)
+    log.info("CAMERA_INDEX env var: %s", os.environ.get("CAMERA_INDEX", "NOT SET"))
+    log.info("CAMERA_INDEX value being used: %s", CAMERA_INDEX)
+    log.info("CAMERAS: %s", ", ".join(CAMERAS) if CAMERAS else "(single)")
+    log.info("FRAME_SOURCE: %s (pacing %s)", FRAME_SOURCE, SOURCE_PACING)
+    log.info("HEADLESS: %s", HEADLESS)
+    log.info("DEBUG_WINDOW: %s", DEBUG_WINDOW)
+    log.info("Compute-minimal headless mode: %s", not SHOW_WINDOW)
+    log.info("Worker mode: %s", WORKER_MODE)
+    log.info("=" * 60)
+
+    # Model load + warm-up start now and overlap with opening the camera(s)
+    if not SHOW_WINDOW:
+        configure_threads(DETECT_THREADS or HEADLESS_CV_THREADS)
+    warmup_size = None
+    if DETECT_WARMUP:
+        warmup_size = detector_warmup_size()
+    detector_loader.start(warmup_size)
+
+    # One capture thread per camera; detector, provider clients and inference pool are shared
+    specs = default_specs()
+    events = EventWriter(OUTPUT_FORMAT, legacy_camera=specs[0])
+    banner = sys.stdout if OUTPUT_FORMAT == "legacy" else sys.stderr   # keep the ndjson stream pure
+    banner.write("=== SIMPLE VILA EMOTION DETECTOR (auto, smooth) ===\n")
+    if AGGREGATION == "sliding":
+        averaging = "sliding %gs window (half-life %gs)" % (AGG_WINDOW, AGG_HALF_LIFE)
+    else:
+        averaging = "tumbling %gs windows" % WINDOW_SECONDS
+    banner.write("Low-latency preview. %s. ESC to quit.\n\n" % averaging)
+    banner.flush()
+    events.emit("start", camera=None if WORKER_MODE else specs[0], cameras=[] if WORKER_MODE else specs,
+                format=OUTPUT_FORMAT, pid=os.getpid(), worker=WORKER_MODE,
+                import_ms=round((IMPORTED_AT - STARTED_AT) * 1000, 1))
+    if METRICS_PORT > 0:
+        try:
+            serve_metrics(metrics, METRICS_PORT)
+            log.info("Metrics at http://127.0.0.1:%d/metrics", METRICS_PORT)
+        except OSError as e:
+            log.error("Metrics endpoint on port %d failed: %s", METRICS_PORT, e)
+    shared = []     # current FramePublishers, one per camera
+    if SHARE_PORT > 0:
+        try:
+            serve_mjpeg(shared, SHARE_PORT)
+            log.info("Frames at http://127.0.0.1:%d/stream.mjpg", SHARE_PORT)
+        except OSError as e:
+            log.error("Frame sharing on port %d failed: %s", SHARE_PORT, e)
+
+    inference   = InferenceExecutor(classify_faces, MAX_IN_FLIGHT, MAX_CROP_AGE)
+    label_cache = LabelCache(CACHE_SIZE, CACHE_TTL, CACHE_MAX_DIST) if CACHE_ENABLED else None
+    try:
+        if WORKER_MODE:
+            worker_loop(events, inference, label_cache, shared)
+        else:
+            serve(specs, events, inference, label_cache, threading.Event(), StartupClock(STARTED_AT), shared=shared)
+    finally:
+        log.info("Inference stats: dropped_busy=%d, dropped_stale=%d, failed=%d",
+                 inference.dropped_busy, inference.dropped_stale, inference.failed)
+        if label_cache:
+            log.info("Label cache: %s", label_cache.stats())
+        log.info("Provider stats: vila=%s, openai=%s", vila_client.snapshot(), openai_client.snapshot())
+        log.info("Routing: %s", router.snapshot())
+        log.info("Payload: %s", payload_encoder.stats())
+        if metrics.enabled:
+            events.emit("metrics", final=True, **metrics.snapshot())
+        events.flush()
+        inference.shutdown()
+
+IMPORTED_AT = time.time()   # everything above (cv2, config, provider clients) imported; no model yet
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# camera_caps.py
+# Headless camera discovery and the capability cache cam.py opens cameras from.
+#
+#   python camera_caps.py                       # probe indices 0-4, write camera_caps.json
+#   python camera_caps.py --indices 0,2 --timeout 20 --out /tmp/caps.json
+#
+# Every candidate index is probed in its own process at the same time, so a
+# missing device costs one timeout in total instead of one each. A driver
+# that hangs inside VideoCapture() is killed when its timeout runs out. For
+# each device the probe asks for every candidate size in every candidate
+# pixel format and keeps what the driver actually negotiated. It records
+# first-frame latency and the frame rate the device really delivers, which
+# is often well below what CAP_PROP_FPS claims; YUYV at 720p is the classic
+# case. No windows are opened. Modes are reported as they are measured, so
+# a device that runs out of time keeps the modes it got through; its entry
+# is marked "partial".
+#
+# cam.py only reads the cache (load_caps / pick_mode). It never probes, so
+# startup costs one small JSON read per camera. Re-run discovery after
+# plugging in a different camera. An entry whose device name no longer
+# matches is ignored.
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+from frame_sources import open_capture
+
+CACHE_VERSION = 1
+DEFAULT_CACHE = Path(__file__).resolve().parent / "camera_caps.json"
+CANDIDATE_SIZES = ((320, 240), (640, 360), (640, 480), (800, 600), (1280, 720), (1920, 1080))
+CANDIDATE_FOURCCS = ("MJPG", "YUYV")
+COMPRESSED = ("MJPG",)      # decoded on our CPU; raw formats only need a colour conversion
+FPS_SLACK = 0.9             # a mode delivering 90% of the wanted fps still counts (15 fps cams measure ~14.7)
+
+
+def fourcc_str(value):
+    value = int(value)
+    s = "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+    return s if s.isprintable() and s.strip() else ""
+
+
+def device_name(index):
+    """Driver's name for the device (Linux sysfs), or None where that isn't available."""
+    try:
+        return Path(f"/sys/class/video4linux/video{int(index)}/name").read_text().strip() or None
+    except OSError:
+        return None
+
+
+def _current_mode(cap):
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            fourcc_str(cap.get(cv2.CAP_PROP_FOURCC)))
+
+
+def _measure(cap, seconds):
+    """(first-frame ms, delivered fps) in the capture's current mode; None if it yields no frames."""
+    t0 = time.perf_counter()
+    if not cap.grab():
+        return None
+    first = time.perf_counter() - t0
+    n, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        if cap.grab():
+            n += 1
+    elapsed = time.perf_counter() - start
+    return round(first * 1000, 1), round(n / elapsed, 1) if elapsed > 0 else 0.0
+
+
+def probe_device(index, sizes=CANDIDATE_SIZES, fourccs=CANDIDATE_FOURCCS, sample=0.5, progress=None):
+    """
+    Capabilities of one device (the dict stored in the cache under its index).
+    progress(info), if given, gets the entry so far once the device is open
+    and again after each mode is measured.
+    """
+    t0 = time.perf_counter()
+    cap = open_capture(index)
+    try:
+        if not cap.isOpened():
+            return {"ok": False, "error": "cannot open"}
+        if not cap.grab():
+            return {"ok": False, "error": "opened but delivers no frames"}
+        info = {
+            "ok": True,
+            "name": device_name(index),
+            "first_frame_ms": round((time.perf_counter() - t0) * 1000, 1),   # open + first frame
+            "modes": [],
+        }
+        try:
+            info["backend"] = cap.getBackendName()
+        except (AttributeError, cv2.error):
+            pass
+        w, h, fcc = _current_mode(cap)
+        info["default"] = {"width": w, "height": h, "fourcc": fcc}
+        if progress:
+            progress(info)
+        seen = set()
+        for want_fcc in fourccs:
+            for want_w, want_h in sizes:
+                # Format before size: some drivers only offer a size in one format
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*want_fcc))
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, want_w)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, want_h)
+                cap.set(cv2.CAP_PROP_FPS, 30)
+                mode = _current_mode(cap)
+                if mode in seen:
+                    continue        # driver snapped to a size/format we already measured
+                seen.add(mode)
+                got = _measure(cap, sample)
+                if got is None:
+                    continue
+                info["modes"].append({"width": mode[0], "height": mode[1], "fourcc": mode[2] or want_fcc,
+                                      "fps": got[1], "fps_reported": round(cap.get(cv2.CAP_PROP_FPS), 1),
+                                      "first_frame_ms": got[0]})
+                if progress:
+                    progress(info)
+        info["modes"].sort(key=lambda m: (m["width"] * m["height"], m["fourcc"]))
+        return info
+    finally:
+        cap.release()
+
+
+def _probe_worker(index, opts, results):
+    def progress(info):
+        results.put((index, False, info))
+    try:
+        results.put((index, True, probe_device(index, progress=progress, **opts)))
+    except Exception as e:
+        results.put((index, True, {"ok": False, "error": f"{type(e).__name__}: {e}"}))
+
+
+def _timed_out(info, timeout):
+    """Entry for a device whose probe was killed: what it had measured by then, if it got that far."""
+    if info is None:
+        return {"ok": False, "error": f"timed out after {timeout:g}s"}
+    info["modes"].sort(key=lambda m: (m["width"] * m["height"], m["fourcc"]))
+    info["partial"] = True
+    info["error"] = f"timed out after {timeout:g}s with {len(info['modes'])} modes measured"
+    return info
+
+
+def discover(indices, timeout=15.0, **opts):
+    """
+    Probe `indices` concurrently, one process each. A device still busy after
+    `timeout` s is killed; if it got as far as opening, its entry keeps the
+    modes measured by then and is marked "partial".
+    """
+    results = multiprocessing.Queue()
+    procs = {}
+    for index in indices:
+        p = multiprocessing.Process(target=_probe_worker, args=(index, opts, results),
+                                    name=f"probe-{index}", daemon=True)
+        p.start()
+        procs[index] = p
+    devices, partial = {}, {}
+    deadline = time.time() + timeout
+    while len(devices) < len(procs):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            index, done, info = results.get(timeout=min(remaining, 0.5))
+        except queue.Empty:
+            continue
+        (devices if done else partial)[str(index)] = info
+    for index, p in procs.items():
+        key = str(index)
+        if key not in devices:
+            devices[key] = _timed_out(partial.get(key), timeout)
+        p.join(0.5)
+        if p.is_alive():
+            p.terminate()
+            p.join(1.0)
+    return {
+        "version": CACHE_VERSION,
+        "created": round(time.time(), 3),
+        "platform": platform.system(),
+        "devices": devices,
+    }
+
+
+def write_caps(caps, path=DEFAULT_CACHE):
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(caps, fh, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_caps(path=DEFAULT_CACHE):
+    """The cache written by discover(), or None if missing, unreadable or from another version."""
+    try:
+        with open(path) as fh:
+            caps = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(caps, dict) or caps.get("version") != CACHE_VERSION:
+        return None
+    return caps
+
+
+def pick_mode(caps, index, min_width, min_fps):
+    """
+    Cheapest cached mode of camera `index` that is at least `min_width` wide
+    and delivers `min_fps`: fewest pixels, then raw over compressed formats.
+    Returns (mode dict or None, reason).
+    """
+    dev = (caps or {}).get("devices", {}).get(str(index))
+    if not dev:
+        return None, "not in capability cache"
+    if not dev.get("ok"):
+        return None, f"unavailable at discovery ({dev.get('error', 'unknown')})"
+    name = device_name(index)
+    if dev.get("name") and name and name != dev["name"]:
+        return None, f"device changed since discovery ({dev['name']} -> {name})"
+    fit = [m for m in dev.get("modes", []) if m["width"] >= min_width and m["fps"] >= min_fps * FPS_SLACK]
+    if not fit:
+        return None, f"no cached mode >= {min_width}px wide at {min_fps:g} fps"
+    best = min(fit, key=lambda m: (m["width"] * m["height"], m["fourcc"] in COMPRESSED, -m["fps"]))
+    return best, f"cheapest of {len(fit)} suitable modes"
+
+
+def parse_indices(text):
+    """'0-4' / '0,2,5' / '0-2,6' -> [ints]"""
+    out = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        out.extend(range(int(lo), int(hi) + 1) if hi else [int(lo)])
+    return sorted(set(out))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Probe cameras headlessly and write the capability cache cam.py reads.")
+    ap.add_argument("--indices", default="0-4", help="device indices, e.g. 0-4 or 0,2 (default 0-4)")
+    ap.add_argument("--timeout", type=float, default=15.0, help="seconds per device before it is given up on")
+    ap.add_argument("--sample", type=float, default=0.5, help="seconds of frames measured per mode")
+    ap.add_argument("--out", default=str(DEFAULT_CACHE), help=f"cache file (default {DEFAULT_CACHE.name} next to cam.py)")
+    args = ap.parse_args(argv)
+
+    t0 = time.time()
+    caps = discover(parse_indices(args.indices), timeout=args.timeout, sample=args.sample)
+    write_caps(caps, args.out)
+    found = 0
+    for index, dev in sorted(caps["devices"].items(), key=lambda kv: int(kv[0])):
+        if not dev.get("ok"):
+            print(f"camera {index}: {dev.get('error')}", file=sys.stderr)
+            continue
+        found += 1
+        print(f"camera {index}: {dev.get('name') or '?'} ({dev.get('backend', '?')}), "
+              f"first frame {dev['first_frame_ms']:.0f} ms, {len(dev['modes'])} modes"
+              f"{' (partial: ' + dev['error'] + ')' if dev.get('partial') else ''}", file=sys.stderr)
+        for m in dev["modes"]:
+            print(f"    {m['width']}x{m['height']} {m['fourcc']:4}  {m['fps']:5.1f} fps measured"
+                  f" ({m['fps_reported']:g} reported), first frame {m['first_frame_ms']:.0f} ms", file=sys.stderr)
+    print(f"{found} camera(s) in {time.time() - t0:.1f}s -> {args.out}", file=sys.stderr)
+    return 0 if found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# camlog.py
+# Leveled, rate-limited, non-blocking logging for cam.py and its helpers.
+#
+#   LOG_LEVEL      DEBUG | INFO | WARNING | ERROR   (default INFO)
+#   LOG_RATE_SEC   min seconds between two messages with the same key (default 5)
+#
+# Callers never touch stderr: records go onto a bounded queue and a single
+# background thread formats and writes them. Messages logged with a `key`
+# are rate-limited per key; the next one that gets through carries a
+# "(suppressed N similar messages)" summary. If the queue is full the
+# record is dropped and counted rather than blocking the hot loop.
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_LEVEL    = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_RATE_SEC = float(os.environ.get("LOG_RATE_SEC", "5"))
+QUEUE_SIZE   = 10000
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through at most one record per `key` every `every` seconds, counting the rest."""
+
+    def __init__(self, default_every=LOG_RATE_SEC):
+        super().__init__()
+        self.default_every = default_every
+        self.lock = threading.Lock()
+        self.state = {}   # key -> [last_emit_time, suppressed_count]
+
+    def filter(self, record):
+        key = getattr(record, "key", None)
+        if key is None:
+            return True
+        every = getattr(record, "every", None)
+        every = self.default_every if every is None else every
+        now = time.monotonic()
+        with self.lock:
+            st = self.state.get(key)
+            if st is not None and (now - st[0]) < every:
+                st[1] += 1
+                return False
+            suppressed = st[1] if st is not None else 0
+            self.state[key] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+        return True
+
+    def pending_summaries(self):
+        with self.lock:
+            out = [(k, st[1]) for k, st in self.state.items() if st[1]]
+            for k, _ in out:
+                self.state[k][1] = 0
+        return out
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking or erroring when full."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Hand the record over untouched: formatting happens on the writer thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CamLogger:
+    """
+    Thin front over a stdlib logger:
+        log.debug("Face detected at %s", box, key="face")
+    Arguments are only formatted (on the writer thread) if the level is enabled.
+    """
+
+    def __init__(self, logger, rate_filter, handler):
+        self.logger = logger
+        self.rate_filter = rate_filter
+        self.handler = handler
+
+    def _log(self, level, msg, args, key, every):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, extra={"key": key, "every": every})
+
+    def debug(self, msg, *args, key=None, every=None):
+        self._log(logging.DEBUG, msg, args, key, every)
+
+    def info(self, msg, *args, key=None, every=None):
+        self._log(logging.INFO, msg, args, key, every)
+
+    def warning(self, msg, *args, key=None, every=None):
+        self._log(logging.WARNING, msg, args, key, every)
+
+    def error(self, msg, *args, key=None, every=None):
+        self._log(logging.ERROR, msg, args, key, every)
+
+    def enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+
+_listener = None
+_log = None
+_lock = threading.Lock()
+
+
+def get_logger():
+    """Process-wide logger; the background writer starts on first use."""
+    global _listener, _log
+    with _lock:
+        if _log is not None:
+            return _log
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        handler = DroppingQueueHandler(q)
+        rate_filter = RateLimitFilter()
+        handler.addFilter(rate_filter)
+
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=False)
+        _listener.start()
+
+        logger = logging.getLogger("cam")
+        logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        logger.propagate = False
+        logger.addHandler(handler)
+        _log = CamLogger(logger, rate_filter, handler)
+        atexit.register(shutdown)
+        return _log
+
+
+def shutdown():
+    """Write pending suppression summaries, then drain and stop the writer thread."""
+    global _listener
+    if _log is None or _listener is None:
+        return
+    for key, n in _log.rate_filter.pending_summaries():
+        _log.logger.info("%s: suppressed %d similar messages", key, n)
+    if _log.dropped:
+        _log.logger.warning("log queue full: dropped %d messages", _log.dropped)
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# events.py
+# Versioned, line-delimited JSON (NDJSON) event stream on stdout for the
+# Node SentimentService. Every line is one complete JSON object:
+#
+#   {"v": 1, "type": "<type>", "ts": <unix seconds>, ...fields}
+#
+# Every event from a camera pipeline also carries "camera" (its CAMERAS entry).
+#
+# Types:
+#   start      camera (first), cameras, format, pid, worker, import_ms
+#   window     value, samples, confidence, window_start, window_end, track (null = all faces),
+#              reason (change | cadence; AGGREGATION=sliding only, where windows overlap)
+#              (tumbling windows are written once the labels captured in them are back,
+#              at most WINDOW_GRACE s after window_end)
+#   sample     track, label, source (local | cache | vila | openai | ...), latency_ms, capture_ts,
+#              late (remote only: its window was already written, the label didn't count)
+#   face       present, count                 (emitted on change only)
+#   heartbeat  uptime, fps, in_flight, dropped, providers, routing (hedges, calls_per_request),
+#              gate (detections skipped by the motion gate, hit_rate, saved_ms),
+#              quality (crops checked/passed, rejected per reason, dropped),
+#              pipeline (staged | inline), stages {capture, detect, render, classify:
+#              done, per_sec, dropped, busy, service_ms, ...}, ...
+#   startup    source, camera_open_ms, model_ready_ms, first_frame_ms, first_label_ms  (once per run)
+#   state      capturing, cameras              (WORKER_MODE: after each start/stop command)
+#   metrics    timers {stage: count, mean_ms, p50/p90/p95/p99_ms, ...}, counters  (METRICS=true only)
+#
+# Lines are buffered and written in batches (on window events, every
+# `flush_interval` seconds, or when `max_batch` lines are pending).
+# OUTPUT_FORMAT=legacy keeps the old bare -1/0/1 per window instead (first
+# camera only: bare integers can't say which camera they came from).
+
+import json
+import sys
+import threading
+import time
+
+PROTOCOL_VERSION = 1
+
+
+class EventWriter:
+    def __init__(self, fmt="ndjson", stream=None, flush_interval=0.25, max_batch=32, legacy_camera=None):
+        if fmt not in ("ndjson", "legacy"):
+            raise ValueError(f"unknown output format: {fmt}")
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()   # camera threads flush too; keep batches whole and in order
+        self.pending = []
+        self.last_flush = time.time()
+        self.emitted = 0
+        self.legacy_camera = legacy_camera
+
+    def emit(self, type_, **fields):
+        """Queue one event. In legacy mode only the overall window value is written."""
+        now = time.time()
+        if self.fmt == "legacy":
+            if type_ != "window" or fields.get("track") is not None:
+                return
+            if fields.get("camera", self.legacy_camera) != self.legacy_camera:
+                return
+            line = str(int(fields["value"]))
+        else:
+            event = {"v": PROTOCOL_VERSION, "type": type_, "ts": round(now, 3)}
+            event.update(fields)
+            line = json.dumps(event, separators=(",", ":"))
+        with self.lock:
+            self.pending.append(line)
+            self.emitted += 1
+            due = (type_ == "window" or len(self.pending) >= self.max_batch
+                   or (now - self.last_flush) >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def tagged(self, **tags):
+        """View of this writer that adds `tags` (e.g. camera="0") to every event."""
+        return TaggedEvents(self, tags)
+
+    def flush_if_due(self, now=None):
+        now = time.time() if now is None else now
+        if self.pending and (now - self.last_flush) >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                lines, self.pending = self.pending, []
+                self.last_flush = time.time()
+            if lines:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+
+
+class TaggedEvents:
+    """EventWriter front that stamps fixed fields onto each event (shares the writer's buffer)."""
+
+    def __init__(self, writer, tags):
+        self.writer = writer
+        self.tags = tags
+
+    def emit(self, type_, **fields):
+        self.writer.emit(type_, **dict(self.tags, **fields))
+
+    def flush_if_due(self, now=None):
+        self.writer.flush_if_due(now)
+
+    def flush(self):
+        self.writer.flush()
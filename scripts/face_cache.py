@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# face_cache.py
+# Perceptual-hash cache of VLM labels so near-identical face crops
+# (user sitting still) don't each cost a paid API round trip.
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def face_phash(img_bgr, hash_size=8, highfreq_factor=4):
+    """
+    64-bit DCT perceptual hash of a face crop.
+    Grayscale -> 32x32 -> DCT -> keep the low 8x8 band -> bit = coeff > median.
+    Robust to small shifts, JPEG noise and lighting drift.
+    """
+    if img_bgr.ndim == 3:
+        gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = img_bgr
+    side = hash_size * highfreq_factor
+    small = cv2.resize(gray, (side, side), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(np.float32(small))
+    low = dct[:hash_size, :hash_size].flatten()
+    # Skip the DC term when taking the median; it only carries mean brightness
+    bits = low > np.median(low[1:])
+    h = 0
+    for b in bits:
+        h = (h << 1) | int(b)
+    return h
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class LabelCache:
+    """
+    LRU + TTL cache of hash -> label with fuzzy (Hamming-distance) lookup.
+    Small by design (tens of entries), so lookup is a linear scan.
+    """
+    def __init__(self, max_entries=64, ttl=4.0, max_distance=6):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # hash -> (label, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, h, now=None):
+        """Return the cached label of the closest live entry within max_distance, else None."""
+        now = time.time() if now is None else now
+        with self.lock:
+            best_key, best_dist = None, self.max_distance + 1
+            for key in list(self.entries):
+                label, stored_at = self.entries[key]
+                if now - stored_at > self.ttl:
+                    del self.entries[key]
+                    self.expired += 1
+                    continue
+                d = hamming(h, key)
+                if d < best_dist:
+                    best_key, best_dist = key, d
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best_key)
+            self.hits += 1
+            return self.entries[best_key][0]
+
+    def put(self, h, label, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.entries[h] = (label, now)
+            self.entries.move_to_end(h)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "size": len(self.entries),
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
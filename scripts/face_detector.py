@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# face_detector.py
+# Face detection backends behind one interface:
+#
+#   res10  OpenCV's ResNet-10 SSD (Caffe), 300x300 input   (default, most robust)
+#   yunet  YuNet (ONNX) via cv2.FaceDetectorYN              (faster, needs OpenCV >= 4.8)
+#   haar   frontal-face Haar cascade                        (fastest, frontal faces only)
+#
+# detect() returns [((x1,y1,x2,y2), conf), ...] in full-frame pixel
+# coordinates, best first. Each backend resizes the frame once, straight to
+# its input size, and filters, maps and clips the boxes with NumPy, with no
+# per-detection Python loop.
+
+import cv2
+import numpy as np
+
+
+def configure_threads(n):
+    """Pin OpenCV's worker pool (also used by the DNN module) to `n` threads; None = leave as is."""
+    if n is not None:
+        cv2.setNumThreads(int(n))
+    return cv2.getNumThreads()
+
+
+def _finish(boxes, confs, W, H, min_size=10):
+    """Clip float boxes to the frame, drop tiny ones, sort by confidence, return python tuples."""
+    if not len(confs):
+        return []
+    boxes = np.floor(boxes).astype(np.int32)
+    np.clip(boxes[:, 0::2], 0, W - 1, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, H - 1, out=boxes[:, 1::2])
+    ok = ((boxes[:, 2] - boxes[:, 0]) > min_size) & ((boxes[:, 3] - boxes[:, 1]) > min_size)
+    boxes, confs = boxes[ok], confs[ok]
+    order = np.argsort(-confs, kind="stable")
+    return [(tuple(b), float(c)) for b, c in zip(boxes[order].tolist(), confs[order].tolist())]
+
+
+class FaceDetector:
+    """Base: ROI handling and warm-up; backends implement _detect(img, conf_thr, scale)."""
+    name = "base"
+    scaled = True           # does `scale` change what the backend runs on?
+
+    def detect(self, frame_bgr, conf_thr=0.5, scale=0.5, roi=None):
+        """
+        All faces above conf_thr, best first. With `roi` (x1,y1,x2,y2) only that
+        region is searched, at full resolution, and boxes come back in frame coords.
+        """
+        if roi is None:
+            return self._detect(frame_bgr, conf_thr, scale)
+        rx1, ry1, rx2, ry2 = roi
+        found = self._detect(frame_bgr[ry1:ry2, rx1:rx2], conf_thr, 1.0)
+        return [((x1 + rx1, y1 + ry1, x2 + rx1, y2 + ry1), conf) for (x1, y1, x2, y2), conf in found]
+
+    def _detect(self, img, conf_thr, scale):
+        raise NotImplementedError
+
+    def warmup(self, w=640, h=360, passes=2):
+        """Run a couple of throwaway detections so the first real one isn't a latency outlier."""
+        blank = np.full((h, w, 3), 127, np.uint8)
+        for _ in range(passes):
+            self._detect(blank, 0.99, 1.0)
+
+
+class Res10Detector(FaceDetector):
+    """
+    ResNet-10 SSD. The network always sees 300x300, so `scale` is ignored:
+    blobFromImage resizes the full frame straight to 300x300 in one step
+    (the old path resized to DETECT_SCALE first, then to 300x300 again).
+    """
+    name = "res10"
+    scaled = False
+    SIZE = (300, 300)
+    MEAN = (104, 177, 123)
+
+    def __init__(self, prototxt, model):
+        self.net = cv2.dnn.readNetFromCaffe(str(prototxt), str(model))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _detect(self, img, conf_thr, scale):
+        H, W = img.shape[:2]
+        self.net.setInput(cv2.dnn.blobFromImage(img, 1.0, self.SIZE, self.MEAN))
+        dets = self.net.forward()[0, 0]           # N x 7: _, class, conf, x1, y1, x2, y2 (0..1)
+        keep = dets[:, 2] >= conf_thr
+        boxes = dets[keep, 3:7] * np.array([W, H, W, H], np.float32)
+        return _finish(boxes, dets[keep, 2], W, H)
+
+
+class YuNetDetector(FaceDetector):
+    """
+    YuNet via cv2.FaceDetectorYN. Runs at the frame size times `scale`
+    (one resize); boxes are mapped back with a single vector divide.
+    """
+    name = "yunet"
+
+    def __init__(self, model, nms=0.3, top_k=50):
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise RuntimeError("YuNet needs cv2.FaceDetectorYN (OpenCV >= 4.8 for the 2023mar model)")
+        self.net = cv2.FaceDetectorYN.create(str(model), "", (320, 320), 0.5, nms, top_k,
+                                             cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = None
+
+    def _detect(self, img, conf_thr, scale):
+        H, W = img.shape[:2]
+        if scale != 1.0:
+            img = cv2.resize(img, (max(1, int(W * scale)), max(1, int(H * scale))), interpolation=cv2.INTER_LINEAR)
+        size = (img.shape[1], img.shape[0])
+        if size != self.input_size:
+            self.net.setInputSize(size)
+            self.input_size = size
+        self.net.setScoreThreshold(float(min(conf_thr, 1.0)))
+        _, faces = self.net.detect(img)
+        if faces is None:
+            return []
+        boxes = faces[:, 0:4].copy()                # x, y, w, h
+        boxes[:, 2:4] += boxes[:, 0:2]
+        boxes /= scale
+        return _finish(boxes, faces[:, 14], W, H)
+
+
+class HaarDetector(FaceDetector):
+    """
+    Frontal-face Haar cascade on a downscaled grayscale frame. The cascade
+    gives no calibrated score, so every box reports conf 1.0 and larger
+    (closer) faces come first.
+    """
+    name = "haar"
+
+    def __init__(self, cascade=None, min_neighbors=5):
+        if cascade is None:
+            cascade = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        self.cascade = cv2.CascadeClassifier(str(cascade))
+        if self.cascade.empty():
+            raise RuntimeError(f"Cannot load Haar cascade: {cascade}")
+        self.min_neighbors = min_neighbors
+
+    def _detect(self, img, conf_thr, scale):
+        H, W = img.shape[:2]
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        if scale != 1.0:
+            gray = cv2.resize(gray, (max(1, int(W * scale)), max(1, int(H * scale))), interpolation=cv2.INTER_AREA)
+        rects = self.cascade.detectMultiScale(gray, 1.1, self.min_neighbors, minSize=(24, 24))
+        if len(rects) == 0:
+            return []
+        boxes = np.asarray(rects, np.float32)
+        boxes[:, 2:4] += boxes[:, 0:2]
+        boxes /= scale
+        # Rank by area, then report the flat confidence
+        ranked = _finish(boxes, (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), W, H)
+        return [(b, 1.0) for b, _ in ranked]
+
+
+def make_detector(kind, res10_files=None, yunet_model=None, haar_cascade=None):
+    """Build the `kind` (res10 | yunet | haar) backend from its model file(s)."""
+    if kind == "res10":
+        return Res10Detector(*res10_files)
+    if kind == "yunet":
+        return YuNetDetector(yunet_model)
+    if kind == "haar":
+        return HaarDetector(haar_cascade)
+    raise ValueError(f"unknown detector: {kind}")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# face_quality.py
+# Quality gate for face crops before they cost a classification. Blurry,
+# tiny, badly exposed or strongly turned faces almost always come back
+# as 0 (neutral): that wastes a VLM call and drags the window toward
+# neutral. Checks run cheapest first and stop at the first failure:
+#
+#   size       shorter side of the crop in pixels
+#   exposure   mean brightness, and the share of crushed/blown pixels
+#   sharpness  variance of the Laplacian, on a fixed-width gray copy so
+#              the score doesn't depend on how close the face is
+#   frontal    left/right mirror correlation (a profile isn't symmetric)
+
+import cv2
+import numpy as np
+
+REASONS = ("small", "dark", "bright", "blurry", "turned")
+
+
+class FaceQuality:
+    """
+    check(face_bgr) -> (ok, reason or None, scores dict)
+    Rejections are counted per reason in `rejected`.
+    """
+    def __init__(self, min_size=48, min_sharpness=15.0, dark=40, bright=220, max_clipped=0.35,
+                 min_symmetry=0.1, work_width=96):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.dark = dark
+        self.bright = bright
+        self.max_clipped = max_clipped
+        self.min_symmetry = min_symmetry
+        self.work_width = work_width
+        self.checked = 0
+        self.passed = 0
+        self.rejected = dict.fromkeys(REASONS, 0)
+
+    def _reject(self, reason, scores):
+        self.rejected[reason] += 1
+        return False, reason, scores
+
+    def check(self, face_bgr):
+        self.checked += 1
+        h, w = face_bgr.shape[:2]
+        scores = {"size": min(h, w)}
+        if min(h, w) < self.min_size:
+            return self._reject("small", scores)
+
+        gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY) if face_bgr.ndim == 3 else face_bgr
+        gray = cv2.resize(gray, (self.work_width, max(1, int(h * self.work_width / float(w)))),
+                          interpolation=cv2.INTER_AREA)
+        mean = float(gray.mean())
+        clipped = float(np.count_nonzero((gray < 16) | (gray > 239))) / gray.size
+        scores.update(brightness=round(mean, 1), clipped=round(clipped, 3))
+        if mean < self.dark or (clipped > self.max_clipped and mean < 128):
+            return self._reject("dark", scores)
+        if mean > self.bright or clipped > self.max_clipped:
+            return self._reject("bright", scores)
+
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        scores["sharpness"] = round(sharpness, 1)
+        if sharpness < self.min_sharpness:
+            return self._reject("blurry", scores)
+
+        half = gray.shape[1] // 2
+        left = gray[:, :half].astype(np.float32).ravel()
+        right = gray[:, -half:][:, ::-1].astype(np.float32).ravel()
+        left -= left.mean()
+        right -= right.mean()
+        denom = float(np.sqrt((left * left).sum() * (right * right).sum()))
+        symmetry = float((left * right).sum()) / denom if denom > 0 else 0.0
+        scores["symmetry"] = round(symmetry, 3)
+        if symmetry < self.min_symmetry:
+            return self._reject("turned", scores)
+
+        self.passed += 1
+        return True, None, scores
+
+    def snapshot(self):
+        return {"checked": self.checked, "passed": self.passed, "rejected": dict(self.rejected)}
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# face_tracking.py
+# Cheap per-frame face box tracking between (slow) SSD detections.
+# Default is a Lucas-Kanade optical-flow tracker, which only needs the
+# main opencv-python package; KCF/CSRT are used when opencv-contrib is present.
+
+import cv2
+import numpy as np
+
+from camlog import get_logger
+
+log = get_logger()
+
+
+def expand_box(box, frac, W, H):
+    """Grow (x1,y1,x2,y2) by `frac` of its size on every side, clipped to the frame."""
+    x1, y1, x2, y2 = box
+    dx, dy = int((x2 - x1) * frac), int((y2 - y1) * frac)
+    return (max(0, x1 - dx), max(0, y1 - dy), min(W - 1, x2 + dx), min(H - 1, y2 + dy))
+
+
+class FlowTracker:
+    """
+    Track a box by following corner features with pyramidal LK optical flow
+    on a downscaled grayscale frame. Translation = median point motion,
+    scale = median ratio of pairwise point distances. A forward-backward
+    check drops unreliable points; too few survivors means the track is lost.
+    """
+    name = "flow"
+
+    def __init__(self, scale=0.5, max_points=40, min_points=8, fb_thresh=1.0):
+        self.scale = scale
+        self.max_points = max_points
+        self.min_points = min_points
+        self.fb_thresh = fb_thresh
+        self.lk = dict(winSize=(15, 15), maxLevel=2,
+                       criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.reset()
+
+    def reset(self):
+        self.prev_gray = None
+        self.points = None
+        self.box = None   # float (x1,y1,x2,y2) in full-frame coords
+
+    @property
+    def active(self):
+        return self.box is not None
+
+    def _gray(self, frame_bgr):
+        H, W = frame_bgr.shape[:2]
+        small = cv2.resize(frame_bgr, (int(W * self.scale), int(H * self.scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _seed(self, gray, box):
+        s = self.scale
+        x1, y1, x2, y2 = [int(v * s) for v in box]
+        # Inner 80% of the box: avoid background corners at the edges
+        mx, my = (x2 - x1) // 10, (y2 - y1) // 10
+        mask = np.zeros_like(gray)
+        mask[y1 + my:y2 - my, x1 + mx:x2 - mx] = 255
+        return cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+
+    def init(self, frame_bgr, box):
+        gray = self._gray(frame_bgr)
+        pts = self._seed(gray, box)
+        if pts is None or len(pts) < self.min_points:
+            self.reset()
+            return False
+        self.prev_gray, self.points = gray, pts
+        self.box = tuple(float(v) for v in box)
+        return True
+
+    def update(self, frame_bgr):
+        """Advance one frame. Returns int box or None if the track was lost."""
+        if not self.active:
+            return None
+        gray = self._gray(frame_bgr)
+        p0 = self.points
+        p1, st1, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **self.lk)
+        if p1 is None:
+            self.reset()
+            return None
+        p0r, st2, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **self.lk)
+        fb = np.abs(p0 - p0r).reshape(-1, 2).max(axis=1)
+        good = (st1.reshape(-1) == 1) & (st2.reshape(-1) == 1) & (fb < self.fb_thresh)
+        if good.sum() < self.min_points:
+            self.reset()
+            return None
+        a = p0.reshape(-1, 2)[good]
+        b = p1.reshape(-1, 2)[good]
+
+        dx, dy = np.median(b - a, axis=0) / self.scale
+        # Scale change from pairwise distances (subsample to keep it O(n))
+        i = np.arange(len(a))
+        j = np.roll(i, 1)
+        da = np.linalg.norm(a[i] - a[j], axis=1)
+        db = np.linalg.norm(b[i] - b[j], axis=1)
+        ok = da > 1e-3
+        ds = float(np.median(db[ok] / da[ok])) if ok.any() else 1.0
+
+        x1, y1, x2, y2 = self.box
+        cx, cy = (x1 + x2) / 2.0 + dx, (y1 + y2) / 2.0 + dy
+        hw, hh = (x2 - x1) / 2.0 * ds, (y2 - y1) / 2.0 * ds
+        H, W = frame_bgr.shape[:2]
+        if hw < 5 or hh < 5 or cx < 0 or cy < 0 or cx >= W or cy >= H:
+            self.reset()
+            return None
+        self.box = (max(0.0, cx - hw), max(0.0, cy - hh), min(W - 1.0, cx + hw), min(H - 1.0, cy + hh))
+        self.prev_gray = gray
+        self.points = b.reshape(-1, 1, 2)
+        if len(b) < self.max_points // 2:
+            # Top up features so the track doesn't starve
+            fresh = self._seed(gray, self.box)
+            if fresh is not None:
+                self.points = np.vstack([self.points, fresh])[:self.max_points].astype(np.float32)
+        return tuple(int(v) for v in self.box)
+
+
+class OpenCVTracker:
+    """KCF / CSRT from opencv-contrib behind the same init/update/reset interface."""
+
+    def __init__(self, kind):
+        self.name = kind
+        self.factory = self._factory(kind)
+        if self.factory is None:
+            raise RuntimeError(f"cv2 tracker '{kind}' not available (needs opencv-contrib-python)")
+        self.reset()
+
+    @staticmethod
+    def _factory(kind):
+        attr = {"kcf": "TrackerKCF_create", "csrt": "TrackerCSRT_create"}.get(kind)
+        if attr is None:
+            return None
+        for mod in (cv2, getattr(cv2, "legacy", None)):
+            if mod is not None and hasattr(mod, attr):
+                return getattr(mod, attr)
+        return None
+
+    def reset(self):
+        self.tracker = None
+        self.box = None
+
+    @property
+    def active(self):
+        return self.box is not None
+
+    def init(self, frame_bgr, box):
+        x1, y1, x2, y2 = box
+        self.tracker = self.factory()
+        self.tracker.init(frame_bgr, (int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        self.box = tuple(box)
+        return True
+
+    def update(self, frame_bgr):
+        if not self.active:
+            return None
+        ok, (x, y, w, h) = self.tracker.update(frame_bgr)
+        if not ok or w < 10 or h < 10:
+            self.reset()
+            return None
+        H, W = frame_bgr.shape[:2]
+        self.box = (max(0, int(x)), max(0, int(y)), min(W - 1, int(x + w)), min(H - 1, int(y + h)))
+        return self.box
+
+
+def make_tracker(kind="flow", scale=0.5):
+    """Return a tracker for `kind` (flow | kcf | csrt), or None for 'none'."""
+    if kind == "none":
+        return None
+    if kind in ("kcf", "csrt"):
+        try:
+            return OpenCVTracker(kind)
+        except RuntimeError as e:
+            log.error("%s; falling back to optical-flow tracker", e, key="tracker_fallback")
+    return FlowTracker(scale=scale)
+
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class FaceTrack:
+    """One person in frame: stable id, current box and its own box tracker."""
+
+    def __init__(self, track_id, box, tracker):
+        self.id = track_id
+        self.box = tuple(box)
+        self.tracker = tracker
+        self.misses = 0       # consecutive detections that didn't see this face
+        self.lost = False     # box tracker gave up; box is frozen until re-detected
+
+    @property
+    def area(self):
+        x1, y1, x2, y2 = self.box
+        return (x2 - x1) * (y2 - y1)
+
+
+class TrackManager:
+    """
+    Assign stable ids to detected faces and keep their boxes moving between
+    detections. Association is greedy by IoU (a handful of faces at most);
+    a track is dropped after `max_misses` detections in a row without it.
+    """
+
+    def __init__(self, tracker_kind="flow", scale=0.5, max_tracks=4, iou_thresh=0.3, max_misses=2):
+        self.tracker_kind = tracker_kind
+        self.scale = scale
+        self.max_tracks = max_tracks
+        self.iou_thresh = iou_thresh
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 1
+
+    def _new_tracker(self):
+        return make_tracker(self.tracker_kind, self.scale)
+
+    @property
+    def active(self):
+        """True while every track is still being followed by its box tracker."""
+        return bool(self.tracks) and all(t.tracker is not None and not t.lost for t in self.tracks)
+
+    def primary(self):
+        """Largest (closest) face, or None."""
+        return max(self.tracks, key=lambda t: t.area) if self.tracks else None
+
+    def update(self, frame_bgr):
+        """Advance every box tracker one frame. Returns True if any track was lost."""
+        any_lost = False
+        for t in self.tracks:
+            if t.tracker is None or t.lost:
+                continue
+            box = t.tracker.update(frame_bgr)
+            if box is None:
+                t.lost = True
+                any_lost = True
+            else:
+                t.box = box
+        return any_lost
+
+    def observe(self, frame_bgr, boxes):
+        """Fold a fresh detection (list of boxes, best first) into the track set."""
+        pairs = []
+        for ti, t in enumerate(self.tracks):
+            for di, b in enumerate(boxes):
+                o = iou(t.box, b)
+                if o >= self.iou_thresh:
+                    pairs.append((o, ti, di))
+        pairs.sort(reverse=True)
+        used_t, used_d = set(), set()
+        for _, ti, di in pairs:
+            if ti in used_t or di in used_d:
+                continue
+            used_t.add(ti)
+            used_d.add(di)
+            t = self.tracks[ti]
+            t.box, t.misses, t.lost = tuple(boxes[di]), 0, False
+            if t.tracker is not None and not t.tracker.init(frame_bgr, t.box):
+                t.lost = True
+
+        kept = []
+        for ti, t in enumerate(self.tracks):
+            if ti not in used_t:
+                t.misses += 1
+                t.lost = True
+                if t.misses > self.max_misses:
+                    continue
+            kept.append(t)
+        self.tracks = kept
+
+        for di, b in enumerate(boxes):
+            if di in used_d or len(self.tracks) >= self.max_tracks:
+                continue
+            t = FaceTrack(self.next_id, b, self._new_tracker())
+            self.next_id += 1
+            if t.tracker is not None and not t.tracker.init(frame_bgr, t.box):
+                t.lost = True
+            self.tracks.append(t)
+        return self.tracks
+
+    def reset(self):
+        self.tracks = []
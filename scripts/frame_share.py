@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# frame_share.py
+# Lets other local consumers see the frames cam.py captures. Only one
+# process can own the webcam, so a debug preview or UI video can't simply
+# open it a second time.
+#
+#   FramePublisher   latest frame per camera, downscaled once and JPEG-encoded
+#                    once per published frame, however many readers there are
+#   serve_mjpeg()    http://127.0.0.1:PORT/stream.mjpg   (multipart MJPEG, browsers)
+#                    http://127.0.0.1:PORT/frame.jpg     (single snapshot)
+#                    ?camera=N selects the Nth camera (default 0)
+#   ShmFrameRing     raw BGR frames in a named shared-memory ring for local
+#                    processes; ShmFrameReader is the consumer side
+#
+# Readers always get the newest frame. A slow reader skips frames instead
+# of queueing them, and never holds up capture.
+
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+BOUNDARY = "camframe"
+SHM_MAGIC = b"CAMF"
+SHM_VERSION = 1
+SHM_HEADER = struct.Struct("<4sIIIIQ")     # magic, version, slots, width, height, latest seq
+SLOT_HEADER = struct.Struct("<Qd")         # seq (0 while being written), capture ts
+
+
+class ShmFrameRing:
+    """
+    Writer side of a shared-memory ring of `slots` fixed-size BGR frames.
+    Each slot carries its own sequence number, cleared while the pixels
+    are rewritten, so a reader can tell a torn copy from a good one.
+    """
+    def __init__(self, name, width, height, slots=4):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.slots = slots
+        self.frame_bytes = width * height * 3
+        self.slot_bytes = SLOT_HEADER.size + self.frame_bytes
+        size = SHM_HEADER.size + slots * self.slot_bytes
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed run
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.seq = 0
+        SHM_HEADER.pack_into(self.shm.buf, 0, SHM_MAGIC, SHM_VERSION, slots, width, height, 0)
+
+    def write(self, img, ts):
+        self.seq += 1
+        off = SHM_HEADER.size + (self.seq % self.slots) * self.slot_bytes
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, off, 0, ts)
+        np.ndarray((self.height, self.width, 3), np.uint8, buf, off + SLOT_HEADER.size)[:] = img
+        SLOT_HEADER.pack_into(buf, off, self.seq, ts)
+        struct.pack_into("<Q", buf, SHM_HEADER.size - 8, self.seq)
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ShmFrameReader:
+    """
+    Consumer side: read() -> (seq, ts, image copy), or None if nothing new
+    since `after`. Always returns the newest frame.
+    """
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Python < 3.13 registers attached segments too and would unlink the writer's on exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        magic, version, self.slots, self.width, self.height, _ = SHM_HEADER.unpack_from(self.shm.buf, 0)
+        if magic != SHM_MAGIC or version != SHM_VERSION:
+            raise ValueError(f"{name} is not a cam.py frame ring")
+        self.frame_bytes = self.width * self.height * 3
+        self.slot_bytes = SLOT_HEADER.size + self.frame_bytes
+
+    def read(self, after=0, retries=3):
+        buf = self.shm.buf
+        for _ in range(retries):
+            latest = struct.unpack_from("<Q", buf, SHM_HEADER.size - 8)[0]
+            if latest <= after:
+                return None
+            off = SHM_HEADER.size + (latest % self.slots) * self.slot_bytes
+            seq, ts = SLOT_HEADER.unpack_from(buf, off)
+            img = np.ndarray((self.height, self.width, 3), np.uint8, buf, off + SLOT_HEADER.size).copy()
+            if seq == latest and SLOT_HEADER.unpack_from(buf, off)[0] == seq:
+                return seq, ts, img
+        return None     # writer kept lapping us; try again next time
+
+    def close(self):
+        self.shm.close()
+
+
+class FramePublisher:
+    """
+    publish(frame, ts) from the capture loop; at most `fps` frames per second
+    are downscaled to `width`, copied into the shm ring (if any) and, while
+    at least one MJPEG client is connected, encoded once for all of them.
+    """
+    def __init__(self, fps=10.0, width=640, quality=70, shm_name=None, shm_slots=4):
+        self.period = 1.0 / fps if fps > 0 else 0.0
+        self.width = width
+        self.quality = quality
+        self.shm_name = shm_name
+        self.shm_slots = shm_slots
+        self.ring = None
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.seq = 0
+        self.jpeg = None
+        self.ts = 0.0
+        self.last = 0.0
+        self.encoded = 0
+        self.closed = False
+
+    def wanted(self, now):
+        return (self.readers or self.shm_name) and (now - self.last) >= self.period
+
+    def publish(self, frame, ts):
+        now = time.time()
+        if self.closed or not self.wanted(now):
+            return
+        self.last = now
+        h, w = frame.shape[:2]
+        if self.width and w > self.width:
+            frame = cv2.resize(frame, (self.width, max(1, int(h * self.width / float(w)))), interpolation=cv2.INTER_AREA)
+        if self.shm_name:
+            if self.ring is None:
+                self.ring = ShmFrameRing(self.shm_name, frame.shape[1], frame.shape[0], self.shm_slots)
+            if frame.shape[:2] == (self.ring.height, self.ring.width):
+                self.ring.write(frame, ts)
+        if self.readers:
+            ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(self.quality)])
+            if ok:
+                with self.cond:
+                    self.seq += 1
+                    self.jpeg, self.ts = buf.tobytes(), ts
+                    self.encoded += 1
+                    self.cond.notify_all()
+
+    def wait_next(self, after, timeout=1.0):
+        """Newest (seq, ts, jpeg bytes) after `after`; None on timeout or close."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.closed or self.seq > after, timeout):
+                return None
+            if self.closed:
+                return None
+            return self.seq, self.ts, self.jpeg
+
+    def attach(self):
+        with self.cond:
+            self.readers += 1
+
+    def detach(self):
+        with self.cond:
+            self.readers -= 1
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def stats(self):
+        return {"readers": self.readers, "encoded": self.encoded, "shm": self.shm_name}
+
+
+def serve_mjpeg(publishers, port, host="127.0.0.1"):
+    """
+    Serve the frames of `publishers` (a list, filled and emptied by the caller
+    as cameras come and go) from a daemon thread.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _publisher(self, query):
+            try:
+                idx = int(query.get("camera", ["0"])[0])
+                return publishers[idx]
+            except (ValueError, IndexError):
+                return None
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path not in ("/stream.mjpg", "/frame.jpg"):
+                self.send_error(404)
+                return
+            pub = self._publisher(parse_qs(url.query))
+            if pub is None:
+                self.send_error(503, "camera not capturing")
+                return
+            pub.attach()
+            seq = pub.seq   # what was encoded before we attached may be old; wait for a fresh one
+            try:
+                if url.path == "/frame.jpg":
+                    got = pub.wait_next(seq, timeout=2.0)
+                    if got is None:
+                        self.send_error(503, "no frame yet")
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/jpeg")
+                    self.send_header("Content-Length", str(len(got[2])))
+                    self.end_headers()
+                    self.wfile.write(got[2])
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                while not pub.closed:
+                    got = pub.wait_next(seq)
+                    if got is None:
+                        continue
+                    seq, _, jpeg = got
+                    self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                     f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b"\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass    # viewer went away
+            finally:
+                pub.detach()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="frame-http", daemon=True).start()
+    return server
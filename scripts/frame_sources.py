@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# frame_sources.py
+# Where cam.py's frames come from. Every source fills the same FrameRing
+# from a background thread and exposes read() / wait_next() / release(),
+# so the main loop doesn't know (or care) whether it is looking at a webcam.
+#
+#   camera            live device (CAMERA_INDEX)
+#   video:<path>      video file
+#   images:<dir>      every image in a directory, sorted by name
+#   synthetic[:kind]  generated frames: kind = faces (default) | noise
+#
+# Non-live sources pace frames either in real time (at the file's or the
+# requested fps) or "fast": one frame per reader request, so every frame
+# is processed exactly once and a run is repeatable without hardware.
+
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+Frame = namedtuple("Frame", "image seq ts")   # read-only view, capture sequence number, capture time
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class FrameRing:
+    """
+    Fixed ring of preallocated frame buffers shared by one writer and many readers.
+    The writer decodes straight into the next slot (no per-frame allocation) and
+    publishes it with a monotonically increasing sequence number. Readers get
+    read-only views, never copies; a view stays intact until the writer has
+    lapped the ring (`slots` frames later), which is_current() can check.
+    """
+    def __init__(self, slots=4):
+        self.slots = max(2, int(slots))
+        self.buffers = [None] * self.slots
+        self.stamps = [(0, 0.0)] * self.slots   # (seq, ts) per slot
+        self.cond = threading.Condition()
+        self.seq = 0                           # last published sequence number
+        self.closed = False
+
+    def next_buffer(self):
+        """Buffer the writer should decode into next (None until the first frame sized the ring)."""
+        return self.buffers[(self.seq + 1) % self.slots]
+
+    def publish(self, img, ts):
+        """Writer: `img` is the filled buffer (normally the one from next_buffer())."""
+        with self.cond:
+            seq = self.seq + 1
+            slot = seq % self.slots
+            self.buffers[slot] = img
+            self.stamps[slot] = (seq, ts)
+            self.seq = seq
+            self.cond.notify_all()
+
+    def close(self):
+        """Writer: no more frames will come; wake every waiting reader."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _frame(self, seq):
+        slot = seq % self.slots
+        view = self.buffers[slot].view()
+        view.flags.writeable = False
+        return Frame(view, self.stamps[slot][0], self.stamps[slot][1])
+
+    def latest(self):
+        with self.cond:
+            return None if self.seq == 0 else self._frame(self.seq)
+
+    def wait_next(self, after_seq, timeout=None):
+        """Block until a frame newer than `after_seq` is published; newest one wins. None on timeout/close."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > after_seq or self.closed, timeout)
+            if self.seq <= after_seq:
+                return None
+            return self._frame(self.seq)
+
+    def is_current(self, frame):
+        """False once the writer may have started overwriting this frame's slot."""
+        return frame.seq > self.seq - (self.slots - 1)
+
+
+class FrameSource:
+    """
+    Base for every source: a background thread grabs frames into a FrameRing.
+
+    Subclasses implement _grab() -> True (frame ready), False (nothing yet,
+    try again) or None (end of stream), and _retrieve(buf) -> image or None,
+    which should decode into `buf` when it can.
+
+    period            seconds between frames for real-time pacing of
+                      non-live sources (0 = as fast as the reader asks)
+    lockstep          produce a frame only when a reader is waiting for one
+                      ("fast" pacing: nothing is skipped, nothing is paced)
+    decode_on_demand  keep grab()bing but only _retrieve() when a reader is
+                      waiting (live camera in headless mode)
+    """
+    name = "source"
+    live = False
+
+    def __init__(self, slots=4, period=0.0, lockstep=False, decode_on_demand=False):
+        self.ring = FrameRing(slots)
+        self.period = period
+        self.lockstep = lockstep
+        self.decode_on_demand = decode_on_demand
+        self.wanted = threading.Event()
+        self.stopped = False
+        self.ended = False
+        self.frames = 0
+        self.t = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self.t.start()
+        return self
+
+    def _grab(self):
+        raise NotImplementedError
+
+    def _retrieve(self, buf):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _loop(self):
+        next_due = time.monotonic()
+        while not self.stopped:
+            if self.lockstep and not self.wanted.wait(0.1):
+                continue
+            if self.period:
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                # Don't try to catch up after a stall; just keep the cadence from here
+                next_due = max(next_due + self.period, time.monotonic() - self.period)
+            ok = self._grab()
+            if ok is None:
+                break
+            if not ok:
+                time.sleep(0.005)
+                continue
+            ts = time.time()
+            if self.decode_on_demand and not self.wanted.is_set():
+                continue
+            f = self._retrieve(self.ring.next_buffer())
+            if f is not None:
+                self.wanted.clear()
+                self.frames += 1
+                self.ring.publish(f, ts)
+        self.ended = True
+        self.ring.close()
+
+    def read(self):
+        """Latest Frame (read-only view) or None before the first frame."""
+        return self.ring.latest()
+
+    def wait_next(self, after_seq, timeout=0.5):
+        """Next Frame newer than `after_seq`, or None on timeout or once the stream has ended."""
+        self.wanted.set()
+        return self.ring.wait_next(after_seq, timeout)
+
+    def release(self):
+        self.stopped = True
+        try:
+            self.t.join(timeout=0.5)
+        except Exception:
+            pass
+        self._close()
+
+
+def open_capture(index):
+    """cv2.VideoCapture on the platform's native backend (Windows: DSHOW, macOS: AVFOUNDATION, Linux: default)."""
+    import platform
+    if platform.system() == "Windows":
+        return cv2.VideoCapture(index, cv2.CAP_DSHOW)
+    if platform.system() == "Darwin":
+        return cv2.VideoCapture(index, cv2.CAP_AVFOUNDATION)
+    return cv2.VideoCapture(index)
+
+
+class Camera(FrameSource):
+    """
+    Always grab the newest frame from a live device in a background thread.
+    The UI and inference read the latest frame without blocking or copying,
+    or block on wait_next() for the next new one.
+    """
+    name = "camera"
+    live = True
+
+    def __init__(self, index=0, w=None, h=None, slots=4, fps=30, decode_on_demand=False, fourcc=None):
+        super().__init__(slots, decode_on_demand=decode_on_demand)
+        self.cap = open_capture(index)
+        # Pixel format first: some V4L2 drivers only offer a size in one format
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        # Request capture resolution (driver may ignore)
+        if w and h:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH,  w)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+        # Prefer lower FPS request to reduce load (driver may ignore)
+        self.cap.set(cv2.CAP_PROP_FPS, fps)
+        if not self.cap.isOpened():
+            raise RuntimeError("Cannot open camera")
+        self.start()
+
+    def _grab(self):
+        # A failed grab on a live device is transient, never end of stream
+        return bool(self.cap.grab())
+
+    def _retrieve(self, buf):
+        # Decode into the preallocated slot; OpenCV allocates only if the size changed
+        ok, f = self.cap.retrieve(buf) if buf is not None else self.cap.retrieve()
+        return f if ok else None
+
+    def _close(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Frames of a video file, at the file's own rate (or `fps`), or as fast as they are read."""
+    name = "video"
+
+    def __init__(self, path, slots=4, fps=0.0, fast=False, loop=False):
+        self.path = str(path)
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video file: {self.path}")
+        fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(slots, period=0.0 if fast else 1.0 / fps, lockstep=fast)
+        self.loop = loop
+        self.start()
+
+    def _grab(self):
+        if self.cap.grab():
+            return True
+        if self.loop and self.frames:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return False
+        return None
+
+    def _retrieve(self, buf):
+        ok, f = self.cap.retrieve(buf) if buf is not None else self.cap.retrieve()
+        return f if ok else None
+
+    def _close(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """Every image file in a directory, in name order, as a stream of frames."""
+    name = "images"
+
+    def __init__(self, directory, slots=4, fps=15.0, fast=False, loop=False):
+        self.files = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTS)
+        if not self.files:
+            raise RuntimeError(f"No images found in {directory}")
+        super().__init__(slots, period=0.0 if fast else 1.0 / fps, lockstep=fast)
+        self.loop = loop
+        self.pos = -1
+        self.start()
+
+    def _grab(self):
+        self.pos += 1
+        if self.pos >= len(self.files):
+            if not self.loop:
+                return None
+            self.pos = 0
+        return True
+
+    def _retrieve(self, buf):
+        img = cv2.imread(str(self.files[self.pos]), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        if buf is not None and buf.shape == img.shape:
+            # Keep the ring's buffers stable when every image has the same size
+            np.copyto(buf, img)
+            return buf
+        return img
+
+
+class SyntheticSource(FrameSource):
+    """
+    Generated frames at a chosen resolution and rate, fully determined by
+    `seed` and the frame number.
+
+    faces  one or more cartoon faces drifting over a textured background,
+           cycling smile -> neutral -> frown every `expression_period` frames;
+           pass `sprite` (a face photo) to paste that instead of the cartoon,
+           which the SSD detector picks up far more reliably
+    noise  uniform random noise (no faces; worst case for JPEG and the detector)
+    """
+    name = "synthetic"
+
+    def __init__(self, kind="faces", w=640, h=360, slots=4, fps=15.0, fast=False,
+                 frames=0, faces=1, seed=0, sprite=None, expression_period=45):
+        if kind not in ("faces", "noise"):
+            raise ValueError(f"unknown synthetic source: {kind}")
+        super().__init__(slots, period=0.0 if fast else 1.0 / fps, lockstep=fast)
+        self.kind = kind
+        self.size = (int(h), int(w))
+        self.limit = int(frames)
+        self.faces = max(1, int(faces))
+        self.expression_period = expression_period
+        self.rng = np.random.default_rng(seed)
+        self.n = -1
+        noise = self.rng.integers(60, 120, (self.size[0] // 8 + 1, self.size[1] // 8 + 1, 3), dtype=np.uint8)
+        self.background = cv2.resize(noise, (self.size[1], self.size[0]), interpolation=cv2.INTER_LINEAR)
+        self.sprite = None
+        if sprite:
+            self.sprite = cv2.imread(str(sprite), cv2.IMREAD_COLOR)
+            if self.sprite is None:
+                raise RuntimeError(f"Cannot read synthetic face sprite: {sprite}")
+        self.start()
+
+    def _grab(self):
+        self.n += 1
+        if self.limit and self.n >= self.limit:
+            return None
+        return True
+
+    def _retrieve(self, buf):
+        if buf is None or buf.shape[:2] != self.size:
+            buf = np.empty(self.size + (3,), np.uint8)
+        if self.kind == "noise":
+            buf[...] = self.rng.integers(0, 256, buf.shape, dtype=np.uint8)
+            return buf
+        np.copyto(buf, self.background)
+        for i in range(self.faces):
+            self._draw_face(buf, i)
+        return buf
+
+    def _draw_face(self, img, i):
+        H, W = self.size
+        n = self.n
+        fh = int(H * 0.45 / (1 + 0.35 * (self.faces - 1)))
+        fw = int(fh * 0.78)
+        # Lissajous drift, each face on its own phase
+        cx = int(W * (i + 0.5) / self.faces + 0.12 * W / self.faces * np.sin(n * 0.05 + i))
+        cy = int(H * 0.5 + 0.12 * H * np.sin(n * 0.031 + 2 * i))
+        x1, y1 = max(0, cx - fw // 2), max(0, cy - fh // 2)
+        x2, y2 = min(W, x1 + fw), min(H, y1 + fh)
+        if x2 <= x1 or y2 <= y1:
+            return
+        if self.sprite is not None:
+            img[y1:y2, x1:x2] = cv2.resize(self.sprite, (x2 - x1, y2 - y1), interpolation=cv2.INTER_AREA)
+            return
+
+        cv2.ellipse(img, (cx, cy), (fw // 2, fh // 2), 0, 0, 360, (150, 180, 225), -1, cv2.LINE_AA)
+        ex, ey, er = fw // 5, fh // 8, max(2, fw // 14)
+        for sx in (-1, 1):
+            cv2.circle(img, (cx + sx * ex, cy - ey), er + 3, (245, 245, 245), -1, cv2.LINE_AA)
+            cv2.circle(img, (cx + sx * ex, cy - ey), er, (40, 30, 30), -1, cv2.LINE_AA)
+            cv2.line(img, (cx + sx * ex - er * 2, cy - ey - er * 3), (cx + sx * ex + er * 2, cy - ey - er * 3),
+                     (40, 50, 70), max(2, er // 2), cv2.LINE_AA)
+        cv2.line(img, (cx, cy - ey // 2), (cx - ex // 4, cy + ey), (110, 140, 190), 2, cv2.LINE_AA)
+        mood = (n // self.expression_period + i) % 3     # 0 smile, 1 neutral, 2 frown
+        mw, my = fw // 4, cy + fh // 4
+        if mood == 1:
+            cv2.line(img, (cx - mw, my), (cx + mw, my), (60, 40, 120), 3, cv2.LINE_AA)
+        else:
+            start, end = (0, 180) if mood == 0 else (180, 360)
+            oy = my - fh // 16 if mood == 0 else my + fh // 16
+            cv2.ellipse(img, (cx, oy), (mw, fh // 12), 0, start, end, (60, 40, 120), 3, cv2.LINE_AA)
+
+
+def open_source(spec="camera", camera_index=0, w=None, h=None, slots=4, fps=30,
+                decode_on_demand=False, pacing="realtime", source_fps=0.0, loop=False,
+                frames=0, faces=1, sprite=None, fourcc=None):
+    """
+    Build a FrameSource from a spec string:
+        camera | video:<path> | images:<dir> | synthetic[:faces|noise]
+    `pacing` (realtime | fast) and `source_fps` only apply to non-live sources,
+    `fourcc` (e.g. "MJPG") only to cameras.
+    """
+    kind, _, arg = spec.partition(":")
+    kind = kind.strip().lower()
+    fast = pacing == "fast"
+    if kind == "camera":
+        return Camera(int(arg) if arg else camera_index, w=w, h=h, slots=slots, fps=fps,
+                      decode_on_demand=decode_on_demand, fourcc=fourcc)
+    if kind == "video":
+        return VideoFileSource(arg, slots=slots, fps=source_fps, fast=fast, loop=loop)
+    if kind == "images":
+        return ImageDirSource(arg, slots=slots, fps=source_fps or fps, fast=fast, loop=loop)
+    if kind == "synthetic":
+        return SyntheticSource(arg or "faces", w=w or 640, h=h or 360, slots=slots, fps=source_fps or fps,
+                               fast=fast, frames=frames, faces=faces, sprite=sprite)
+    raise ValueError(f"unknown frame source: {spec}")
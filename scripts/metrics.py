@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# metrics.py
+# Hot-path instrumentation for cam.py: per-stage timers backed by HDR-style
+# (log-linear) histograms, plus labelled counters.
+#
+#   metrics = make_metrics(enabled)
+#   with metrics.timer("detect"): ...
+#   metrics.observe("capture_age", seconds)
+#   metrics.incr("provider_calls", provider="vila")
+#
+# snapshot() is the JSON form (sent as a "metrics" event on the NDJSON
+# stream); prometheus_text() is the text exposition format served by
+# serve(). When disabled, make_metrics() returns a NullMetrics whose
+# methods do nothing, so instrumented code costs one attribute lookup
+# and a call.
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Log-linear histogram of durations, in the style of HdrHistogram.
+    Values are recorded in microseconds; each power-of-two range is split
+    into `sub_buckets` linear buckets, so any value is off by at most
+    1/sub_buckets (~6% with 16) while the whole 1 us .. `highest` s range
+    fits in a few hundred counters. record() is O(1) and allocation-free.
+    """
+    def __init__(self, highest=120.0, sub_buckets=16):
+        self.sub = sub_buckets
+        self.sub_bits = sub_buckets.bit_length() - 1
+        self.highest_us = int(highest * 1e6)
+        self.counts = [0] * (self._index(self.highest_us) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def _index(self, us):
+        if us < 2 * self.sub:
+            return us
+        shift = us.bit_length() - self.sub_bits - 1
+        return (shift + 1) * self.sub + (us >> shift) - self.sub
+
+    def _value(self, idx):
+        """Midpoint of bucket `idx`, in seconds."""
+        if idx < 2 * self.sub:
+            return idx / 1e6
+        shift = idx // self.sub - 1
+        lo = (idx % self.sub + self.sub) << shift
+        return (lo + (1 << shift) / 2.0) / 1e6
+
+    def record(self, seconds):
+        us = min(max(0, int(seconds * 1e6)), self.highest_us)
+        self.counts[self._index(us)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(q * self.count)))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(max(self._value(idx), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """Milliseconds, rounded for the event stream."""
+        out = {"count": self.count,
+               "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+               "min_ms": round((self.min or 0.0) * 1000, 3),
+               "max_ms": round(self.max * 1000, 3)}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}_ms"] = round(self.percentile(q) * 1000, 3)
+        return out
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def _flat_name(key):
+    """("provider", (("provider", "vila"),)) -> "provider[provider=vila]" (bench_cam.py style)."""
+    name, labels = key
+    if not labels:
+        return name
+    return name + "[" + ",".join(f"{k}={v}" for k, v in labels) + "]"
+
+
+class _Timer:
+    __slots__ = ("metrics", "key", "t0")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.t0)
+        return False
+
+
+class Metrics:
+    """Thread-safe registry of stage histograms and counters (see module header)."""
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def _observe(self, key, seconds):
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.record(seconds)
+
+    def observe(self, stage, seconds, **labels):
+        self._observe(_key(stage, labels), seconds)
+
+    def timer(self, stage, **labels):
+        return _Timer(self, _key(stage, labels))
+
+    def incr(self, name, n=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def snapshot(self):
+        """{"timers": {"provider[provider=vila]": {count, mean_ms, p50_ms, ...}}, "counters": {...}}"""
+        with self.lock:
+            timers = {_flat_name(k): h.summary() for k, h in sorted(self.histograms.items())}
+            counters = {_flat_name(k): v for k, v in sorted(self.counters.items())}
+        return {"timers": timers, "counters": counters}
+
+    def prometheus_text(self, prefix="cam"):
+        """Prometheus text exposition: stages as one summary metric, counters as *_total."""
+        def labels(pairs, extra=()):
+            items = list(pairs) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = [f"# HELP {prefix}_stage_seconds Hot-path stage latency.",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        with self.lock:
+            hist = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            for (stage, pairs), h in hist:
+                base = (("stage", stage),) + pairs
+                for q in QUANTILES:
+                    lines.append(f"{prefix}_stage_seconds{labels(base, (('quantile', q),))} {h.percentile(q):.6f}")
+                lines.append(f"{prefix}_stage_seconds_sum{labels(base)} {h.total:.6f}")
+                lines.append(f"{prefix}_stage_seconds_count{labels(base)} {h.count}")
+        typed = set()
+        for (name, pairs), v in counters:
+            metric = f"{prefix}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{labels(pairs)} {v}")
+        lines.append(f"# TYPE {prefix}_uptime_seconds gauge")
+        lines.append(f"{prefix}_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """Same interface as Metrics; records nothing."""
+    enabled = False
+
+    def observe(self, stage, seconds, **labels):
+        pass
+
+    def timer(self, stage, **labels):
+        return _NULL_TIMER
+
+    def incr(self, name, n=1, **labels):
+        pass
+
+    def snapshot(self):
+        return {"timers": {}, "counters": {}}
+
+    def prometheus_text(self, prefix="cam"):
+        return ""
+
+
+def make_metrics(enabled):
+    return Metrics() if enabled else NullMetrics()
+
+
+def serve(metrics, port, host="127.0.0.1"):
+    """Serve metrics.prometheus_text() at http://host:port/metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass   # no per-scrape noise on stderr
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
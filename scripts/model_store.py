@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# model_store.py
+# Local, verified model files for cam.py. Each file's SHA-256 and size are
+# recorded in a manifest next to the models the first time it is seen (or
+# downloaded), and checked on every start:
+#
+#   store = ModelStore(MODEL_DIR, allow_download=True)
+#   path = store.path("deploy.prototxt", PROTOTXT_URL)
+#
+# A file whose size and mtime still match the manifest is trusted without
+# re-hashing, so a warm start touches no network and reads no model bytes
+# beyond one stat(). Downloads go to a temp file and are renamed into place
+# only once complete, so an interrupted fetch can't leave a truncated model
+# behind for the next start to load.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+MANIFEST = "models.manifest.json"
+CHUNK = 1 << 20
+
+
+class ModelIntegrityError(RuntimeError):
+    pass
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ModelStore:
+    """
+    path(name, url, sha256=None) -> verified local Path
+
+    sha256     pinned digest; without one the first copy seen is recorded
+               and later starts must match it (trust on first use)
+    Missing or corrupt files are fetched from `url` when allow_download is
+    set, else ModelIntegrityError is raised.
+    """
+    def __init__(self, root, allow_download=True, timeout=30.0):
+        self.root = Path(root)
+        self.allow_download = allow_download
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.manifest_path = self.root / MANIFEST
+        self.manifest = self._load_manifest()
+        self.hashed = 0          # files that needed a full hash this run
+        self.downloaded = 0
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(self.manifest, fh, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _record(self, path, digest):
+        st = path.stat()
+        self.manifest[path.name] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        self._save_manifest()
+
+    def _verify(self, path, sha256):
+        """True if `path` matches the pinned/recorded digest (recording it if it's new)."""
+        entry = self.manifest.get(path.name)
+        st = path.stat()
+        expected = sha256 or (entry or {}).get("sha256")
+        if entry and entry.get("sha256") == expected and \
+                entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+            return True
+        self.hashed += 1
+        digest = sha256_file(path)
+        if expected is not None and digest != expected:
+            return False
+        self._record(path, digest)
+        return True
+
+    def _download(self, path, url, sha256):
+        from urllib.request import urlopen
+        self.root.mkdir(parents=True, exist_ok=True)
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".part", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as out, urlopen(url, timeout=self.timeout) as resp:
+                for block in iter(lambda: resp.read(CHUNK), b""):
+                    h.update(block)
+                    out.write(block)
+            digest = h.hexdigest()
+            if sha256 and digest != sha256:
+                raise ModelIntegrityError(f"{path.name}: downloaded file has sha256 {digest}, expected {sha256}")
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self.downloaded += 1
+        self._record(path, digest)
+
+    def path(self, name, url=None, sha256=None):
+        path = self.root / name
+        with self.lock:
+            if path.exists():
+                if self._verify(path, sha256):
+                    return path
+                problem = f"{name} does not match its recorded sha256 (corrupt or replaced)"
+            else:
+                problem = f"{name} is missing from {self.root}"
+            if not (self.allow_download and url):
+                raise ModelIntegrityError(problem + " and downloads are disabled")
+            self._download(path, url, sha256)
+            return path
+
+    def stats(self):
+        return {"root": str(self.root), "hashed": self.hashed, "downloaded": self.downloaded}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# payload.py
+# Shrink face crops before they go to a VLM provider: downscale to the
+# model's input size, optionally drop color, and pick the encoder quality
+# that lands under a byte budget. A close face at 720p is otherwise
+# hundreds of KB of base64 per request on what may be a slow uplink.
+
+import base64
+import threading
+
+import cv2
+
+MIME = {"jpeg": "image/jpeg", "webp": "image/webp"}
+QUALITY_FLAG = {"jpeg": cv2.IMWRITE_JPEG_QUALITY, "webp": cv2.IMWRITE_WEBP_QUALITY}
+
+
+class PayloadEncoder:
+    """
+    prepare(img) -> resized (and maybe grayscale) crop
+    encode(img)  -> "data:<mime>;base64,..." URL for one crop
+
+    target_edge  longest side after resizing (only ever shrinks; 0 = keep)
+    max_bytes    encoded-size budget per image; 0 = always use `quality`
+    Quality search: start from the quality that fit last time; if the
+    image is over budget, binary-search down to `min_quality`. If it came
+    in well under, drift back up a step for the next image. Most crops
+    of the same face therefore cost a single encode.
+    """
+    def __init__(self, target_edge=384, grayscale=False, fmt="jpeg", quality=85,
+                 max_bytes=0, min_quality=40):
+        if fmt not in MIME:
+            raise ValueError(f"unknown payload format: {fmt}")
+        if fmt == "webp" and not cv2.haveImageWriter(".webp"):
+            raise RuntimeError("this OpenCV build can't encode WebP")
+        self.target_edge = target_edge
+        self.grayscale = grayscale
+        self.fmt = fmt
+        self.ext = "." + fmt.replace("jpeg", "jpg")
+        self.max_quality = quality
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.min_quality = min_quality
+        self.lock = threading.Lock()
+        self.images = 0
+        self.requests = 0
+        self.bytes = 0           # encoded image bytes (before base64)
+        self.sent = 0            # request image payload as sent (base64 data URLs)
+        self.last_request = 0
+
+    def prepare(self, img):
+        h, w = img.shape[:2]
+        edge = max(h, w)
+        if self.target_edge and edge > self.target_edge:
+            s = self.target_edge / float(edge)
+            img = cv2.resize(img, (max(1, int(w * s)), max(1, int(h * s))), interpolation=cv2.INTER_AREA)
+        if self.grayscale and img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img
+
+    def _encode(self, img, q):
+        ok, buf = cv2.imencode(self.ext, img, [int(QUALITY_FLAG[self.fmt]), int(q)])
+        if not ok:
+            raise RuntimeError(f"{self.fmt} encode failed")
+        return buf
+
+    def _fit(self, img):
+        with self.lock:
+            q = self.quality
+        buf = self._encode(img, q)
+        if not self.max_bytes:
+            return buf
+        if buf.size <= self.max_bytes:
+            if buf.size < 0.75 * self.max_bytes and q < self.max_quality:
+                q = min(self.max_quality, q + 5)
+        else:
+            lo, hi, best = self.min_quality, q - 1, None
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                cand = self._encode(img, mid)
+                if cand.size <= self.max_bytes:
+                    best, q, lo = cand, mid, mid + 1
+                else:
+                    hi = mid - 1
+            if best is None:
+                # Can't get under budget; send the smallest we're willing to
+                q = self.min_quality
+                best = self._encode(img, q)
+            buf = best
+        with self.lock:
+            self.quality = q
+        return buf
+
+    def encode(self, img):
+        buf = self._fit(self.prepare(img))
+        with self.lock:
+            self.images += 1
+            self.bytes += int(buf.size)
+        return f"data:{MIME[self.fmt]};base64,{base64.b64encode(buf).decode('ascii')}"
+
+    def encode_batch(self, imgs):
+        """Encode every crop of one request. Returns (data_urls, bytes sent, base64 included)."""
+        urls = [self.encode(img) for img in imgs]
+        sent = sum(len(u) for u in urls)
+        with self.lock:
+            self.requests += 1
+            self.sent += sent
+            self.last_request = sent
+        return urls, sent
+
+    def stats(self):
+        with self.lock:
+            return {
+                "format": self.fmt,
+                "quality": self.quality,
+                "images": self.images,
+                "requests": self.requests,
+                "bytes_per_image": int(self.bytes / self.images) if self.images else 0,
+                "bytes_per_request": int(self.sent / self.requests) if self.requests else 0,
+                "last_request_bytes": self.last_request,
+            }
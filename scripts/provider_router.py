@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# provider_router.py
+# Latency-aware routing between VLM providers, with hedged requests.
+# Every call feeds a per-provider EWMA of latency and error rate plus a
+# latency histogram. Each request goes to the fastest healthy provider.
+# If that provider hasn't answered by its own `hedge_quantile` latency,
+# the same request is sent to the next one. The first valid answer wins,
+# and the loser is cancelled: it is not retried, and its answer is
+# thrown away. A hard error fails over at once, without waiting.
+#
+# Hedging costs extra provider calls. The spend is capped at
+# `hedge_budget` hedges per routed request and reported by snapshot().
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import Histogram
+from vlm_client import ProviderUnavailable
+
+
+class ProviderStats:
+    """EWMA latency / error rate and a latency histogram for one provider."""
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None          # seconds, successful calls only
+        self.error_rate = 0.0
+        self.hist = Histogram()
+        self.last_failure = 0.0
+        self.calls = 0
+        self.ok = 0
+        self.wins = 0
+
+    def record(self, latency, ok, now):
+        self.calls += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.ok += 1
+            self.hist.record(latency)
+            self.latency = latency if self.latency is None else \
+                self.latency + self.alpha * (latency - self.latency)
+        else:
+            self.last_failure = now
+
+
+class ProviderRouter:
+    """
+    backends      [(name, request_fn)], in preference order for providers
+                  with no latency history yet; request_fn(images, cancel)
+                  returns labels or raises ProviderError
+    hedge         send a duplicate to the next provider when the primary is slow
+    hedge_quantile  primary latency percentile that triggers the hedge
+    hedge_min     never hedge sooner than this (s)
+    hedge_default hedge delay until `min_samples` latencies are known (s)
+    hedge_budget  max hedges per routed request (0.2 = at most 1 in 5)
+    max_error     error-rate EWMA above which a provider is routed around,
+                  until `probe_after` s pass without a failure
+    explore_every every Nth request goes to the runner-up first, so a provider
+                  that had one slow spell gets a chance to show it recovered
+    route(images) -> (labels, provider name); raises the last ProviderError
+    if every provider failed.
+    """
+    def __init__(self, backends, hedge=True, hedge_quantile=0.9, hedge_min=0.3, hedge_default=2.0,
+                 hedge_budget=0.2, min_samples=10, max_error=0.5, probe_after=30.0, explore_every=20,
+                 alpha=0.2, max_workers=8):
+        self.backends = list(backends)
+        self.order = {name: i for i, (name, _) in enumerate(self.backends)}
+        self.fns = dict(self.backends)
+        self.hedge = hedge and len(self.backends) > 1
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min = hedge_min
+        self.hedge_default = hedge_default
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.max_error = max_error
+        self.probe_after = probe_after
+        self.explore_every = explore_every
+        self.lock = threading.Lock()
+        self.stats = {name: ProviderStats(alpha) for name, _ in self.backends}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vlm-route")
+        self.routed = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.cancelled = 0
+        self.failovers = 0
+        self.launched = 0        # provider calls started, hedges and failovers included
+
+    def ranked(self, now=None):
+        """Provider names, healthy fastest first; unhealthy ones last (still usable as failover)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            def key(name):
+                st = self.stats[name]
+                healthy = st.error_rate <= self.max_error or (now - st.last_failure) >= self.probe_after
+                known = st.latency is not None
+                return (not healthy, not known, st.latency if known else 0.0, self.order[name])
+            return sorted(self.fns, key=key)
+
+    def hedge_delay(self, name):
+        with self.lock:
+            st = self.stats[name]
+            if st.hist.count < self.min_samples:
+                return self.hedge_default
+            return max(self.hedge_min, st.hist.percentile(self.hedge_quantile))
+
+    def _call(self, name, images, cancel):
+        t0 = time.time()
+        ok = False
+        try:
+            labels = self.fns[name](images, cancel)
+            ok = True
+            return labels
+        finally:
+            # A cancelled loser's error says nothing about the provider's health
+            if ok or not cancel.is_set():
+                now = time.time()
+                with self.lock:
+                    self.stats[name].record(now - t0, ok, now)
+
+    def _may_hedge(self):
+        with self.lock:
+            return self.hedge and self.hedges < self.hedge_budget * max(1, self.routed)
+
+    def route(self, images):
+        ranked = self.ranked()
+        with self.lock:
+            self.routed += 1
+            explore = self.explore_every and len(ranked) > 1 and self.routed % self.explore_every == 0
+        best = ranked[0]
+        if explore:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+        cancels = {name: threading.Event() for name in ranked}
+        pending = {}            # future -> provider
+        queue = list(ranked)
+        last_error = None
+
+        def launch():
+            name = queue.pop(0)
+            with self.lock:
+                self.launched += 1
+            pending[self.pool.submit(self._call, name, images, cancels[name])] = name
+
+        launch()
+        hedged = False
+        while pending:
+            timeout = None
+            if queue and not hedged and self._may_hedge():
+                # An exploring request hedges no later than the usual choice would have answered
+                timeout = min(self.hedge_delay(next(iter(pending.values()))), self.hedge_delay(best))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than its usual `hedge_quantile`: race the next provider
+                hedged = True
+                with self.lock:
+                    self.hedges += 1
+                launch()
+                continue
+            for fut in done:
+                name = pending.pop(fut)
+                try:
+                    labels = fut.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                for other in pending.values():
+                    cancels[other].set()
+                with self.lock:
+                    self.stats[name].wins += 1
+                    self.cancelled += len(pending)
+                    if hedged and name != ranked[0]:
+                        self.hedge_wins += 1
+                return labels, name
+            if not pending and queue:
+                # Hard failure (or breaker open): fail over without waiting
+                with self.lock:
+                    self.failovers += 1
+                launch()
+        raise last_error or ProviderUnavailable("router", "no provider configured")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "routed": self.routed,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "cancelled": self.cancelled,
+                "failovers": self.failovers,
+                # provider calls per routed request; 1.0 = no hedging/failover overhead
+                "calls_per_request": round(self.launched / self.routed, 3) if self.routed else 0.0,
+                "providers": {
+                    name: {"latency_ms": round(st.latency * 1000, 1) if st.latency is not None else None,
+                           "p90_ms": round(st.hist.percentile(0.9) * 1000, 1) if st.hist.count else None,
+                           "error_rate": round(st.error_rate, 3), "calls": st.calls, "wins": st.wins}
+                    for name, st in self.stats.items()},
+            }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
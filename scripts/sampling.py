@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# sampling.py
+# Adaptive sampling period for cam.py. Instead of classifying every fixed
+# SAMPLE_PERIOD, sample faster while the expression is changing or the
+# window is short of votes, and slower while labels are stable or the
+# provider is slow. Hard API spend is capped separately by the per-provider
+# TokenBucket in vlm_client.py.
+
+class AdaptiveSampler:
+    """
+    period starts at `base` and always stays within [min_period, max_period].
+
+    observe(track, label, latency)   a label arrived; latency is None for
+                                      local/cache answers
+    failed(latency)                   a remote call failed or timed out after
+                                      `latency` s
+    due(now, votes, window_left)      True when the next sampling tick is due
+
+    - a label that differs from the track's previous one: period *= speedup
+    - `stable_after` identical labels in a row:         period *= slowdown
+    - the window needs `min_votes` and won't get them at the current pace:
+      that tick uses the pace that would (never below min_period)
+    - remote answers can't usefully be requested faster than they come back,
+      so the period never drops under latency_ewma / max_in_flight
+    - a failed call feeds its elapsed time into that EWMA too and slows the
+      pace (period *= slowdown), so a provider that is timing out is asked
+      less often rather than just as often
+    """
+    def __init__(self, base=0.9, min_period=0.35, max_period=3.0, min_votes=3,
+                 max_in_flight=2, speedup=0.6, slowdown=1.25, stable_after=3, alpha=0.3):
+        self.base = base
+        self.min_period = min_period
+        self.max_period = max_period
+        self.min_votes = min_votes
+        self.max_in_flight = max(1, max_in_flight)
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.stable_after = stable_after
+        self.alpha = alpha
+        self.period = base
+        self.latency = None            # EWMA of remote latency, seconds
+        self.last = {}                 # track -> (last label, run length)
+        self.last_tick = 0.0
+        self.changes = 0
+        self.failures = 0
+
+    def _clamp(self, p):
+        floor = self.min_period
+        if self.latency is not None:
+            floor = max(floor, self.latency / self.max_in_flight)
+        return min(self.max_period, max(floor, p))
+
+    def _fold_latency(self, latency):
+        self.latency = latency if self.latency is None else \
+            (1 - self.alpha) * self.latency + self.alpha * latency
+
+    def observe(self, track, label, latency=None):
+        if latency is not None:
+            self._fold_latency(latency)
+        prev, run = self.last.get(track, (None, 0))
+        if prev is not None and label != prev:
+            self.changes += 1
+            self.last[track] = (label, 1)
+            self.period = self._clamp(self.period * self.speedup)
+            return
+        run += 1
+        self.last[track] = (label, run)
+        if run >= self.stable_after:
+            self.period = self._clamp(self.period * self.slowdown)
+        else:
+            self.period = self._clamp(self.period)
+
+    def failed(self, latency):
+        self._fold_latency(latency)
+        self.failures += 1
+        self.period = self._clamp(self.period * self.slowdown)
+
+    def forget(self, live_tracks):
+        """Drop state for tracks that left the frame."""
+        for tid in list(self.last):
+            if tid not in live_tracks:
+                del self.last[tid]
+
+    def current(self, votes=None, window_left=None):
+        """Period to use for the next tick, given the votes so far and time left in the window."""
+        p = self.period
+        if votes is not None and window_left is not None and votes < self.min_votes and window_left > 0:
+            p = min(p, window_left / (self.min_votes - votes))
+        return self._clamp(p)
+
+    def due(self, now, votes=None, window_left=None):
+        if (now - self.last_tick) >= self.current(votes, window_left):
+            self.last_tick = now
+            return True
+        return False
+
+    def snapshot(self):
+        return {"period": round(self.period, 3),
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "changes": self.changes, "failures": self.failures}
+
+
+class FixedSampler(AdaptiveSampler):
+    """The old behaviour: one tick every `base` seconds, whatever happens."""
+
+    def observe(self, track, label, latency=None):
+        pass
+
+    def failed(self, latency):
+        pass
+
+    def current(self, votes=None, window_left=None):
+        return self.base
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# stages.py
+# Worker stages for cam.py's staged pipeline. Each camera's loop keeps the
+# cheap, stateful work: tracking, sampling, aggregation and events. The
+# heavy, stateless work (face detection, preview rendering) goes to stages:
+# worker threads fed through a small bounded queue. OpenCV releases the
+# GIL inside its kernels, so a camera's stages run on separate cores, and
+# so do the cameras.
+#
+# Backpressure drops the oldest queued item. A stage that falls behind
+# works on the newest input it was given, not an ever older one, and the
+# producer never blocks. With workers=0 a stage runs inline in submit()
+# behind the same interface, so the loop reads the same either way.
+#
+# Each Stage counts what went in, what came out, what it dropped and how
+# long its workers were busy. snapshot() turns that into throughput since
+# the previous snapshot.
+
+import threading
+import time
+from collections import deque
+
+from camlog import get_logger
+
+log = get_logger()
+
+
+class DropOldestQueue:
+    """Bounded FIFO; put() on a full queue evicts (and returns) the oldest item instead of blocking."""
+    def __init__(self, maxsize=2):
+        self.maxsize = max(1, int(maxsize))
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            evicted = None
+            if len(self.items) >= self.maxsize:
+                evicted = self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+            return evicted
+
+    def get(self, timeout=None):
+        """Oldest item, or None on timeout or once closed and empty."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.items or self.closed, timeout)
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class Stage:
+    """
+    fn(state, item) -> result, run by `workers` threads (0 = inline, in submit()).
+    init(worker_index) -> state, per worker (e.g. its own detector), built on
+    the worker's thread before its first item; if it fails the worker runs
+    with state None.
+
+    submit(item)   never blocks; returns the item it evicted from a full inbox, or None
+    results()      [(item, result)] finished since the last call, in completion order
+    pending()      items queued or being worked on
+    A failing item is logged and counted, and yields no result.
+    """
+    def __init__(self, name, fn, workers=1, maxsize=2, init=None):
+        self.name = name
+        self.fn = fn
+        self.init = init
+        self.workers = max(0, int(workers))
+        self.inbox = DropOldestQueue(maxsize)
+        self.lock = threading.Lock()
+        self.finished = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.busy = 0.0             # worker-seconds spent in fn
+        self.waited = 0.0           # seconds completed items spent queued
+        self.last = (time.time(), 0, 0.0, 0.0)
+        self.state = self._init(0) if self.workers == 0 else None
+        self.threads = [threading.Thread(target=self._work, args=(i,), name=f"stage-{name}-{i}", daemon=True)
+                        for i in range(self.workers)]
+        for t in self.threads:
+            t.start()
+
+    def _init(self, index):
+        if self.init is None:
+            return None
+        try:
+            return self.init(index)
+        except Exception as e:
+            log.error("Stage %s: worker %d setup failed: %s", self.name, index, e)
+            return None
+
+    def _work(self, index):
+        state = self._init(index)
+        while True:
+            got = self.inbox.get(timeout=0.5)
+            if got is None:
+                if self.inbox.closed:
+                    return
+                continue
+            self._run(state, *got)
+
+    def _run(self, state, item, queued_at):
+        t0 = time.perf_counter()
+        with self.lock:
+            self.active += 1
+        ok, result = False, None
+        try:
+            result = self.fn(state, item)
+            ok = True
+        except Exception as e:
+            log.error("Stage %s failed: %s", self.name, e, key=f"stage_{self.name}")
+        finally:
+            dt = time.perf_counter() - t0
+            with self.lock:
+                self.active -= 1
+                self.busy += dt
+                if ok:
+                    self.completed += 1
+                    self.waited += t0 - queued_at
+                    self.finished.append((item, result))
+                else:
+                    self.failed += 1
+
+    def submit(self, item):
+        with self.lock:
+            self.submitted += 1
+        if self.workers == 0:
+            self._run(self.state, item, time.perf_counter())
+            return None
+        evicted = self.inbox.put((item, time.perf_counter()))
+        return evicted[0] if evicted is not None else None
+
+    def results(self):
+        with self.lock:
+            out, self.finished = self.finished, []
+        return out
+
+    def pending(self):
+        with self.lock:
+            return len(self.inbox) + self.active
+
+    def snapshot(self, now=None):
+        """Totals, plus throughput and worker utilisation since the previous snapshot."""
+        now = time.time() if now is None else now
+        with self.lock:
+            t, completed, busy, waited = self.last
+            dt = now - t
+            n = self.completed - completed
+            snap = {
+                "workers": self.workers,
+                "queued": len(self.inbox),
+                "in": self.submitted,
+                "done": self.completed,
+                "dropped": self.inbox.dropped,
+                "failed": self.failed,
+                "per_sec": round(n / dt, 1) if dt > 0 else 0.0,
+                # share of worker time spent working (inline: of the caller's time)
+                "busy": round((self.busy - busy) / (dt * max(1, self.workers)), 3) if dt > 0 else 0.0,
+                "service_ms": round((self.busy - busy) / n * 1000, 1) if n else None,
+                "wait_ms": round((self.waited - waited) / n * 1000, 1) if n else None,
+            }
+            self.last = (now, self.completed, self.busy, self.waited)
+        return snap
+
+    def close(self, timeout=1.0):
+        self.inbox.close()
+        for t in self.threads:
+            t.join(timeout)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# test_aggregator.py
+# SlidingVote / SentimentAggregator: expiry, decay and the happy/sad-beats-
+# neutral rule.
+#
+#   python -m pytest -q test_aggregator.py      (or just: python test_aggregator.py)
+
+import random
+import unittest
+
+from aggregator import SentimentAggregator, SlidingVote
+
+
+class SlidingVoteTest(unittest.TestCase):
+    def test_expired_label_leaves_no_remainder(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            vote = SlidingVote(window=2.0, half_life=1.0)
+            for _ in range(rng.randint(1, 6)):
+                t = rng.uniform(0.0, 1.0)
+                vote.add(t, rng.choice((1, -1)), rng.uniform(0.3, 1.0))
+            for _ in range(rng.randint(1, 6)):
+                t = rng.uniform(2.5, 2.9)
+                vote.add(t, 0, rng.uniform(0.3, 1.0))
+            label, conf, n = vote.result(3.2)
+            self.assertEqual(label, 0)
+            self.assertEqual(conf, 1.0)
+            self.assertEqual(vote.sums[1], 0.0)
+            self.assertEqual(vote.sums[-1], 0.0)
+
+    def test_decayed_late_vote_does_not_beat_fresh_neutrals(self):
+        vote = SlidingVote(window=5.0, half_life=1.0)
+        for i in range(5):
+            vote.add(10.0 + 0.1 * i, 0, arrival=10.0 + 0.1 * i)
+        # Happy crop captured 11.5 s before it came back from a slow provider
+        vote.add(-1.0, 1, arrival=10.5)
+        label, conf, n = vote.result(10.5)
+        self.assertEqual((label, n), (0, 6))
+        self.assertGreater(conf, 0.99)
+
+    def test_fresh_happy_beats_neutral_majority(self):
+        vote = SlidingVote(window=5.0, half_life=1.0)
+        for i in range(4):
+            vote.add(1.0 + 0.1 * i, 0)
+        vote.add(1.4, 1)
+        self.assertEqual(vote.result(1.4)[0], 1)
+
+    def test_happy_wins_tie_with_sad(self):
+        vote = SlidingVote(window=5.0)
+        vote.add(1.0, 1)
+        vote.add(1.0, -1)
+        self.assertEqual(vote.result(1.0), (1, 0.5, 2))
+
+    def test_late_vote_kept_for_window_after_arrival(self):
+        vote = SlidingVote(window=2.0, half_life=0.0)
+        vote.add(0.0, -1, arrival=3.0)
+        self.assertEqual(vote.result(4.5), (-1, 1.0, 1))
+        self.assertEqual(vote.result(5.1), (0, 0.0, 0))
+
+    def test_zero_weight_ignored(self):
+        vote = SlidingVote(window=2.0)
+        self.assertFalse(vote.add(0.0, 1, 0.0))
+        self.assertEqual(vote.result(0.0), (0, 0.0, 0))
+
+
+class SentimentAggregatorTest(unittest.TestCase):
+    def test_change_then_cadence(self):
+        agg = SentimentAggregator(window=5.0, emit_every=2.0, min_gap=0.25)
+        self.assertIsNone(agg.poll(0.0))
+        agg.add(1, 0.1, 1, arrival=0.3)
+        overall, tracks, reason = agg.poll(0.3)
+        self.assertEqual((overall[0], reason), (1, "change"))
+        self.assertEqual(tracks[1][0], 1)
+        self.assertIsNone(agg.poll(1.0))
+        self.assertEqual(agg.poll(2.4)[2], "cadence")
+
+    def test_forget_keeps_overall_votes(self):
+        agg = SentimentAggregator(window=5.0)
+        agg.add(1, 0.0, -1)
+        agg.forget(set())
+        self.assertEqual(agg.tracks, {})
+        self.assertEqual(agg.overall.result(0.0)[0], -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# test_face_cache.py
+# face_phash / LabelCache: near-identical crops hit, different faces miss,
+# entries expire after the TTL and the LRU stays bounded.
+#
+#   python -m pytest -q test_face_cache.py      (or just: python test_face_cache.py)
+
+import unittest
+
+import cv2
+import numpy as np
+
+from face_cache import LabelCache, face_phash, hamming
+
+
+def face(mouth="smile", dx=0, noise=0, brightness=0, seed=0, size=(44, 56), background=90):
+    """128x128 cartoon face crop."""
+    img = np.full((128, 128, 3), background, np.uint8)
+    cx, cy = 64 + dx, 64
+    cv2.ellipse(img, (cx, cy), size, 0, 0, 360, (150, 180, 225), -1, cv2.LINE_AA)
+    for sx in (-1, 1):
+        cv2.circle(img, (cx + sx * 18, cy - 14), 6, (40, 30, 30), -1, cv2.LINE_AA)
+    if mouth == "smile":
+        cv2.ellipse(img, (cx, cy + 18), (20, 10), 0, 0, 180, (60, 40, 120), 3, cv2.LINE_AA)
+    else:
+        cv2.ellipse(img, (cx, cy + 30), (20, 10), 0, 180, 360, (60, 40, 120), 3, cv2.LINE_AA)
+    img = img.astype(np.int16) + brightness
+    if noise:
+        img += np.random.default_rng(seed).integers(-noise, noise + 1, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+class PhashTest(unittest.TestCase):
+    def test_small_changes_keep_the_hash_close(self):
+        h = face_phash(face())
+        for variant in (face(dx=2), face(noise=10, seed=1), face(brightness=25)):
+            self.assertLessEqual(hamming(h, face_phash(variant)), 6)
+
+    def test_different_face_is_far(self):
+        self.assertGreater(hamming(face_phash(face()), face_phash(face(size=(30, 60), background=200))), 6)
+        self.assertGreater(hamming(face_phash(face()), face_phash(face(dx=30))), 6)
+
+    def test_grayscale_input(self):
+        img = face()
+        self.assertEqual(face_phash(img), face_phash(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)))
+
+
+class LabelCacheTest(unittest.TestCase):
+    def test_fuzzy_hit_and_miss(self):
+        cache = LabelCache(ttl=4.0, max_distance=6)
+        cache.put(face_phash(face("smile")), 1, now=0.0)
+        self.assertEqual(cache.get(face_phash(face("smile", noise=8, seed=2)), now=1.0), 1)
+        self.assertIsNone(cache.get(face_phash(face(size=(30, 60), background=200)), now=1.0))
+        st = cache.stats()
+        self.assertEqual((st["hits"], st["misses"], st["hit_rate"]), (1, 1, 0.5))
+
+    def test_closest_entry_wins(self):
+        cache = LabelCache(max_distance=10)
+        cache.put(0b0000, 0, now=0.0)
+        cache.put(0b0111, 1, now=0.0)
+        self.assertEqual(cache.get(0b0011, now=0.0), 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = LabelCache(ttl=4.0)
+        h = face_phash(face())
+        cache.put(h, -1, now=10.0)
+        self.assertEqual(cache.get(h, now=14.0), -1)
+        self.assertIsNone(cache.get(h, now=14.1))
+        self.assertEqual(cache.stats()["expired"], 1)
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_put_refreshes_ttl(self):
+        cache = LabelCache(ttl=4.0)
+        cache.put(42, 1, now=0.0)
+        cache.put(42, 0, now=3.0)
+        self.assertEqual(cache.get(42, now=6.0), 0)
+
+    def test_lru_is_bounded(self):
+        cache = LabelCache(max_entries=2, max_distance=0)
+        cache.put(1, 1, now=0.0)
+        cache.put(2, 0, now=0.0)
+        self.assertEqual(cache.get(1, now=0.0), 1)   # 1 is now the most recent
+        cache.put(3, -1, now=0.0)
+        self.assertIsNone(cache.get(2, now=0.0))
+        self.assertEqual(cache.get(1, now=0.0), 1)
+        self.assertEqual(cache.get(3, now=0.0), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# test_frame_sources.py
+# FrameRing: readers get read-only views, and is_current() turns False as
+# soon as the writer may be decoding into a view's slot.
+#
+#   python -m pytest -q test_frame_sources.py      (or just: python test_frame_sources.py)
+
+import unittest
+
+import numpy as np
+
+from frame_sources import FrameRing
+
+
+def publish(ring, value):
+    buf = ring.next_buffer()
+    if buf is None:
+        buf = np.empty((4, 4, 3), np.uint8)
+    buf[...] = value
+    ring.publish(buf, float(value))
+
+
+class FrameRingTest(unittest.TestCase):
+    def test_views_are_read_only(self):
+        ring = FrameRing(slots=4)
+        publish(ring, 1)
+        frame = ring.latest()
+        with self.assertRaises(ValueError):
+            frame.image[0, 0, 0] = 9
+
+    def test_is_current_until_writer_reaches_the_slot(self):
+        ring = FrameRing(slots=4)
+        publish(ring, 1)
+        frame = ring.latest()
+        for v in (2, 3):
+            publish(ring, v)
+            self.assertTrue(ring.is_current(frame))
+            self.assertTrue((frame.image == 1).all())
+        # Writer's next buffer is now this frame's slot
+        publish(ring, 4)
+        self.assertTrue(np.shares_memory(ring.next_buffer(), frame.image))
+        self.assertFalse(ring.is_current(frame))
+
+    def test_copy_survives_overwrite(self):
+        ring = FrameRing(slots=2)
+        publish(ring, 1)
+        frame = ring.latest()
+        crop = frame.image[1:3, 1:3].copy()
+        for v in (2, 3, 4):
+            publish(ring, v)
+        self.assertTrue((frame.image == 3).all())      # slot reused by frame 3
+        self.assertTrue((crop == 1).all())
+
+    def test_wait_next_returns_newest(self):
+        ring = FrameRing(slots=4)
+        for v in (1, 2, 3):
+            publish(ring, v)
+        self.assertEqual(ring.wait_next(0, timeout=0).seq, 3)
+        self.assertIsNone(ring.wait_next(3, timeout=0))
+        ring.close()
+        self.assertIsNone(ring.wait_next(3, timeout=1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# test_inference.py
+# InferenceExecutor: results are kept per camera, and a worker restart
+# (new_session) drops whatever the previous session still had in flight.
+#
+#   python -m pytest -q test_inference.py      (or just: python test_inference.py)
+
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from cam import InferenceExecutor
+
+CROP = np.zeros((8, 8, 3), np.uint8)
+
+
+class GatedClassifier:
+    """Answers 1 per image once `gate` is set."""
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def __call__(self, imgs):
+        self.gate.wait(5.0)
+        return [1] * len(imgs), "stub"
+
+
+def settle(executor, timeout=5.0):
+    deadline = time.time() + timeout
+    while executor.in_flight() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class InferenceExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.clf = GatedClassifier()
+        self.executor = InferenceExecutor(self.clf, max_in_flight=2, max_age=60.0)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_results_per_camera(self):
+        self.clf.gate.set()
+        now = time.time()
+        self.assertTrue(self.executor.submit([(CROP, "k", 1)], now, "a"))
+        self.assertTrue(self.executor.submit([(CROP, "k", 2)], now, "b"))
+        settle(self.executor)
+        self.assertEqual([r.track_id for r in self.executor.drain("a")], [1])
+        self.assertEqual([r.track_id for r in self.executor.drain("b")], [2])
+        self.assertEqual(self.executor.drain("a"), [])
+
+    def test_busy_batches_are_dropped(self):
+        now = time.time()
+        self.assertTrue(self.executor.submit([(CROP, "k", 1)], now, "a"))
+        self.assertTrue(self.executor.submit([(CROP, "k", 1)], now, "a"))
+        self.assertFalse(self.executor.submit([(CROP, "k", 1)], now, "a"))
+        self.assertEqual(self.executor.pending_before("a", now + 1), 2)
+        self.clf.gate.set()
+        settle(self.executor)
+        self.assertEqual(self.executor.dropped_busy, 1)
+
+    def test_new_session_drops_late_results(self):
+        now = time.time()
+        self.assertTrue(self.executor.submit([(CROP, "k", 1)], now, "a"))
+        self.executor.new_session()
+        self.assertEqual(self.executor.pending_before("a", now + 1), 0)
+        self.clf.gate.set()
+        settle(self.executor)
+        self.assertEqual(self.executor.drain("a"), [])
+        self.assertEqual(self.executor.dropped_stale, 1)
+        # The new session's own batches still come through
+        self.assertTrue(self.executor.submit([(CROP, "k", 3)], time.time(), "a"))
+        settle(self.executor)
+        self.assertEqual([r.track_id for r in self.executor.drain("a")], [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
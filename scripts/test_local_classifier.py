@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# test_local_classifier.py
+# The local expression tier must not answer for faces it can't tell apart:
+# neutral and frowning crops go to the VLM. Crops are Haar detections on
+# the synthetic source, which cycles smile -> neutral -> frown every
+# 45 frames.
+#
+#   python -m pytest -q test_local_classifier.py      (or just: python test_local_classifier.py)
+
+import os
+import unittest
+
+import cam
+from face_detector import HaarDetector
+from frame_sources import open_source
+
+PERIOD = 45     # SyntheticSource's default expression_period
+MOODS = {0: "smile", 1: "neutral", 2: "frown"}
+
+
+def synthetic_crops(frames=3 * PERIOD, every=3):
+    """{mood: [face crops]} from the synthetic source."""
+    det = HaarDetector()
+    src = open_source("synthetic", w=640, h=360, pacing="fast", frames=frames)
+    crops = {m: [] for m in MOODS.values()}
+    seq, n = 0, -1
+    try:
+        while True:
+            fr = src.wait_next(seq, timeout=5.0)
+            if fr is None:
+                break
+            seq, n = fr.seq, n + 1
+            if n % every:
+                continue
+            found = det.detect(fr.image, 0.5, 1.0)
+            if found:
+                crops[MOODS[(n // PERIOD) % 3]].append(cam.crop_face_with_margin(fr.image, found[0][0]).copy())
+    finally:
+        src.release()
+    return crops
+
+
+class FixedClassifier:
+    name = "fixed"
+
+    def __init__(self, label, conf):
+        self.answer = (label, conf)
+
+    def classify(self, face_bgr):
+        return self.answer
+
+
+class LocalTierTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.crops = synthetic_crops()
+
+    def test_synthetic_crops_cover_every_mood(self):
+        for mood, crops in self.crops.items():
+            self.assertGreater(len(crops), 5, mood)
+
+    @unittest.skipIf("LOCAL_CLASSIFIER" in os.environ, "local tier configured from the environment")
+    def test_default_escalates_neutral_and_frown(self):
+        clf = cam.make_local_classifier()
+        for mood in ("neutral", "frown"):
+            for crop in self.crops[mood]:
+                self.assertIsNone(cam.local_answer(clf, crop), mood)
+
+    def test_no_smile_is_escalated(self):
+        clf = cam.SmileCascadeClassifier()
+        blank = self.crops["neutral"][0].copy()
+        blank[...] = 128
+        self.assertEqual(clf.classify(blank), (0, cam.SMILE_NONE_CONF))
+        self.assertIsNone(cam.local_answer(clf, blank))
+
+    def test_threshold(self):
+        crop = self.crops["smile"][0]
+        self.assertIsNone(cam.local_answer(FixedClassifier(1, cam.LOCAL_CONF - 0.01), crop))
+        self.assertEqual(cam.local_answer(FixedClassifier(1, 0.95), crop), (1, 0.95))
+        self.assertIsNone(cam.local_answer(FixedClassifier(None, 1.0), crop))
+
+
+if __name__ == "__main__":
+    unittest.main()
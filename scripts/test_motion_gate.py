@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# test_motion_gate.py
+# MotionGate: detection runs on the first frame, on motion above the
+# threshold and on the forced refresh, and is skipped otherwise.
+#
+#   python -m pytest -q test_motion_gate.py      (or just: python test_motion_gate.py)
+
+import unittest
+
+import numpy as np
+
+from motion_gate import MotionGate
+
+
+def scene(shift=0, noise=0, seed=0):
+    """Textured 360x640 frame; `shift` moves a bright block, `noise` adds sensor-like jitter."""
+    rng = np.random.default_rng(seed)
+    img = np.tile(np.linspace(40, 200, 640, dtype=np.uint8), (360, 1))
+    img = np.dstack([img] * 3).copy()
+    img[100:260, 200 + shift:360 + shift] = 250
+    if noise:
+        img = np.clip(img.astype(np.int16) + rng.integers(-noise, noise + 1, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+
+class MotionGateTest(unittest.TestCase):
+    def gate(self):
+        g = MotionGate(width=32, threshold=3.0, refresh=2.0)
+        self.assertEqual(g.should_detect(scene(), 0.0), (True, "first"))
+        g.detected(0.0, 0.01)
+        return g
+
+    def test_still_scene_is_skipped(self):
+        g = self.gate()
+        for i in range(1, 10):
+            self.assertEqual(g.should_detect(scene(noise=8, seed=i), 0.1 * i), (False, "still"))
+        self.assertEqual(g.skipped, 9)
+
+    def test_motion_above_threshold_detects(self):
+        g = self.gate()
+        run, reason = g.should_detect(scene(shift=120), 0.5)
+        self.assertEqual((run, reason), (True, "motion"))
+        self.assertGreaterEqual(g.last_diff, g.threshold)
+
+    def test_small_motion_below_threshold_is_skipped(self):
+        g = self.gate()
+        run, reason = g.should_detect(scene(shift=2), 0.5)
+        self.assertEqual((run, reason), (False, "still"))
+        self.assertLess(g.last_diff, g.threshold)
+
+    def test_forced_refresh(self):
+        g = self.gate()
+        self.assertEqual(g.should_detect(scene(), 1.9), (False, "still"))
+        self.assertEqual(g.should_detect(scene(), 2.0), (True, "refresh"))
+        g.detected(2.0)
+        self.assertEqual(g.should_detect(scene(), 2.5), (False, "still"))
+
+    def test_reference_is_the_detected_frame(self):
+        g = self.gate()
+        self.assertTrue(g.should_detect(scene(shift=120), 0.5)[0])
+        g.detected(0.5)
+        self.assertEqual(g.should_detect(scene(shift=120), 0.6), (False, "still"))
+
+    def test_staged_detection_uses_its_own_thumbnail(self):
+        g = self.gate()
+        g.should_detect(scene(shift=120), 0.5)
+        thumb = g.thumb
+        g.should_detect(scene(), 0.6)              # a later check while the detection runs
+        g.detected(0.7, 0.01, thumb)
+        self.assertEqual(g.should_detect(scene(shift=120), 0.8), (False, "still"))
+
+    def test_resolution_change_counts_as_first(self):
+        g = self.gate()
+        small = scene()[::2, ::3]
+        self.assertEqual(g.should_detect(small, 0.5), (True, "first"))
+
+    def test_snapshot(self):
+        g = self.gate()
+        g.should_detect(scene(), 0.5)
+        snap = g.snapshot()
+        self.assertEqual((snap["checks"], snap["skipped"], snap["reasons"]["first"]), (2, 1, 1))
+        self.assertEqual(snap["hit_rate"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# test_payload.py
+# PayloadEncoder: crops are shrunk to the target edge and encoded under the
+# per-image byte budget whenever min_quality allows it.
+#
+#   python -m pytest -q test_payload.py      (or just: python test_payload.py)
+
+import base64
+import unittest
+
+import cv2
+import numpy as np
+
+from payload import PayloadEncoder
+
+
+def textured(h, w, seed=0):
+    """Noisy gradient: compresses like a face crop, not like a flat fill."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = np.dstack([(xx * 255 // max(1, w - 1)), (yy * 255 // max(1, h - 1)), ((xx + yy) % 256)])
+    return np.clip(base + rng.integers(-40, 40, (h, w, 3)), 0, 255).astype(np.uint8)
+
+
+def decode(url):
+    header, data = url.split(",", 1)
+    raw = base64.b64decode(data)
+    return header, raw, cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+class PayloadEncoderTest(unittest.TestCase):
+    def test_oversized_crop_is_downscaled(self):
+        enc = PayloadEncoder(target_edge=128)
+        header, _, img = decode(enc.encode(textured(480, 320)))
+        self.assertEqual(header, "data:image/jpeg;base64")
+        self.assertEqual(max(img.shape[:2]), 128)
+        self.assertEqual(img.shape[:2], (128, 85))   # aspect kept
+
+    def test_small_crop_is_not_upscaled(self):
+        enc = PayloadEncoder(target_edge=384)
+        self.assertEqual(enc.prepare(textured(100, 80)).shape[:2], (100, 80))
+
+    def test_grayscale(self):
+        enc = PayloadEncoder(target_edge=0, grayscale=True)
+        _, _, img = decode(enc.encode(textured(64, 64)))
+        self.assertEqual(img.ndim, 2)
+
+    def test_budget_respected(self):
+        budget = 6000
+        enc = PayloadEncoder(target_edge=256, quality=95, max_bytes=budget, min_quality=20)
+        for seed in range(6):
+            _, raw, _ = decode(enc.encode(textured(300, 300, seed)))
+            self.assertLessEqual(len(raw), budget)
+        self.assertLess(enc.stats()["quality"], 95)
+
+    def test_quality_drifts_back_up_when_under_budget(self):
+        enc = PayloadEncoder(target_edge=256, quality=90, max_bytes=6000, min_quality=20)
+        enc.encode(textured(300, 300))
+        low = enc.stats()["quality"]
+        flat = np.full((64, 64, 3), 128, np.uint8)
+        for _ in range(3):
+            enc.encode(flat)
+        self.assertGreater(enc.stats()["quality"], low)
+
+    def test_unreachable_budget_sends_min_quality(self):
+        enc = PayloadEncoder(target_edge=512, quality=90, max_bytes=200, min_quality=40)
+        _, raw, _ = decode(enc.encode(textured(512, 512)))
+        floor = cv2.imencode(".jpg", textured(512, 512), [int(cv2.IMWRITE_JPEG_QUALITY), 40])[1]
+        self.assertEqual(len(raw), floor.size)
+        self.assertEqual(enc.stats()["quality"], 40)
+
+    def test_encode_batch_accounts_request_size(self):
+        enc = PayloadEncoder(target_edge=96)
+        urls, sent = enc.encode_batch([textured(200, 200, s) for s in range(3)])
+        self.assertEqual(len(urls), 3)
+        self.assertEqual(sent, sum(len(u) for u in urls))
+        st = enc.stats()
+        self.assertEqual((st["images"], st["requests"], st["last_request_bytes"]), (3, 1, sent))
+
+    def test_unknown_format_rejected(self):
+        with self.assertRaises(ValueError):
+            PayloadEncoder(fmt="png")
+
+
+if __name__ == "__main__":
+    unittest.main()
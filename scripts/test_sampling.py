@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# test_sampling.py
+# AdaptiveSampler: speeds up on change, slows down when stable or when the
+# provider is slow or failing, and stays within its bounds.
+#
+#   python -m pytest -q test_sampling.py      (or just: python test_sampling.py)
+
+import unittest
+
+from sampling import AdaptiveSampler, FixedSampler
+
+
+class AdaptiveSamplerTest(unittest.TestCase):
+    def sampler(self, **kw):
+        kw.setdefault("base", 1.0)
+        kw.setdefault("min_period", 0.2)
+        kw.setdefault("max_period", 3.0)
+        return AdaptiveSampler(**kw)
+
+    def test_change_speeds_up(self):
+        s = self.sampler()
+        s.observe(1, 0)
+        s.observe(1, 1)
+        self.assertAlmostEqual(s.period, 0.6)
+        self.assertEqual(s.changes, 1)
+
+    def test_stable_labels_slow_down(self):
+        s = self.sampler(stable_after=3)
+        for _ in range(2):
+            s.observe(1, 0)
+        self.assertAlmostEqual(s.period, 1.0)
+        s.observe(1, 0)
+        self.assertAlmostEqual(s.period, 1.25)
+
+    def test_period_stays_in_bounds(self):
+        s = self.sampler()
+        for i in range(30):
+            s.observe(1, i % 2)
+        self.assertAlmostEqual(s.period, 0.2)
+        for _ in range(30):
+            s.observe(1, 0)
+        self.assertAlmostEqual(s.period, 3.0)
+
+    def test_slow_provider_sets_floor(self):
+        s = self.sampler(max_in_flight=2)
+        s.observe(1, 0, latency=1.6)
+        for i in range(10):
+            s.observe(1, i % 2, latency=1.6)
+        self.assertAlmostEqual(s.period, 0.8)
+
+    def test_failures_back_off(self):
+        s = self.sampler(max_in_flight=2)
+        s.observe(1, 0, latency=0.3)
+        before = s.current()
+        s.failed(12.0)
+        s.failed(12.0)
+        self.assertEqual(s.failures, 2)
+        self.assertGreater(s.current(), before)
+        self.assertAlmostEqual(s.current(), 3.0)       # latency floor, capped at max_period
+        # A change of expression can't push the pace back under the failing provider's latency
+        s.observe(1, 1)
+        self.assertAlmostEqual(s.period, 3.0)
+        self.assertEqual(s.snapshot()["failures"], 2)
+
+    def test_recovers_after_failures(self):
+        s = self.sampler(max_in_flight=2)
+        s.failed(12.0)
+        for i in range(40):
+            s.observe(1, i % 2, latency=0.3)
+        self.assertLess(s.current(), 0.5)
+
+    def test_window_short_of_votes_samples_faster(self):
+        s = self.sampler(base=2.0, min_votes=3)
+        self.assertAlmostEqual(s.current(votes=1, window_left=1.0), 0.5)
+        self.assertAlmostEqual(s.current(votes=3, window_left=1.0), 2.0)
+
+    def test_due_ticks(self):
+        s = self.sampler()
+        self.assertTrue(s.due(10.0))
+        self.assertFalse(s.due(10.5))
+        self.assertTrue(s.due(11.0))
+
+    def test_forget(self):
+        s = self.sampler()
+        s.observe(1, 0)
+        s.observe(2, 1)
+        s.forget({2})
+        self.assertEqual(list(s.last), [2])
+
+
+class FixedSamplerTest(unittest.TestCase):
+    def test_ignores_labels_and_failures(self):
+        s = FixedSampler(base=0.9)
+        s.observe(1, 1, latency=5.0)
+        s.failed(12.0)
+        self.assertEqual(s.current(votes=0, window_left=0.1), 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
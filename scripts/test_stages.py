@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# test_stages.py
+# DropOldestQueue and Stage: bounded inboxes that evict the oldest item,
+# inline and threaded stages, failure accounting and shutdown.
+#
+#   python -m pytest -q test_stages.py      (or just: python test_stages.py)
+
+import threading
+import time
+import unittest
+
+from stages import DropOldestQueue, Stage
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.005)
+    return cond()
+
+
+class DropOldestQueueTest(unittest.TestCase):
+    def test_full_queue_evicts_oldest(self):
+        q = DropOldestQueue(maxsize=2)
+        self.assertIsNone(q.put(1))
+        self.assertIsNone(q.put(2))
+        self.assertEqual(q.put(3), 1)
+        self.assertEqual(q.dropped, 1)
+        self.assertEqual([q.get(0), q.get(0)], [2, 3])
+
+    def test_get_times_out(self):
+        q = DropOldestQueue()
+        t0 = time.perf_counter()
+        self.assertIsNone(q.get(timeout=0.05))
+        self.assertGreaterEqual(time.perf_counter() - t0, 0.04)
+
+    def test_close_wakes_waiting_reader(self):
+        q = DropOldestQueue()
+        got = []
+        reader = threading.Thread(target=lambda: got.append(q.get(timeout=5.0)))
+        reader.start()
+        time.sleep(0.05)
+        q.close()
+        reader.join(1.0)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(got, [None])
+
+    def test_closed_queue_still_drains(self):
+        q = DropOldestQueue(maxsize=3)
+        q.put("a")
+        q.close()
+        self.assertEqual(q.get(0), "a")
+        self.assertIsNone(q.get(0))
+
+
+class StageTest(unittest.TestCase):
+    def test_inline_stage_runs_in_submit(self):
+        stage = Stage("double", lambda state, x: 2 * x, workers=0)
+        self.assertIsNone(stage.submit(3))
+        self.assertEqual(stage.results(), [(3, 6)])
+        self.assertEqual(stage.results(), [])
+        self.assertEqual(stage.pending(), 0)
+
+    def test_worker_gets_its_own_state(self):
+        stage = Stage("tag", lambda state, x: (state, x), workers=2, maxsize=4, init=lambda i: f"w{i}")
+        self.addCleanup(stage.close)
+        for x in range(4):
+            stage.submit(x)
+        self.assertTrue(wait_for(lambda: stage.snapshot()["done"] == 4))
+        out = stage.results()
+        self.assertEqual(sorted(x for x, _ in out), [0, 1, 2, 3])
+        self.assertTrue({state for _, (state, _) in out} <= {"w0", "w1"})
+
+    def test_backpressure_drops_oldest_and_never_blocks(self):
+        gate = threading.Event()
+        stage = Stage("slow", lambda state, x: gate.wait(5.0) and x, workers=1, maxsize=2)
+        self.addCleanup(stage.close)
+        stage.submit(0)
+        self.assertTrue(wait_for(lambda: stage.active == 1))      # worker busy on item 0
+        t0 = time.perf_counter()
+        evicted = [stage.submit(x) for x in (1, 2, 3, 4)]
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        self.assertEqual(evicted, [None, None, 1, 2])
+        gate.set()
+        self.assertTrue(wait_for(lambda: stage.pending() == 0))
+        self.assertEqual([x for x, _ in stage.results()], [0, 3, 4])
+        snap = stage.snapshot()
+        self.assertEqual((snap["in"], snap["done"], snap["dropped"]), (5, 3, 2))
+
+    def test_failures_are_counted_not_returned(self):
+        def fn(state, x):
+            if x < 0:
+                raise ValueError("negative")
+            return x
+        stage = Stage("check", fn, workers=0)
+        stage.submit(-1)
+        stage.submit(1)
+        self.assertEqual(stage.results(), [(1, 1)])
+        self.assertEqual(stage.snapshot()["failed"], 1)
+
+    def test_failed_init_leaves_state_none(self):
+        def init(i):
+            raise RuntimeError("no model")
+        stage = Stage("noinit", lambda state, x: state, workers=0, init=init)
+        stage.submit(1)
+        self.assertEqual(stage.results(), [(1, None)])
+
+    def test_close_stops_workers(self):
+        stage = Stage("idle", lambda state, x: x, workers=2)
+        stage.submit(1)
+        self.assertTrue(wait_for(lambda: stage.pending() == 0))
+        stage.close(timeout=2.0)
+        self.assertFalse(any(t.is_alive() for t in stage.threads))
+        self.assertEqual(stage.results(), [(1, 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# test_vlm_client.py
+# ProviderClient against a local stub server: retries, circuit breaker and
+# a 200 whose body isn't JSON. No API key or network needed.
+#
+#   python -m pytest -q test_vlm_client.py      (or just: python test_vlm_client.py)
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from vlm_client import (CircuitBreaker, ProviderClient, ProviderError, ProviderUnavailable,
+                        RetryBudget, TokenBucket)
+
+
+class StubServer:
+    """Answers POSTs from `replies`, a list of (status, body) used in order; the last one repeats."""
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, body = stub.replies[min(stub.hits, len(stub.replies) - 1)]
+                stub.hits += 1
+                data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+OK_BODY = {"choices": [{"message": {"content": "happy"}}]}
+
+
+class ProviderClientTest(unittest.TestCase):
+    def client(self, replies, **kw):
+        stub = StubServer(replies)
+        self.addCleanup(stub.close)
+        kw.setdefault("backoff_base", 0.01)
+        kw.setdefault("backoff_max", 0.02)
+        return stub, ProviderClient("stub", stub.url, connect_timeout=1.0, read_timeout=2.0, **kw)
+
+    def test_retries_transient_status(self):
+        stub, client = self.client([(503, "busy"), (200, OK_BODY)])
+        self.assertEqual(client.post_json({"x": 1}, {}), OK_BODY)
+        self.assertEqual(stub.hits, 2)
+        snap = client.snapshot()
+        self.assertEqual((snap["calls"], snap["retries"], snap["ok"]), (2, 1, 1))
+        self.assertEqual(snap["breaker"], CircuitBreaker.CLOSED)
+
+    def test_does_not_retry_client_error(self):
+        stub, client = self.client([(400, "bad request")])
+        with self.assertRaises(ProviderError) as cm:
+            client.post_json({}, {})
+        self.assertEqual(cm.exception.status, 400)
+        self.assertEqual(stub.hits, 1)
+
+    def test_breaker_opens_and_short_circuits_without_spending_budget(self):
+        budget = TokenBucket(per_minute=60, burst=3)
+        stub, client = self.client([(500, "down")], max_retries=0, call_budget=budget,
+                                   breaker=CircuitBreaker(threshold=2, cooldown=60.0))
+        for _ in range(2):
+            with self.assertRaises(ProviderError):
+                client.post_json({}, {})
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        tokens = budget.available()
+        with self.assertRaises(ProviderUnavailable):
+            client.post_json({}, {})
+        self.assertEqual(stub.hits, 2)
+        self.assertEqual(budget.available(), tokens)
+        snap = client.snapshot()
+        self.assertEqual((snap["short_circuited"], snap["call_budget_denied"]), (1, 0))
+
+    def test_half_open_probe_closes_breaker(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0.0)
+        stub, client = self.client([(502, "down"), (200, OK_BODY)], max_retries=0, breaker=breaker)
+        with self.assertRaises(ProviderError):
+            client.post_json({}, {})
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(client.post_json({}, {}), OK_BODY)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_non_json_200_is_not_retried_or_counted_against_breaker(self):
+        stub, client = self.client([(200, "<html>gateway says hi</html>")],
+                                   breaker=CircuitBreaker(threshold=1, cooldown=60.0),
+                                   retry_budget=RetryBudget(per_minute=5))
+        with self.assertRaises(ProviderError) as cm:
+            client.post_json({}, {})
+        self.assertIn("bad JSON", str(cm.exception))
+        self.assertEqual(cm.exception.status, 200)
+        self.assertEqual(stub.hits, 1)
+        snap = client.snapshot()
+        self.assertEqual(snap["retries"], 0)
+        self.assertEqual(snap["retry_budget_left"], 5)
+        self.assertEqual(snap["breaker"], CircuitBreaker.CLOSED)
+
+    def test_cancelled_call_is_not_retried(self):
+        cancel = threading.Event()
+        cancel.set()
+        stub, client = self.client([(503, "busy"), (200, OK_BODY)])
+        with self.assertRaises(ProviderError):
+            client.post_json({}, {}, cancel=cancel)
+        self.assertEqual(stub.hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
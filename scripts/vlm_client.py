@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# vlm_client.py
+# Shared HTTP client layer for the VLM providers (VILA, OpenAI).
+# Pooled keep-alive sessions, split connect/read timeouts, jittered retries
+# bounded by a per-minute retry budget, a hard per-minute call budget
+# (token bucket) and a per-provider circuit breaker.
+
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from camlog import get_logger
+
+log = get_logger()
+
+# Statuses that count against the circuit breaker. 403 (bad/expired key)
+# will not fix itself, so it opens the breaker immediately.
+BREAKER_STATUSES = (403, 500, 502, 503, 504)
+RETRY_STATUSES   = (429, 500, 502, 503, 504)
+
+
+class ProviderError(Exception):
+    """The provider answered with an error or could not be reached."""
+    def __init__(self, provider, message, status=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status = status
+
+
+class ProviderUnavailable(ProviderError):
+    """Call skipped because the provider's circuit breaker is open."""
+
+
+class ProviderCancelled(ProviderError):
+    """Caller no longer wants the answer (a hedged twin won); no further retries."""
+
+
+class RetryBudget:
+    """
+    Allow at most `per_minute` retries in any rolling 60 s span.
+    First attempts are never limited; only the extra ones are.
+    """
+    def __init__(self, per_minute=10):
+        self.per_minute = per_minute
+        self.lock = threading.Lock()
+        self.stamps = deque()
+
+    def try_spend(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            while self.stamps and now - self.stamps[0] >= 60.0:
+                self.stamps.popleft()
+            if len(self.stamps) >= self.per_minute:
+                return False
+            self.stamps.append(now)
+            return True
+
+    def remaining(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return self.per_minute - sum(1 for t in self.stamps if now - t < 60.0)
+
+
+class TokenBucket:
+    """
+    Hard cap on requests: `per_minute` tokens refill continuously and at
+    most `burst` can be saved up. Every HTTP attempt (retries included)
+    takes one. per_minute <= 0 means unlimited.
+    """
+    def __init__(self, per_minute=60, burst=None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(2, per_minute // 12))
+        self.tokens = self.capacity
+        self.lock = threading.Lock()
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def try_take(self, now=None):
+        if self.per_minute <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self._refill(now)
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+    def available(self, now=None):
+        """Whole tokens available right now (without taking one)."""
+        if self.per_minute <= 0:
+            return float("inf")
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self._refill(now)
+            return int(self.tokens)
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls flow; `threshold` consecutive failures open it
+    open      -> calls are refused until `cooldown` seconds have passed
+    half_open -> exactly one probe call is let through; success closes,
+                 failure re-opens for another cooldown
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def allow(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and (now - self.opened_at) >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def release(self):
+        """Call finished without a verdict on provider health (e.g. 400/429); free the probe slot."""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_failure(self, trip=False, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.failures += 1
+            if trip or self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = now
+                self.probe_in_flight = False
+
+
+class ProviderClient:
+    """
+    One instance per provider, shared by every worker thread.
+    post_json() returns the decoded JSON body of a 200 response or raises
+    ProviderError / ProviderUnavailable. `url` can point at a local stub
+    server for testing.
+    """
+    def __init__(self, name, url, connect_timeout=3.05, read_timeout=12.0,
+                 max_retries=2, retry_budget=None, breaker=None, call_budget=None,
+                 pool_size=4, backoff_base=0.25, backoff_max=2.0):
+        self.name = name
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.call_budget = call_budget or TokenBucket(0)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "ok": 0, "errors": 0, "retries": 0,
+                      "budget_exhausted": 0, "short_circuited": 0, "call_budget_denied": 0}
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def _sleep_backoff(self, attempt):
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+    def post_json(self, payload, headers, cancel=None):
+        """`cancel` (threading.Event): once set, failed attempts are not retried."""
+        # Breaker first: a short-circuited call must not spend a call token
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise ProviderUnavailable(self.name, "circuit open")
+        if not self.call_budget.try_take():
+            self.breaker.release()
+            self._count("call_budget_denied")
+            raise ProviderUnavailable(self.name, "call budget exhausted")
+
+        attempt = 0
+        while True:
+            self._count("calls")
+            status, err, retryable = None, None, False
+            try:
+                r = self.session.post(self.url, headers=headers, json=payload, timeout=self.timeout)
+                status = r.status_code
+            except requests.exceptions.RequestException as e:
+                err = f"request error: {e}"
+                retryable = True
+                self.breaker.record_failure()
+            else:
+                if status == 200:
+                    # Decoded outside the transport try: requests' JSONDecodeError is also a
+                    # RequestException, and a 200 with a bad body is neither retryable nor an outage
+                    try:
+                        data = r.json()
+                    except ValueError as e:
+                        err = f"bad JSON: {e}"
+                        self.breaker.release()
+                    else:
+                        self.breaker.record_success()
+                        self._count("ok")
+                        return data
+                else:
+                    err = f"HTTP {status}: {r.text[:200]}"
+                    retryable = status in RETRY_STATUSES
+                    if status in BREAKER_STATUSES:
+                        self.breaker.record_failure(trip=(status == 403))
+                    else:
+                        self.breaker.release()
+
+            self._count("errors")
+            if cancel is not None and cancel.is_set():
+                raise ProviderCancelled(self.name, f"{err} (cancelled)", status)
+            if not retryable or attempt >= self.max_retries or not self.breaker.allow():
+                raise ProviderError(self.name, err, status)
+            if not self.retry_budget.try_spend():
+                self.breaker.release()
+                self._count("budget_exhausted")
+                raise ProviderError(self.name, f"{err} (retry budget exhausted)", status)
+            if not self.call_budget.try_take():
+                self.breaker.release()
+                self._count("call_budget_denied")
+                raise ProviderError(self.name, f"{err} (call budget exhausted)", status)
+
+            self._count("retries")
+            log.debug("%s: %s; retry %d/%d", self.name, err, attempt + 1, self.max_retries,
+                      key=f"{self.name}_retry")
+            self._sleep_backoff(attempt)
+            if cancel is not None and cancel.is_set():
+                raise ProviderCancelled(self.name, "cancelled before retry", status)
+            attempt += 1
+
+    def snapshot(self):
+        with self.lock:
+            out = dict(self.stats)
+        out["breaker"] = self.breaker.state
+        out["retry_budget_left"] = self.retry_budget.remaining()
+        if self.call_budget.per_minute > 0:
+            out["call_tokens"] = self.call_budget.available()
+        return out
+
+    def close(self):
+        self.session.close()
@@ -235,6 +235,50 @@ app.get('/api/sentiment/analytics', (req, res) => {
   });
 });
 
+// Pipeline health from cam.py: latest heartbeat (providers, cache, drops) and,
+// with METRICS=true, the latest stage-latency snapshot
+app.get('/api/sentiment/health', (req, res) => {
+  res.json({
+    running: sentimentService.getIsRunning(),
+    heartbeat: sentimentService.getHealth(),
+    metrics: sentimentService.getMetrics(),
+  });
+});
+
+// Startup milestones of the latest capture session (time to first label, camera open, model load)
+app.get('/api/sentiment/startup', (req, res) => {
+  res.json({ startup: sentimentService.getStartup() });
+});
+
+// Live preview of the camera cam.py is capturing (needs SHARE_PORT). cam.py only
+// listens on 127.0.0.1, so the MJPEG stream is relayed through this server;
+// ?camera=N picks the Nth camera, ?snapshot=1 a single JPEG
+app.get('/api/sentiment/preview', (req, res) => {
+  const camera = parseInt(req.query.camera as string) || 0;
+  const url = sentimentService.getPreviewUrl(camera);
+  if (!url) {
+    return res.status(404).json({ error: 'Preview not enabled (set SHARE_PORT)' });
+  }
+  const target = req.query.snapshot ? url.replace('/stream.mjpg', '/frame.jpg') : url;
+
+  const upstream = http.get(target, (preview) => {
+    res.writeHead(preview.statusCode ?? 502, {
+      'Content-Type': preview.headers['content-type'] ?? 'application/octet-stream',
+      'Cache-Control': 'no-cache, no-store',
+    });
+    preview.pipe(res);
+  });
+  upstream.on('error', (err) => {
+    if (res.headersSent) {
+      res.end();
+    } else {
+      res.status(502).json({ error: `Preview unavailable: ${err.message}` });
+    }
+  });
+  // Viewer went away: stop pulling frames from cam.py
+  req.on('close', () => upstream.destroy());
+});
+
 // Start sentiment service
 app.post('/api/sentiment/start', (req, res) => {
   const { cameraIndex } = req.body;
@@ -734,7 +778,7 @@ server.listen(PORT, () => {
 // Graceful shutdown
 process.on('SIGTERM', () => {
   console.log('SIGTERM received, shutting down gracefully...');
-  sentimentService.stop();
+  sentimentService.shutdown();
   server.close(() => {
     console.log('Server closed');
     process.exit(0);
@@ -743,7 +787,7 @@ process.on('SIGTERM', () => {
 
 process.on('SIGINT', () => {
   console.log('SIGINT received, shutting down gracefully...');
-  sentimentService.stop();
+  sentimentService.shutdown();
   server.close(() => {
     console.log('Server closed');
     process.exit(0);
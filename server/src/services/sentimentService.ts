@@ -10,23 +10,50 @@ export interface SentimentData {
   value: number; // -1 (sad), 0 (neutral), 1 (happy)
   timestamp: number;
   confidence?: number;
+  samples?: number; // labels that went into this window
 }
 
+/**
+ * One line of cam.py's NDJSON stream (OUTPUT_FORMAT=ndjson, see scripts/events.py)
+ */
+export interface CamEvent {
+  v: number;
+  type: 'start' | 'window' | 'sample' | 'face' | 'heartbeat' | 'metrics' | 'startup' | 'state' | string;
+  ts: number;
+  [key: string]: unknown;
+}
+
+const CAM_PROTOCOL_VERSION = 1;
+
 export class SentimentService extends EventEmitter {
   private pythonProcess: ChildProcess | null = null;
   private isRunning: boolean = false;
   private lastSentiment: SentimentData | null = null;
+  // Sliding windows report on every change (up to 4/s) as well as on a cadence, so
+  // history is kept by age, and averages weight each entry by how long it held
   private sentimentHistory: SentimentData[] = [];
-  private readonly MAX_HISTORY = 100;
+  private readonly MAX_HISTORY = 2400;
+  private readonly HISTORY_MS = 10 * 60 * 1000;
+  private readonly MAX_HOLD_MS = 10000;  // an entry older than this with nothing after it no longer counts (stream paused)
+  private stdoutBuffer: string = '';
+  private lastHealth: CamEvent | null = null;
+  private lastMetrics: CamEvent | null = null;
+  private primaryCamera: string | null = null;  // CAMERAS entry whose windows drive `sentiment`
+  private lastStartup: CamEvent | null = null;
+  // Keep cam.py resident between start/stop (WORKER_MODE): restarts skip the Python,
+  // cv2 and model load and only pay for opening the camera
+  private readonly persistent = (process.env.SENTIMENT_PERSISTENT ?? 'true').toLowerCase() !== 'false';
 
   constructor() {
     super();
   }
 
   /**
-   * Start the Python sentiment analysis script
+   * Start the Python sentiment analysis script. An array serves several
+   * cameras from one process (CAMERAS); the first one feeds `sentiment`,
+   * the others arrive as raw 'event's tagged with their `camera`.
    */
-  start(cameraIndex: number = 0): void {  // Default to camera 0 (front camera)
+  start(cameraIndex: number | number[] = 0): void {  // Default to camera 0 (front camera)
     if (this.isRunning) {
       console.log('Sentiment service already running');
       return;
@@ -35,8 +62,10 @@ export class SentimentService extends EventEmitter {
     // Get absolute path to script (server/src/services -> root/scripts)
     const scriptPath = path.join(__dirname, '..', '..', '..', 'scripts', 'cam.py');
 
-    // FORCE camera index to 0 (front camera)
+    // FORCE camera index to 0 (front camera) unless several cameras were asked for
     const forcedCameraIndex = 0;
+    const cameras = Array.isArray(cameraIndex) && cameraIndex.length > 1 ? cameraIndex.map(String) : null;
+    this.primaryCamera = cameras ? cameras[0] : null;
 
     console.log('Starting sentiment analysis service...');
     console.log(`[SENTIMENT DEBUG] Requested Camera Index: ${cameraIndex}`);
@@ -44,16 +73,29 @@ export class SentimentService extends EventEmitter {
     console.log(`[SENTIMENT DEBUG] Script Path: ${scriptPath}`);
     console.log(`[SENTIMENT DEBUG] NIM_API_KEY configured: ${process.env.NIM_API_KEY ? 'YES' : 'NO'}`);
 
+    this.lastStartup = null;  // milestones belong to one session; the new one reports its own
+
+    if (this.persistent && this.pythonProcess) {
+      // Worker already warm: just tell it to start capturing again
+      this.sendCommand({ cmd: 'start', cameras: cameras ?? [forcedCameraIndex.toString()] });
+      this.isRunning = true;
+      this.emit('started');
+      return;
+    }
+
     // Spawn Python process
     this.pythonProcess = spawn('python', [scriptPath], {
       env: {
         ...process.env,
         CAMERA_INDEX: forcedCameraIndex.toString(),  // HARDCODED TO 0
+        ...(cameras ? { CAMERAS: cameras.join(',') } : {}),
         HEADLESS: 'true',
         DEBUG_WINDOW: 'false',  // Set to 'true' to show debug window
         NIM_API_KEY: process.env.NIM_API_KEY || process.env.NVIDIA_API_KEY || '',
         OPENAI_KEY: process.env.OPENAI_KEY || process.env.OPENAI_API_KEY || '',
         USE_OPENAI: process.env.USE_OPENAI || 'false',  // Set to 'true' to use OpenAI, 'false' for NVIDIA
+        OUTPUT_FORMAT: 'ndjson',  // one JSON event per line (legacy bare integers still parsed)
+        WORKER_MODE: this.persistent ? 'true' : 'false',
       },
       stdio: ['pipe', 'pipe', 'pipe'],
       cwd: process.cwd(),
@@ -61,42 +103,21 @@ export class SentimentService extends EventEmitter {
 
     console.log('[SENTIMENT] Python process spawned, waiting for initialization...');
     this.isRunning = true;
+    if (this.persistent) {
+      // Queued on the pipe; cam.py opens the camera while its model is still loading
+      this.sendCommand({ cmd: 'start', cameras: cameras ?? [forcedCameraIndex.toString()] });
+    }
 
-    // Handle stdout (sentiment values)
+    // Handle stdout (NDJSON events, or bare -1/0/1 in legacy mode).
+    // Chunks can hold several lines or end mid-line, so split on newlines and
+    // carry the unterminated tail over to the next chunk.
+    this.stdoutBuffer = '';
     this.pythonProcess.stdout?.on('data', (data: Buffer) => {
-      const output = data.toString().trim();
-      console.log(`[SENTIMENT DEBUG] Raw stdout: "${output}"`);
-
-      // Look for integer values (-1, 0, 1)
-      const match = output.match(/^(-?\d+)$/);
-      if (match) {
-        const value = parseInt(match[1], 10);
-        console.log(`[SENTIMENT DEBUG] Parsed value: ${value}`);
-
-        // Validate sentiment value
-        if (value >= -1 && value <= 1) {
-          const sentimentData: SentimentData = {
-            value,
-            timestamp: Date.now(),
-          };
-
-          this.lastSentiment = sentimentData;
-          this.sentimentHistory.push(sentimentData);
-
-          // Trim history
-          if (this.sentimentHistory.length > this.MAX_HISTORY) {
-            this.sentimentHistory.shift();
-          }
-
-          // Emit sentiment update
-          this.emit('sentiment', sentimentData);
-
-          console.log(`[SENTIMENT] ✓ ${value} (${this.getSentimentLabel(value)}) - Timestamp: ${sentimentData.timestamp} - History: ${this.sentimentHistory.length}`);
-        } else {
-          console.log(`[SENTIMENT DEBUG] Value ${value} out of range`);
-        }
-      } else {
-        console.log(`[SENTIMENT DEBUG] No match found in output`);
+      this.stdoutBuffer += data.toString();
+      const lines = this.stdoutBuffer.split('\n');
+      this.stdoutBuffer = lines.pop() ?? '';
+      for (const line of lines) {
+        this.handleLine(line.trim());
       }
     });
 
@@ -126,7 +147,134 @@ export class SentimentService extends EventEmitter {
   }
 
   /**
-   * Stop the sentiment analysis service
+   * Parse one stdout line from cam.py
+   */
+  private handleLine(line: string): void {
+    if (!line) return;
+
+    // Legacy mode: bare integer per window
+    const match = line.match(/^(-?\d+)$/);
+    if (match) {
+      this.recordSentiment({ value: parseInt(match[1], 10), timestamp: Date.now() });
+      return;
+    }
+
+    if (!line.startsWith('{')) {
+      console.log(`[SENTIMENT DEBUG] Ignoring non-event stdout line: "${line}"`);
+      return;
+    }
+
+    let event: CamEvent;
+    try {
+      event = JSON.parse(line) as CamEvent;
+    } catch {
+      console.log(`[SENTIMENT DEBUG] Malformed event line: "${line}"`);
+      return;
+    }
+    if (event.v !== CAM_PROTOCOL_VERSION) {
+      console.log(`[SENTIMENT DEBUG] Unsupported event protocol version ${event.v}`);
+      return;
+    }
+
+    switch (event.type) {
+      case 'window':
+        // Overall window of the primary camera only; per-track windows (kiosk mode)
+        // and other cameras' windows are forwarded as raw events
+        if ((event.track === null || event.track === undefined) && this.isPrimaryCamera(event)) {
+          this.recordSentiment({
+            value: Number(event.value),
+            timestamp: Math.round(Number(event.window_end ?? event.ts) * 1000),
+            confidence: typeof event.confidence === 'number' ? event.confidence : undefined,
+            samples: typeof event.samples === 'number' ? event.samples : undefined,
+          });
+        }
+        break;
+      case 'heartbeat':
+        if (this.isPrimaryCamera(event)) this.lastHealth = event;
+        break;
+      case 'metrics':
+        this.lastMetrics = event;
+        break;
+      case 'startup':
+        this.lastStartup = event;
+        console.log(`[SENTIMENT] First label after ${event.first_label_ms} ms (camera ${event.camera_open_ms} ms, model ${event.model_ready_ms} ms)`);
+        break;
+      default:
+        break;
+    }
+    this.emit('event', event);
+  }
+
+  private isPrimaryCamera(event: CamEvent): boolean {
+    return this.primaryCamera === null || event.camera === undefined || String(event.camera) === this.primaryCamera;
+  }
+
+  /**
+   * Validate, store and broadcast one window result
+   */
+  private recordSentiment(sentimentData: SentimentData): void {
+    const { value } = sentimentData;
+    if (!(value >= -1 && value <= 1)) {
+      console.log(`[SENTIMENT DEBUG] Value ${value} out of range`);
+      return;
+    }
+
+    this.lastSentiment = sentimentData;
+    this.sentimentHistory.push(sentimentData);
+
+    // Trim history
+    const horizon = sentimentData.timestamp - this.HISTORY_MS;
+    while (this.sentimentHistory.length > this.MAX_HISTORY || this.sentimentHistory[0].timestamp < horizon) {
+      this.sentimentHistory.shift();
+    }
+
+    // Emit sentiment update
+    this.emit('sentiment', sentimentData);
+
+    console.log(`[SENTIMENT] ✓ ${value} (${this.getSentimentLabel(value)}) - Timestamp: ${sentimentData.timestamp} - History: ${this.sentimentHistory.length}`);
+  }
+
+  /**
+   * Latest heartbeat event from cam.py (provider, cache and drop counters)
+   */
+  getHealth(): CamEvent | null {
+    return this.lastHealth;
+  }
+
+  /**
+   * Latest stage-latency / counter snapshot from cam.py (only sent when METRICS=true)
+   */
+  getMetrics(): CamEvent | null {
+    return this.lastMetrics;
+  }
+
+  /**
+   * Browser-viewable MJPEG preview of the camera cam.py is capturing, when it
+   * shares frames (SHARE_PORT); the camera itself stays owned by cam.py
+   */
+  getPreviewUrl(camera: number = 0): string | null {
+    const port = Number(process.env.SHARE_PORT ?? 0);
+    if (!port) return null;
+    return `http://127.0.0.1:${port}/stream.mjpg${camera ? `?camera=${camera}` : ''}`;
+  }
+
+  /**
+   * Startup milestones of the latest run (time to first label, camera open, model load)
+   */
+  getStartup(): CamEvent | null {
+    return this.lastStartup;
+  }
+
+  /**
+   * Send one command line to a WORKER_MODE cam.py
+   */
+  private sendCommand(command: { cmd: string; cameras?: string[] }): void {
+    this.pythonProcess?.stdin?.write(JSON.stringify(command) + '\n');
+  }
+
+  /**
+   * Stop the sentiment analysis service. A persistent worker only releases
+   * the camera and stays warm for the next start(); see shutdown().
    */
   stop(): void {
     if (!this.pythonProcess || !this.isRunning) {
@@ -134,14 +282,34 @@ export class SentimentService extends EventEmitter {
       return;
     }
 
+    if (this.persistent) {
+      console.log('Pausing sentiment analysis (worker stays loaded)...');
+      this.sendCommand({ cmd: 'stop' });
+      this.isRunning = false;
+      this.emit('stopped', { code: null, signal: null });
+      return;
+    }
+    this.shutdown();
+  }
+
+  /**
+   * Terminate the Python process (persistent worker included)
+   */
+  shutdown(): void {
+    if (!this.pythonProcess) {
+      return;
+    }
+
     console.log('Stopping sentiment analysis service...');
-    this.pythonProcess.kill('SIGTERM');
+    const proc = this.pythonProcess;
+    proc.stdin?.end();  // a worker exits on EOF
+    proc.kill('SIGTERM');
 
     // Force kill after 3 seconds if not stopped
     setTimeout(() => {
-      if (this.pythonProcess && this.isRunning) {
+      if (proc.exitCode === null && proc.signalCode === null) {
         console.log('Force killing sentiment service...');
-        this.pythonProcess.kill('SIGKILL');
+        proc.kill('SIGKILL');
       }
     }, 3000);
   }
@@ -160,19 +328,33 @@ export class SentimentService extends EventEmitter {
     return this.sentimentHistory.slice(-limit);
   }
 
+  /**
+   * Time-weighted mean sentiment over [from, to]: each entry holds until the
+   * next one (at most MAX_HOLD_MS), so a burst of change reports counts for
+   * as long as it lasted, not for how many lines it took. null if nothing held.
+   */
+  private timeWeightedAverage(from: number, to: number): number | null {
+    const history = this.sentimentHistory;
+    let weighted = 0;
+    let covered = 0;
+    for (let i = 0; i < history.length; i++) {
+      const next = i + 1 < history.length ? history[i + 1].timestamp : to;
+      const start = Math.max(history[i].timestamp, from);
+      const end = Math.min(next, history[i].timestamp + this.MAX_HOLD_MS, to);
+      if (end > start) {
+        weighted += history[i].value * (end - start);
+        covered += end - start;
+      }
+    }
+    return covered > 0 ? weighted / covered : null;
+  }
+
   /**
    * Get average sentiment over time window
    */
   getAverageSentiment(windowMs: number = 30000): number {
     const now = Date.now();
-    const recentSentiments = this.sentimentHistory.filter(
-      (s) => now - s.timestamp < windowMs
-    );
-
-    if (recentSentiments.length === 0) return 0;
-
-    const sum = recentSentiments.reduce((acc, s) => acc + s.value, 0);
-    return sum / recentSentiments.length;
+    return this.timeWeightedAverage(now - windowMs, now) ?? 0;
   }
 
   /**
@@ -202,12 +384,11 @@ export class SentimentService extends EventEmitter {
 
     if (recentSentiments.length < 3) return 'stable';
 
-    const midpoint = Math.floor(recentSentiments.length / 2);
-    const firstHalf = recentSentiments.slice(0, midpoint);
-    const secondHalf = recentSentiments.slice(midpoint);
-
-    const firstAvg = firstHalf.reduce((acc, s) => acc + s.value, 0) / firstHalf.length;
-    const secondAvg = secondHalf.reduce((acc, s) => acc + s.value, 0) / secondHalf.length;
+    // Halves of the time window, not of the entry count (entries aren't evenly spaced)
+    const midpoint = now - windowMs / 2;
+    const firstAvg = this.timeWeightedAverage(now - windowMs, midpoint);
+    const secondAvg = this.timeWeightedAverage(midpoint, now);
+    if (firstAvg === null || secondAvg === null) return 'stable';
 
     const diff = secondAvg - firstAvg;
 